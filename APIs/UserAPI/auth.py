@@ -1,23 +1,82 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple, TYPE_CHECKING
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from database import get_db
-from models import User
+from database import get_db, get_read_db
+from models import User, email_matches
 from schemas import TokenData
-import os
-from dotenv import load_dotenv
+from cache import TTLCache
+import jwt_keys
+from revocation import revocation_list
+from settings import get_settings
+import hashlib
+import time
+import uuid
 
-load_dotenv()
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
 
-SECRET_KEY = os.getenv("SECRET_KEY", "test-secret-key-for-ci")
-ALGORITHM = os.getenv("ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+settings = get_settings()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+SECRET_KEY = settings.secret_key
+ALGORITHM = settings.algorithm
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
+# Con claves RS256 configuradas (jwt_keys.py), seguir aceptando tokens HS256 ya
+# emitidos durante la migración; pasar a false cuando hayan expirado
+JWT_ACCEPT_HS256 = settings.jwt_accept_hs256
+
+# Costo de bcrypt (log2 de iteraciones). Calibrarlo en el hardware de producción con
+# `python calibrate_bcrypt.py`: cada +1 duplica el tiempo de hashear y de cada login.
+BCRYPT_ROUNDS = settings.bcrypt_rounds
+# Latencia objetivo de un hash para la calibración
+BCRYPT_TARGET_MS = settings.bcrypt_target_ms
+
+def build_pwd_context(rounds: int = BCRYPT_ROUNDS) -> "CryptContext":
+    """
+    CryptContext de bcrypt con costo fijo
+
+    min_rounds = max_rounds = rounds: cualquier hash con otro costo (más barato o más
+    caro) se considera desactualizado y se rehashea en el próximo login.
+    """
+    # passlib se importa recién acá: no hace falta para arrancar ni para verificar tokens
+    from passlib.context import CryptContext
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds
+    )
+
+# Se construye en el primer hash/verificación (ver get_pwd_context)
+pwd_context: Optional["CryptContext"] = None
+
+def get_pwd_context() -> "CryptContext":
+    global pwd_context
+    if pwd_context is None:
+        pwd_context = build_pwd_context()
+    return pwd_context
+
+def warm_up_hashing() -> float:
+    """
+    Hashea una vez con el costo configurado: carga el backend de bcrypt (passlib lo
+    detecta y autoverifica en el primer uso) para que no lo pague el primer login
+
+    Returns:
+        Milisegundos que tardó
+    """
+    return _time_hash(get_pwd_context())
+
+# Cache de tokens ya verificados: sha256(token) -> TokenData, hasta el exp del token.
+# La firma se verifica una vez por token y por instancia en lugar de en cada request.
+TOKEN_CACHE_ENABLED = settings.token_cache_enabled
+verified_token_cache = TTLCache(
+    "verified_tokens",
+    maxsize=settings.token_cache_size,
+    ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60
+)
 security = HTTPBearer()
 
 def verify_password(plain_password, hashed_password):
@@ -25,14 +84,48 @@ def verify_password(plain_password, hashed_password):
     # Convertir a bytes, truncar, y volver a string
     password_bytes = plain_password.encode('utf-8')[:72]
     plain_password_truncated = password_bytes.decode('utf-8', errors='ignore')
-    return pwd_context.verify(plain_password_truncated, hashed_password)
+    return get_pwd_context().verify(plain_password_truncated, hashed_password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verifica la contraseña y, si el hash quedó con parámetros viejos, devuelve uno nuevo
+
+    Returns:
+        (válida, nuevo hash o None si el guardado sigue vigente)
+    """
+    password_bytes = plain_password.encode('utf-8')[:72]
+    plain_password_truncated = password_bytes.decode('utf-8', errors='ignore')
+    return get_pwd_context().verify_and_update(plain_password_truncated, hashed_password)
+
+def calibrate_bcrypt_rounds(target_ms: float = BCRYPT_TARGET_MS, min_rounds: int = 10, max_rounds: int = 16) -> Tuple[int, float]:
+    """
+    Elige el mayor costo de bcrypt cuyo hash tarda como máximo target_ms en este hardware
+
+    Returns:
+        (rounds, milisegundos medidos con ese costo); nunca menos que min_rounds
+    """
+    chosen, chosen_ms = min_rounds, None
+    for rounds in range(min_rounds, max_rounds + 1):
+        context = build_pwd_context(rounds)
+        # Mejor de 3 para no sobreestimar por ruido del scheduler
+        elapsed_ms = min(_time_hash(context) for _ in range(3))
+        if chosen_ms is None or elapsed_ms <= target_ms:
+            chosen, chosen_ms = rounds, elapsed_ms
+        if elapsed_ms > target_ms:
+            break
+    return chosen, chosen_ms
+
+def _time_hash(context: "CryptContext") -> float:
+    start = time.perf_counter()
+    context.hash("calibration-password")
+    return (time.perf_counter() - start) * 1000
 
 def get_password_hash(password):
     # Truncar a 72 bytes para cumplir con límite de bcrypt
     # Convertir a bytes, truncar, y volver a string
     password_bytes = password.encode('utf-8')[:72]
     password_truncated = password_bytes.decode('utf-8', errors='ignore')
-    return pwd_context.hash(password_truncated)
+    return get_pwd_context().hash(password_truncated)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -41,36 +134,95 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
+    # jti: identifica el token para poder revocarlo (revocation.py)
+    to_encode.setdefault("jti", uuid.uuid4().hex)
+    keyring = jwt_keys.keyring
+    if keyring is not None:
+        # RS256 con el kid de la clave activa: verificable con /.well-known/jwks.json
+        return jwt.encode(to_encode, keyring.signing_key, algorithm=jwt_keys.RS256, headers={"kid": keyring.active_kid})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def _decode_jwt(token: str) -> dict:
+    """Verifica la firma con la clave pública del kid (RS256) o con SECRET_KEY (HS256)"""
+    keyring = jwt_keys.keyring
+    if keyring is not None:
+        public_key = keyring.public_key(jwt.get_unverified_header(token).get("kid"))
+        if public_key is not None:
+            return jwt.decode(token, public_key, algorithms=[jwt_keys.RS256])
+        if not JWT_ACCEPT_HS256:
+            raise JWTError("kid desconocido")
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+def decode_token(token: str) -> Optional[TokenData]:
+    """
+    Verifica y decodifica un access token, usando la cache de tokens verificados
+
+    Returns:
+        TokenData, o None si el token no tiene sub
+
+    Raises:
+        JWTError si la firma o los claims no son válidos
+    """
+    key = hashlib.sha256(token.encode()).hexdigest() if TOKEN_CACHE_ENABLED else None
+    if key is not None:
+        cached = verified_token_cache.get(key)
+        if cached is not None:
+            return cached
+
+    payload = _decode_jwt(token)
+    email = payload.get("sub")
+    if email is None:
+        return None
+    exp = payload.get("exp")
+    token_data = TokenData(
+        email=email,
+        jti=payload.get("jti"),
+        exp=datetime.utcfromtimestamp(exp) if exp else None
+    )
+
+    # Solo se cachea hasta el exp: después jwt.decode lo rechazaría
+    expires_in = (exp or 0) - time.time()
+    if key is not None and expires_in > 0:
+        verified_token_cache.set(key, token_data, ttl=expires_in)
+    return token_data
+
+def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = TokenData(email=email)
+        token_data = decode_token(credentials.credentials)
     except JWTError:
         raise credentials_exception
+    if token_data is None:
+        raise credentials_exception
+    # Va después de la cache de tokens: una revocación aplica aunque el token esté cacheado.
+    # La sesión solo abre conexión si el filtro da positivo.
+    if token_data.jti and revocation_list.is_revoked(db, token_data.jti):
+        raise credentials_exception
     return token_data
 
-def get_current_user(token_data: TokenData = Depends(verify_token), db: Session = Depends(get_db)):
+def _load_current_user(token_data: TokenData, db: Session) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    user = db.query(User).filter(User.email == token_data.email).first()
+    user = db.query(User).filter(email_matches(token_data.email)).first()
     if user is None:
         raise credentials_exception
     return user
 
+def get_current_user(token_data: TokenData = Depends(verify_token), db: Session = Depends(get_db)):
+    return _load_current_user(token_data, db)
+
+# Variante para rutas de solo lectura: carga el usuario desde una réplica si hay
+def get_current_user_read(token_data: TokenData = Depends(verify_token), db: Session = Depends(get_read_db)):
+    return _load_current_user(token_data, db)
+
 # 🔒 SEGURIDAD: Función para obtener usuario opcional (sin forzar autenticación)
 def get_current_user_optional(credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)), db: Session = Depends(get_db)) -> Optional[User]:
     """
@@ -81,12 +233,13 @@ def get_current_user_optional(credentials: Optional[HTTPAuthorizationCredentials
         return None
 
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+        token_data = decode_token(credentials.credentials)
+        if token_data is None:
+            return None
+        if token_data.jti and revocation_list.is_revoked(db, token_data.jti):
             return None
 
-        user = db.query(User).filter(User.email == email).first()
+        user = db.query(User).filter(email_matches(token_data.email)).first()
         return user
     except JWTError:
         return None
\ No newline at end of file
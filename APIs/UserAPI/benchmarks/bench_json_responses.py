@@ -0,0 +1,82 @@
+"""
+Benchmark de serialización JSON de List[UserResponse] (1.000 usuarios por defecto)
+
+Compara, sobre objetos User del ORM como los que devuelven /admin/users y
+/admin/candidates:
+  - antes: el camino de FastAPI (validación del response_model + serialize + json)
+  - orjson: el mismo camino, renderizado con ORJSONResponse
+  - después: users_json (TypeAdapter.dump_json directo a bytes)
+
+Uso (desde APIs/UserAPI, con DATABASE_URL definida):
+    python benchmarks/bench_json_responses.py [--users 1000] [--repeat 50]
+"""
+from datetime import date, datetime
+from typing import List
+import argparse
+import asyncio
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+from models import GenderEnum, User, UserRoleEnum  # noqa: E402
+from schemas import UserResponse  # noqa: E402
+from serialization import users_json  # noqa: E402
+
+
+def _usuarios(cantidad: int) -> List[User]:
+    return [
+        User(
+            id=i,
+            email=f"candidato{i}@example.com",
+            nombre=f"Nombre {i}",
+            apellido=f"Apellido {i}",
+            role=UserRoleEnum.candidato,
+            email_verified=i % 2 == 0,
+            genero=GenderEnum.otro,
+            fecha_nacimiento=date(1990, 1, 1),
+            profile_picture=f"/profile_pictures/{i}.jpg",
+            created_at=datetime(2024, 1, 1, 12, 0, 0),
+            updated_at=datetime(2024, 6, 1, 12, 0, 0),
+            version_id=1
+        )
+        for i in range(cantidad)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    users = _usuarios(args.users)
+    field = create_response_field(name="Response_bench", type_=List[UserResponse])
+
+    def fastapi_path(response_class):
+        content = asyncio.run(serialize_response(field=field, response_content=users))
+        return response_class(content).body
+
+    casos = {
+        "antes (JSONResponse)": lambda: fastapi_path(JSONResponse),
+        "orjson (ORJSONResponse)": lambda: fastapi_path(ORJSONResponse),
+        "después (users_json)": lambda: users_json(users),
+    }
+
+    print(f"{args.users} usuarios, {args.repeat} repeticiones")
+    print(f"{'caso':<26} {'ms/lista':>10} {'bytes':>10}")
+    baseline = None
+    for label, run in casos.items():
+        size = len(run())
+        ms = timeit.timeit(run, number=args.repeat) / args.repeat * 1000
+        baseline = baseline or ms
+        print(f"{label:<26} {ms:>10.2f} {size:>10}   x{baseline / ms:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark JSON vs msgpack para las respuestas internas de usuarios
+
+Compara tamaño del payload y tiempo de codificación/decodificación de un usuario
+(/internal/users/{id}) y de una página del change feed (/internal/users/changes).
+
+Uso (desde APIs/UserAPI):
+    python benchmarks/bench_serialization.py [--users 500] [--repeat 2000]
+"""
+from datetime import date, datetime
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schemas import UserChangesPage, UserResponse  # noqa: E402
+from serialization import decode_user, decode_user_page, encode_user, encode_user_page  # noqa: E402
+
+
+def _usuario(i: int) -> UserResponse:
+    return UserResponse(
+        id=i,
+        email=f"candidato{i}@example.com",
+        nombre=f"Nombre {i}",
+        role="candidato",
+        email_verified=i % 2 == 0,
+        profile_picture=f"/profile_pictures/{i}.jpg",
+        apellido=f"Apellido {i}",
+        genero="otro",
+        fecha_nacimiento=date(1990, 1, 1),
+        descripcion=None,
+        created_at=datetime(2024, 1, 1, 12, 0, 0),
+        updated_at=datetime(2024, 6, 1, 12, 0, 0)
+    )
+
+
+def _medir(label: str, encode, decode, repeat: int) -> None:
+    body = encode()
+    encode_us = timeit.timeit(encode, number=repeat) / repeat * 1e6
+    decode_us = timeit.timeit(lambda: decode(body), number=repeat) / repeat * 1e6
+    print(f"{label:<28} {len(body):>10} B {encode_us:>12.1f} us {decode_us:>12.1f} us")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500, help="usuarios por página del change feed")
+    parser.add_argument("--repeat", type=int, default=2000, help="repeticiones para el caso de un usuario")
+    args = parser.parse_args()
+
+    user = _usuario(1)
+    page = UserChangesPage(users=[_usuario(i) for i in range(args.users)], next_cursor="cursor", has_more=True)
+    page_repeat = max(1, args.repeat // args.users)
+
+    print(f"{'caso':<28} {'tamaño':>12} {'encode':>15} {'decode':>15}")
+    _medir("usuario / json", lambda: user.model_dump_json().encode(), json.loads, args.repeat)
+    _medir("usuario / msgpack", lambda: encode_user(user), decode_user, args.repeat)
+    _medir(
+        f"pagina {args.users} / json",
+        lambda: page.model_dump_json().encode(),
+        json.loads,
+        page_repeat
+    )
+    _medir(
+        f"pagina {args.users} / msgpack",
+        lambda: encode_user_page(page.users, page.next_cursor, page.has_more),
+        decode_user_page,
+        page_repeat
+    )
+
+
+if __name__ == "__main__":
+    main()
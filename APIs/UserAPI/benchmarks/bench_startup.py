@@ -0,0 +1,94 @@
+"""
+Benchmark de arranque en frío de UserAPI
+
+Cada corrida es un intérprete nuevo (como una instancia recién creada de Cloud Run):
+  - import: `python -X importtime -c "import main"`, con el detalle por módulo
+  - bootstrap: create_all + migraciones + directorios (lo que corre el startup)
+  - warm-up (con --warmup): pool de conexiones + bcrypt
+
+Reporta la mediana de cada fase y los módulos con mayor tiempo de import acumulado.
+
+Uso (desde APIs/UserAPI; sin DATABASE_URL usa un SQLite temporal):
+    python benchmarks/bench_startup.py [--runs 5] [--top 15] [--warmup]
+"""
+from typing import Dict, List, Tuple
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PHASES_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.bootstrap()
+booted = time.perf_counter()
+phases = {"import": imported - start, "bootstrap": booted - imported}
+if sys.argv[1] == "1":
+    main.warm_up()
+    phases["warm-up"] = time.perf_counter() - booted
+print(json.dumps({name: seconds * 1000 for name, seconds in phases.items()}))
+"""
+
+
+def _importtime(env: Dict[str, str]) -> List[Tuple[str, int, int]]:
+    """(módulo, self µs, acumulado µs) de cada import, en el orden de -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=APP_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def _phases(env: Dict[str, str], warmup: bool) -> Dict[str, float]:
+    result = subprocess.run(
+        [sys.executable, "-c", _PHASES_SCRIPT, "1" if warmup else "0"],
+        cwd=APP_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--warmup", action="store_true", help="medir también el warm-up")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    tmp_dir = tempfile.mkdtemp(prefix="bench_startup_")
+    env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+
+    cumulative: Dict[str, List[int]] = {}
+    phases: Dict[str, List[float]] = {}
+    for _ in range(args.runs):
+        for name, _self_us, cumulative_us in _importtime(env):
+            cumulative.setdefault(name, []).append(cumulative_us)
+        for name, ms in _phases(env, args.warmup).items():
+            phases.setdefault(name, []).append(ms)
+
+    print(f"{args.runs} corridas, DATABASE_URL={env['DATABASE_URL']}")
+    print(f"{'fase':<12} {'ms (mediana)':>14}")
+    for name, values in phases.items():
+        print(f"{name:<12} {statistics.median(values):>14.1f}")
+
+    print(f"\n{'módulo':<50} {'ms acumulado':>14}")
+    slowest = sorted(cumulative.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+    for name, values in slowest[:args.top]:
+        print(f"{name:<50} {statistics.median(values) / 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
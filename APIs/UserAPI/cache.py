@@ -0,0 +1,199 @@
+"""
+Caches en memoria del proceso
+
+TTLCache es un LRU acotado con expiración por entrada. Cada instancia con nombre
+queda registrada para poder consultar sus métricas o vaciarlas todas juntas
+(tests, invalidaciones globales). SingleFlight agrupa cargas concurrentes de la
+misma key en una sola.
+
+Una carga que leyó la fuente antes de un invalidate no debe guardar su valor
+después: quedaría cacheado el dato viejo hasta el TTL. Por eso cada invalidate le
+da a la key una generación nueva, y set(..., generation=g) descarta el valor si la
+key cambió de generación desde que se leyó g (antes de consultar la fuente).
+"""
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+import asyncio
+import time
+
+from database import has_recent_write, mark_recent_write
+from settings import get_settings
+
+settings = get_settings()
+
+_registry: Dict[str, "TTLCache"] = {}
+
+
+class TTLCache:
+    """LRU acotado con TTL por entrada, seguro para uso concurrente entre threads"""
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Generación de las keys invalidadas, con un contador único para toda la cache.
+        # El registro se acota a maxsize; las keys descartadas (y las nunca
+        # invalidadas) toman _generation_floor, la mayor generación descartada.
+        self._generations: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._last_generation = 0
+        self._generation_floor = 0
+        _registry[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Retorna el valor vigente para key, o default si no existe o expiró"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def generation(self, key: Hashable) -> int:
+        """Generación actual de key; leerla antes de consultar la fuente y pasarla a set"""
+        with self._lock:
+            return self._generations.get(key, self._generation_floor)
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, generation: Optional[int] = None) -> None:
+        """
+        Guarda value; ttl (segundos) pisa el TTL por defecto de la cache
+
+        Con generation, no guarda nada si key se invalidó desde que se leyó esa generación
+        """
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if generation is not None and self._generations.get(key, self._generation_floor) != generation:
+                return
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """Elimina key si existe y le da una generación nueva"""
+        with self._lock:
+            self._data.pop(key, None)
+            self._last_generation += 1
+            self._generations[key] = self._last_generation
+            self._generations.move_to_end(key)
+            while len(self._generations) > max(self.maxsize, 1):
+                _, generation = self._generations.popitem(last=False)
+                self._generation_floor = generation
+
+    def clear(self) -> None:
+        """Vacía la cache y reinicia las métricas; las cargas en vuelo no guardan su valor"""
+        with self._lock:
+            self._data.clear()
+            self._generations.clear()
+            self._last_generation += 1
+            self._generation_floor = self._last_generation
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        """Métricas actuales de la cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def all_cache_stats() -> Dict[str, dict]:
+    """Métricas de todas las caches registradas, por nombre"""
+    return {name: cache.stats() for name, cache in _registry.items()}
+
+
+def clear_all_caches() -> None:
+    """Vacía todas las caches registradas"""
+    for cache in _registry.values():
+        cache.clear()
+
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma key: solo la primera ejecuta la carga"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Ejecuta load() una sola vez por key en vuelo; el resto espera el mismo resultado
+
+        La carga corre en su propia task: si se cancela la request que la inició
+        (cliente desconectado, timeout), las demás siguen esperando el resultado.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(load())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Marca la excepción como consumida aunque no quede nadie esperando
+        if not task.cancelled():
+            task.exception()
+
+
+# =====================================================
+# CACHES DE LA APLICACIÓN
+# =====================================================
+
+# Respuestas ya serializadas de /internal/users/{id}: user_id -> (etag, bytes JSON) o
+# NOT_FOUND. Se invalida en cada cambio del usuario (invalidate_internal_user); entre
+# instancias, el TTL acota cuánto puede tardar en verse un cambio hecho en otra.
+NOT_FOUND = object()
+INTERNAL_USER_NEGATIVE_TTL = settings.internal_user_negative_ttl
+internal_user_cache = TTLCache(
+    "internal_users",
+    maxsize=settings.internal_user_cache_size,
+    ttl=settings.internal_user_cache_ttl
+)
+internal_user_flight = SingleFlight()
+
+
+def _internal_user_write_key(user_id: int) -> str:
+    return f"internal_user:{user_id}"
+
+
+def invalidate_internal_user(user_id: int) -> None:
+    """
+    Invalida la respuesta cacheada del usuario después de un cambio
+
+    Durante la ventana read-your-writes la próxima carga lee del primario: una
+    réplica atrasada devolvería la versión anterior y quedaría cacheada hasta el TTL.
+    """
+    internal_user_cache.invalidate(user_id)
+    mark_recent_write(_internal_user_write_key(user_id))
+
+
+def internal_user_needs_primary(user_id: int) -> bool:
+    """True si el usuario cambió hace menos que la ventana read-your-writes"""
+    return has_recent_write(_internal_user_write_key(user_id))
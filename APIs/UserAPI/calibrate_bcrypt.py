@@ -0,0 +1,34 @@
+"""
+Calibra el costo de bcrypt para el hardware actual
+
+Mide cuánto tarda un hash con cada costo y recomienda el mayor que no supera la
+latencia objetivo. Correrlo en la misma instancia/tipo de máquina que producción.
+
+Uso:
+    python calibrate_bcrypt.py [--target-ms 250] [--min-rounds 10] [--max-rounds 16]
+
+El resultado se aplica con BCRYPT_ROUNDS; los hashes existentes con otro costo se
+rehashean solos en el próximo login de cada usuario.
+"""
+import argparse
+
+from auth import BCRYPT_ROUNDS, BCRYPT_TARGET_MS, calibrate_bcrypt_rounds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target-ms", type=float, default=BCRYPT_TARGET_MS)
+    parser.add_argument("--min-rounds", type=int, default=10)
+    parser.add_argument("--max-rounds", type=int, default=16)
+    args = parser.parse_args()
+
+    rounds, elapsed_ms = calibrate_bcrypt_rounds(args.target_ms, args.min_rounds, args.max_rounds)
+
+    print(f"Objetivo: {args.target_ms:.0f} ms por hash")
+    print(f"Costo recomendado: {rounds} ({elapsed_ms:.0f} ms medidos, ~{1000 / elapsed_ms:.1f} logins/s por core)")
+    print(f"Costo actual: {BCRYPT_ROUNDS}")
+    print(f"\nBCRYPT_ROUNDS={rounds}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Compresión de respuestas HTTP (gzip y, si está instalado, brotli)
+
+CompressionMiddleware negocia la codificación con Accept-Encoding, no comprime
+respuestas chicas ni media ya comprimida (fotos de perfil, CVs, imágenes), y
+soporta respuestas en streaming comprimiendo cada chunk a medida que sale.
+
+Las respuestas con ETag fuerte son cacheables: sus bytes comprimidos se guardan
+por (URL, content-type, ETag, codificación) para no volver a comprimir el mismo
+cuerpo en cada request.
+"""
+from typing import Optional, Sequence, Tuple
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se negocia gzip
+    brotli = None
+
+from cache import TTLCache
+from settings import get_settings
+
+settings = get_settings()
+
+COMPRESSION_MINIMUM_SIZE = settings.compression_minimum_size
+COMPRESSION_GZIP_LEVEL = settings.compression_gzip_level
+COMPRESSION_BROTLI_QUALITY = settings.compression_brotli_quality
+# Entradas de la cache de bytes comprimidos (0 la deshabilita)
+COMPRESSION_CACHE_SIZE = settings.compression_cache_size
+COMPRESSION_CACHE_TTL = settings.compression_cache_ttl
+
+# Paths servidos como archivos ya comprimidos (jpg/png/pdf)
+COMPRESSION_EXCLUDED_PATHS = ("/profile_pictures", "/uploaded_cvs")
+_INCOMPRESSIBLE_TYPES = ("image/", "video/", "audio/", "application/zip", "application/gzip", "application/pdf")
+
+compressed_responses_cache = TTLCache(
+    "compressed_responses",
+    maxsize=COMPRESSION_CACHE_SIZE,
+    ttl=COMPRESSION_CACHE_TTL
+)
+
+# =====================================================
+# NEGOCIACIÓN
+# =====================================================
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Elige "br" o "gzip" según Accept-Encoding (None = sin comprimir)
+
+    Con igual q se prefiere brotli; brotli solo se ofrece si está instalado.
+    """
+    if not accept_encoding:
+        return None
+
+    available = ("br", "gzip") if brotli is not None else ("gzip",)
+    weights = {}
+    wildcard = None
+    for coding in accept_encoding.split(","):
+        name, *params = [part.strip() for part in coding.split(";")]
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        name = name.lower()
+        if name == "*":
+            wildcard = q
+        elif name in available:
+            weights[name] = q
+
+    if wildcard is not None:
+        for name in available:
+            weights.setdefault(name, wildcard)
+
+    candidates = [name for name in available if weights.get(name, 0) > 0]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda name: weights[name])
+
+# =====================================================
+# COMPRESORES
+# =====================================================
+
+class _Compressor:
+    """Interfaz incremental común a gzip y brotli"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            # wbits=31: formato gzip (header + trailer) sobre deflate
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def flush(self) -> bytes:
+        """Vacía lo pendiente para que el cliente pueda ir descomprimiendo el stream"""
+        if self.encoding == "br":
+            return self._brotli.flush()
+        return self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+# =====================================================
+# MIDDLEWARE
+# =====================================================
+
+class CompressionMiddleware:
+    """Middleware ASGI de compresión negociada"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = COMPRESSION_MINIMUM_SIZE,
+        gzip_level: int = COMPRESSION_GZIP_LEVEL,
+        brotli_quality: int = COMPRESSION_BROTLI_QUALITY,
+        excluded_paths: Sequence[str] = COMPRESSION_EXCLUDED_PATHS,
+        cache: Optional[TTLCache] = compressed_responses_cache
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.excluded_paths = tuple(excluded_paths)
+        self.cache = cache if cache is not None and cache.maxsize > 0 else None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(self.excluded_paths):
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        url = scope["path"] + "?" + scope.get("query_string", b"").decode("latin-1")
+        responder = _CompressionResponder(self, url, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    """Estado de compresión de una respuesta"""
+
+    def __init__(self, middleware: CompressionMiddleware, url: str, encoding: str, send: Send):
+        self.middleware = middleware
+        self.url = url
+        self.encoding = encoding
+        self._send = send
+        self.start_message: Optional[Message] = None
+        # None = todavía no se decidió; False = pasa sin comprimir; True = comprimiendo stream
+        self.compressing: Optional[bool] = None
+        self.compressor: Optional[_Compressor] = None
+        # Chunks retenidos hasta saber si el cuerpo llega a minimum_size
+        self.buffer = bytearray()
+        self.buffering = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # Se retiene hasta saber si el cuerpo se comprime (cambian los headers)
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        if self.compressing is None:
+            await self._buffer_body(message)
+        elif self.compressing:
+            await self._stream_body(message)
+        else:
+            await self._send(message)
+
+    async def _buffer_body(self, message: Message) -> None:
+        """
+        Acumula el cuerpo hasta minimum_size antes de decidir
+
+        Un BaseHTTPMiddleware (o cualquier capa intermedia) re-emite las respuestas
+        completas como stream de chunks con more_body=True: sin acumular, toda
+        respuesta tomaría el camino de streaming e ignoraría minimum_size y la cache.
+        """
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        if not self.buffering:
+            if not self._should_compress(headers):
+                self.compressing = False
+                await self._send(self.start_message)
+                await self._send(message)
+                return
+            self.buffering = True
+
+        self.buffer += message.get("body", b"")
+        more_body = message.get("more_body", False)
+        # Las respuestas cacheables (ETag fuerte) se acumulan enteras: son una
+        # representación completa y así sus bytes comprimidos pueden reutilizarse
+        cacheable = self.middleware.cache is not None and self._cache_key(headers) is not None
+        if more_body and (cacheable or len(self.buffer) < self.middleware.minimum_size):
+            return
+
+        body = bytes(self.buffer)
+        self.buffer = bytearray()
+        if not more_body:
+            await self._send_whole(headers, body)
+            return
+
+        # Streaming: cada chunk sale comprimido y con flush, sin Content-Length
+        self.compressing = True
+        self.compressor = _Compressor(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        del headers["Content-Length"]
+        await self._send(self.start_message)
+        await self._stream_body({"type": "http.response.body", "body": body, "more_body": True})
+
+    async def _send_whole(self, headers: MutableHeaders, body: bytes) -> None:
+        """Respuesta completa: sin comprimir si es chica, si no de una vez (o de la cache)"""
+        self.compressing = False
+        if len(body) < self.middleware.minimum_size:
+            await self._send(self.start_message)
+            await self._send({"type": "http.response.body", "body": body})
+            return
+
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        compressed = self._compress_whole(headers, body)
+        headers["Content-Length"] = str(len(compressed))
+        await self._send(self.start_message)
+        await self._send({"type": "http.response.body", "body": compressed})
+
+    async def _stream_body(self, message: Message) -> None:
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        chunk = self.compressor.compress(body)
+        chunk += self.compressor.flush() if more_body else self.compressor.finish()
+        await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    def _should_compress(self, headers: MutableHeaders) -> bool:
+        """Según status y headers; el tamaño se decide después de acumular el cuerpo"""
+        if "content-encoding" in headers:
+            return False
+        if self.start_message["status"] < 200 or self.start_message["status"] in (204, 304):
+            return False
+        if headers.get("content-type", "").startswith(_INCOMPRESSIBLE_TYPES):
+            return False
+        return True
+
+    def _compress_whole(self, headers: MutableHeaders, body: bytes) -> bytes:
+        key = self._cache_key(headers)
+        cache = self.middleware.cache
+        if key is not None and cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+
+        compressor = _Compressor(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+        compressed = compressor.compress(body) + compressor.finish()
+
+        if key is not None and cache is not None:
+            cache.set(key, compressed)
+        return compressed
+
+    def _cache_key(self, headers: MutableHeaders) -> Optional[Tuple[str, str, str, str]]:
+        """Solo las respuestas con ETag fuerte identifican unívocamente su cuerpo"""
+        etag = headers.get("etag")
+        if not etag or etag.startswith("W/"):
+            return None
+        return (self.url, headers.get("content-type", ""), etag, self.encoding)
@@ -1,15 +1,118 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-import os
-from dotenv import load_dotenv
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import NullPool, QueuePool
+from fastapi import Depends, Request, Response
+from threading import Lock
+from typing import Dict, List, Optional, Sequence
+import asyncio
+import itertools
+import logging
+import math
+import time
 
-load_dotenv()
+from settings import get_settings
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+settings = get_settings()
+logger = logging.getLogger(__name__)
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+DATABASE_URL = settings.database_url
+
+# Réplicas de lectura (opcional): URLs separadas por coma
+DATABASE_REPLICA_URLS = list(settings.database_replica_urls)
+# Segundos que una réplica caída queda fuera de la rotación antes de reintentarla
+# (también es el intervalo del chequeo de salud en background)
+REPLICA_RETRY_SECONDS = settings.replica_retry_seconds
+# Ventana en la que las lecturas de quien acaba de escribir van al primario
+READ_YOUR_WRITES_SECONDS = settings.read_your_writes_seconds
+
+# Pool de conexiones (por instancia). Con Cloud Run conviene un pool chico por
+# instancia, pre-ping para descartar conexiones muertas tras un reinicio de
+# Cloud SQL y recycle por debajo del timeout de conexiones ociosas.
+DB_POOL_SIZE = settings.db_pool_size
+DB_MAX_OVERFLOW = settings.db_max_overflow
+DB_POOL_TIMEOUT = settings.db_pool_timeout
+DB_POOL_RECYCLE = settings.db_pool_recycle
+DB_POOL_PRE_PING = settings.db_pool_pre_ping
+DB_POOL_USE_LIFO = settings.db_pool_use_lifo
+# Con un pooler externo (pgbouncer) la app no mantiene conexiones propias
+DB_EXTERNAL_POOLER = settings.db_external_pooler
+# Conexiones que abre prime_pool() en el warm-up (no más que DB_POOL_SIZE: las que
+# exceden el pool se cierran al devolverlas)
+DB_WARMUP_CONNECTIONS = settings.warmup_db_connections
+
+def engine_options(url: str) -> dict:
+    """Argumentos de create_engine para la URL según la configuración de pool"""
+    if DB_EXTERNAL_POOLER:
+        return {"poolclass": NullPool}
+    if make_url(url).get_backend_name() == "sqlite":
+        # SQLite elige su propio pool; los parámetros de QueuePool no aplican
+        return {"pool_pre_ping": DB_POOL_PRE_PING}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_use_lifo": DB_POOL_USE_LIFO,
+    }
+
+def pool_stats(target: Engine) -> dict:
+    """Estado actual del pool de un engine"""
+    pool = target.pool
+    stats = {
+        "url": target.url.render_as_string(hide_password=True),
+        "pool_class": type(pool).__name__,
+    }
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "timeout": pool.timeout(),
+        })
+        # max_overflow=-1 (DB_MAX_OVERFLOW=-1): overflow sin límite, no hay cupo que saturar
+        if pool._max_overflow >= 0:
+            capacity = pool.size() + pool._max_overflow
+            stats["saturation"] = round(pool.checkedout() / capacity, 4) if capacity else 0.0
+    return stats
+
+# El engine del primario se crea en el primer uso y no al importar el módulo: el
+# arranque en frío no paga la carga del dialecto ni el driver hasta que hace falta
+_engine: Optional[Engine] = None
+_engine_lock = Lock()
+
+def get_engine() -> Engine:
+    """Engine del primario (lo crea y lo asocia a SessionLocal la primera vez)"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+                SessionLocal.configure(bind=_engine)
+    return _engine
+
+def __getattr__(name: str):
+    # database.engine sigue disponible, creándose al accederlo
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+class LazySessionmaker(sessionmaker):
+    """sessionmaker que crea el engine del primario al abrir la primera sesión"""
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None and "bind" not in local_kw:
+            get_engine()
+        return super().__call__(**local_kw)
+
+# expire_on_commit=False: los valores que vuelven por RETURNING (o que la app acaba
+# de escribir) siguen cargados después del commit y serializar no re-consulta la DB
+SessionLocal = LazySessionmaker(autocommit=False, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
@@ -19,4 +122,238 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def prime_pool(connections: int = DB_WARMUP_CONNECTIONS) -> int:
+    """
+    Abre connections conexiones del primario a la vez (SELECT 1) y las devuelve al
+    pool, para que los primeros requests no paguen el connect
+
+    Returns:
+        Cantidad de conexiones abiertas
+    """
+    target = get_engine()
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = target.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            conn.close()
+    return len(opened)
+
+# =====================================================
+# RÉPLICAS DE LECTURA
+# =====================================================
+
+class ReplicaRouter:
+    """
+    Reparte lecturas entre réplicas en round-robin, salteando las que fallaron hace poco
+
+    Recibe los engines ya creados o, como el primario (get_engine), las URLs para
+    crearlos en el primer uso: importar el módulo no carga dialecto ni driver.
+    """
+
+    def __init__(
+        self,
+        engines: Optional[List[Engine]] = None,
+        retry_seconds: float = REPLICA_RETRY_SECONDS,
+        urls: Sequence[str] = ()
+    ):
+        self.urls = tuple(urls)
+        self.retry_seconds = retry_seconds
+        self._engines: Optional[List[Engine]] = None
+        self._cycle = None
+        self._down_until: Dict[Engine, float] = {}
+        self._lock = Lock()
+        self._task: Optional[asyncio.Task] = None
+        if engines is not None or not self.urls:
+            self._set_engines(engines or [])
+
+    @property
+    def engines(self) -> List[Engine]:
+        """Engines de las réplicas (se crean la primera vez que se piden)"""
+        if self._engines is None:
+            with self._lock:
+                if self._engines is None:
+                    self._set_engines([create_engine(url, **engine_options(url)) for url in self.urls])
+        return self._engines
+
+    def _set_engines(self, engines: List[Engine]) -> None:
+        self._cycle = itertools.cycle(engines) if engines else None
+        self._engines = engines
+
+    def choose(self) -> Optional[Engine]:
+        """Próxima réplica sana, o None si no hay ninguna disponible"""
+        if not self.engines:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(len(self.engines)):
+                candidate = next(self._cycle)
+                if self._down_until.get(candidate, 0) <= now:
+                    return candidate
+        return None
+
+    def mark_unhealthy(self, replica: Engine) -> None:
+        """Saca una réplica de la rotación durante retry_seconds"""
+        with self._lock:
+            self._down_until[replica] = time.monotonic() + self.retry_seconds
+
+    def check_health(self) -> Dict[str, bool]:
+        """Hace ping a cada réplica y actualiza su estado; retorna estado por URL"""
+        status = {}
+        for replica in self.engines:
+            try:
+                with replica.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                with self._lock:
+                    self._down_until.pop(replica, None)
+                status[replica.url.render_as_string(hide_password=True)] = True
+            except OperationalError:
+                self.mark_unhealthy(replica)
+                status[replica.url.render_as_string(hide_password=True)] = False
+        return status
+
+    async def run(self, interval_seconds: float = REPLICA_RETRY_SECONDS) -> None:
+        """
+        Loop de chequeo de salud: saca de la rotación las réplicas caídas antes de que
+        una request las encuentre, y devuelve las recuperadas sin esperar retry_seconds
+        """
+        while True:
+            try:
+                status = await asyncio.to_thread(self.check_health)
+                down = [url for url, healthy in status.items() if not healthy]
+                if down:
+                    logger.warning(f"Réplicas fuera de la rotación: {', '.join(down)}")
+            except Exception as e:
+                logger.error(f"Réplicas: error en el chequeo de salud: {e}")
+            await asyncio.sleep(interval_seconds)
+
+    def start(self) -> None:
+        """Arranca el chequeo periódico en background si hay réplicas (requiere event loop corriendo)"""
+        if (self.urls or self._engines) and self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Detiene el chequeo periódico"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class ReplicaSession(Session):
+    """
+    Sesión de solo lectura sobre una réplica
+
+    Si una consulta falla con OperationalError (réplica caída, conexión cortada),
+    saca la réplica de la rotación y reintenta la consulta en el primario, en lugar
+    de responder 500 a la request.
+    """
+
+    def __init__(self, *args, primary: Optional[Engine] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.primary = primary
+
+    def execute(self, *args, **kwargs):
+        try:
+            return super().execute(*args, **kwargs)
+        except OperationalError:
+            if self.primary is None or self.bind is self.primary:
+                raise
+            logger.warning("Réplica falló en una lectura; se reintenta en el primario")
+            replica_router.mark_unhealthy(self.bind)
+            self.rollback()
+            self.bind = self.primary
+            return super().execute(*args, **kwargs)
+
+
+replica_router = ReplicaRouter(urls=DATABASE_REPLICA_URLS)
+ReplicaSessionLocal = sessionmaker(class_=ReplicaSession, autocommit=False, autoflush=False, expire_on_commit=False)
+
+def session_like(db: Session) -> Session:
+    """
+    Sesión nueva sobre el mismo engine que db (réplica con su fallback al primario, o primario)
+
+    Para trabajo compartido entre requests (single-flight): no depende del ciclo
+    de vida ni de los errores de la sesión de la request que lo inició.
+    """
+    if isinstance(db, ReplicaSession):
+        return ReplicaSessionLocal(bind=db.bind, primary=db.primary)
+    return SessionLocal(bind=db.get_bind())
+
+# Clientes (identificados por su header Authorization) que escribieron recientemente.
+# El registro es por instancia: para que el pin valga aunque la próxima lectura caiga
+# en otra instancia, la escritura también deja la cookie READ_YOUR_WRITES_COOKIE con
+# el vencimiento de la ventana. La cookie solo vuelve si el cliente manda credenciales
+# (mismo origen, o withCredentials en el frontend); sin ella, otra instancia puede
+# servir esa lectura desde una réplica que todavía no tiene la escritura.
+READ_YOUR_WRITES_COOKIE = "read_primary_until"
+_recent_writes: Dict[str, float] = {}
+_recent_writes_lock = Lock()
+
+def mark_recent_write(client_key: Optional[str], response: Optional[Response] = None) -> None:
+    """Registra que el cliente acaba de escribir: sus próximas lecturas van al primario"""
+    if response is not None:
+        response.set_cookie(
+            READ_YOUR_WRITES_COOKIE,
+            f"{time.time() + READ_YOUR_WRITES_SECONDS:.3f}",
+            max_age=max(1, math.ceil(READ_YOUR_WRITES_SECONDS)),
+            httponly=True,
+            # Frontend y API en dominios distintos: cross-site requiere SameSite=None y Secure
+            samesite="none" if settings.is_production else "lax",
+            secure=settings.is_production
+        )
+    if not client_key:
+        return
+    now = time.monotonic()
+    with _recent_writes_lock:
+        _recent_writes[client_key] = now + READ_YOUR_WRITES_SECONDS
+        # Limpieza de entradas vencidas para que el dict no crezca sin límite
+        for key in [k for k, expires in _recent_writes.items() if expires <= now]:
+            del _recent_writes[key]
+
+def has_recent_write(client_key: Optional[str]) -> bool:
+    """True si el cliente escribió dentro de la ventana read-your-writes"""
+    if not client_key:
+        return False
+    with _recent_writes_lock:
+        return _recent_writes.get(client_key, 0) > time.monotonic()
+
+def _pinned_by_cookie(request: Request) -> bool:
+    """True si la request trae la cookie de una escritura reciente (hecha en cualquier instancia)"""
+    try:
+        return float(request.cookies.get(READ_YOUR_WRITES_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+# Dependency para rutas de solo lectura
+def get_read_db(request: Request, db: Session = Depends(get_db)):
+    """
+    Sesión para rutas de solo lectura: una réplica si hay alguna sana, si no el primario.
+
+    Depende de get_db para que, sin réplicas configuradas (o en los tests que
+    sobreescriben get_db), las lecturas usen exactamente la sesión del primario.
+    """
+    client_key = request.headers.get("authorization")
+    pinned = has_recent_write(client_key) or _pinned_by_cookie(request)
+    replica = None if pinned else replica_router.choose()
+    if replica is None:
+        yield db
+        return
+
+    session = ReplicaSessionLocal(bind=replica, primary=db.get_bind())
+    try:
+        yield session
+    except OperationalError:
+        if session.bind is replica:
+            replica_router.mark_unhealthy(replica)
+        raise
+    finally:
+        session.close()
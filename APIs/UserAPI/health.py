@@ -0,0 +1,120 @@
+"""
+Probes de liveness y readiness
+
+/livez solo indica que el proceso atiende requests, sin tocar dependencias: si
+falla, la plataforma reinicia la instancia. /readyz indica si la instancia puede
+recibir tráfico; si responde 503, la plataforma deja de rutearle requests pero no
+la reinicia. Verifica:
+
+- pool: el pool de conexiones del primario no está saturado (se saltea sin
+  límite de overflow, DB_MAX_OVERFLOW=-1)
+- database: SELECT 1 contra el primario (se saltea con el pool saturado, para
+  no quedar esperando una conexión libre)
+- disk: espacio libre en los directorios de uploads
+- hashing: hay cupo para verificar contraseñas (el login no está respondiendo 503)
+
+El resultado se cachea READINESS_CACHE_SECONDS y las probes concurrentes
+comparten una sola verificación, para que las probes no generen carga.
+"""
+from typing import Sequence
+import asyncio
+import shutil
+import time
+
+from sqlalchemy import text
+
+from cache import SingleFlight, TTLCache
+from database import get_engine, pool_stats
+from ratelimit import ConcurrencyLimiter, password_verification_limiter
+from settings import get_settings
+
+settings = get_settings()
+
+READINESS_CACHE_SECONDS = settings.readiness_cache_seconds
+READINESS_MAX_POOL_SATURATION = settings.readiness_max_pool_saturation
+READINESS_MIN_FREE_DISK_MB = settings.readiness_min_free_disk_mb
+
+
+class ReadinessChecker:
+    """Verificaciones de /readyz con resultado cacheado"""
+
+    def __init__(
+        self,
+        upload_dirs: Sequence[str] = settings.upload_dirs,
+        hashing_limiter: ConcurrencyLimiter = password_verification_limiter,
+        cache_seconds: float = READINESS_CACHE_SECONDS,
+        max_pool_saturation: float = READINESS_MAX_POOL_SATURATION,
+        min_free_disk_mb: float = READINESS_MIN_FREE_DISK_MB,
+        name: str = "readiness"
+    ):
+        self.upload_dirs = tuple(upload_dirs)
+        self.hashing_limiter = hashing_limiter
+        self.max_pool_saturation = max_pool_saturation
+        self.min_free_disk_mb = min_free_disk_mb
+        self._cache = TTLCache(name, maxsize=1, ttl=cache_seconds)
+        self._flight = SingleFlight()
+
+    async def status(self) -> dict:
+        """Resultado de las verificaciones, desde la cache si está vigente"""
+        cached = self._cache.get("status")
+        if cached is not None:
+            return cached
+        return await self._flight.do("status", self._check_and_cache)
+
+    async def _check_and_cache(self) -> dict:
+        result = await asyncio.to_thread(self.run_checks)
+        self._cache.set("status", result)
+        return result
+
+    def run_checks(self) -> dict:
+        """Corre todas las verificaciones (bloqueante: hace I/O contra la DB y el disco)"""
+        pool = self.check_pool()
+        checks = {
+            "pool": pool,
+            "database": self.check_database() if pool["ok"] else {"ok": False, "error": "pool saturado, no se verificó"},
+            "disk": self.check_disk(),
+            "hashing": self.check_hashing(),
+        }
+        return {"ready": all(check["ok"] for check in checks.values()), "checks": checks}
+
+    def check_pool(self) -> dict:
+        stats = pool_stats(get_engine())
+        if "saturation" not in stats:
+            # NullPool (pooler externo), pool propio de SQLite u overflow sin límite
+            # (DB_MAX_OVERFLOW=-1): no hay cupo que medir
+            return {"ok": True, "pool_class": stats["pool_class"]}
+        return {
+            "ok": stats["saturation"] < self.max_pool_saturation,
+            "saturation": stats["saturation"],
+            "checked_out": stats["checked_out"],
+        }
+
+    def check_database(self) -> dict:
+        start = time.perf_counter()
+        try:
+            with get_engine().connect() as conn:
+                conn.execute(text("SELECT 1"))
+        except Exception as e:
+            # Solo el tipo: el mensaje del driver puede incluir host y usuario
+            return {"ok": False, "error": type(e).__name__}
+        return {"ok": True, "latency_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+    def check_disk(self) -> dict:
+        free_mb = {}
+        for directory in self.upload_dirs:
+            try:
+                free_mb[directory] = round(shutil.disk_usage(directory).free / 2**20, 1)
+            except OSError:
+                return {"ok": False, "error": f"{directory} no existe o no es accesible"}
+        return {"ok": all(mb >= self.min_free_disk_mb for mb in free_mb.values()), "free_mb": free_mb}
+
+    def check_hashing(self) -> dict:
+        limiter = self.hashing_limiter
+        return {
+            "ok": limiter.inflight < limiter.max_inflight,
+            "inflight": limiter.inflight,
+            "max_inflight": limiter.max_inflight,
+        }
+
+
+readiness_checker = ReadinessChecker()
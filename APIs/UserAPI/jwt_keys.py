@@ -0,0 +1,135 @@
+"""
+Claves RS256 para firmar los access tokens y publicarlas como JWKS
+
+Con JWT_KEYS_DIR configurado, los tokens se firman con RS256 y llevan el header
+"kid" de la clave activa. JobsAPI/MatcheoAPI verifican localmente con las claves
+públicas de GET /.well-known/jwks.json, sin secreto compartido ni llamada a
+UserAPI por request. Sin JWT_KEYS_DIR se sigue firmando con HS256 + SECRET_KEY.
+
+Archivos en JWT_KEYS_DIR:
+    <kid>.pem      clave privada: firma (si es la activa) y verifica
+    <kid>.pub.pem  solo clave pública: verifica tokens de una clave ya retirada
+
+Rotación: generar la clave nueva (python jwt_keys.py <kid>), esperar a que los
+consumidores refresquen el JWKS, activarla con JWT_ACTIVE_KID y, pasada la vida
+de los tokens, reemplazar el .pem viejo por su .pub.pem y luego borrarlo.
+Con más de una clave privada JWT_ACTIVE_KID es obligatoria: la clave recién
+publicada no puede empezar a firmar antes de que los consumidores la conozcan.
+
+(EdDSA no está soportado por python-jose, por eso el algoritmo es RS256.)
+"""
+from typing import Dict, List, Optional
+import os
+import sys
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk
+
+from settings import get_settings
+
+settings = get_settings()
+
+JWT_KEYS_DIR = settings.jwt_keys_dir
+# kid de la clave que firma; obligatorio si hay más de una clave privada
+JWT_ACTIVE_KID = settings.jwt_active_kid
+JWKS_MAX_AGE_SECONDS = settings.jwks_max_age_seconds
+
+RS256 = "RS256"
+
+
+class KeyRing:
+    """Claves RSA por kid: una activa para firmar, todas válidas para verificar"""
+
+    def __init__(self, private_keys: Dict[str, str], public_keys: Dict[str, str], active_kid: Optional[str] = None):
+        """
+        Args:
+            private_keys: kid -> PEM privado
+            public_keys: kid -> PEM público (las privadas agregan el suyo solas)
+            active_kid: kid que firma; None solo si hay una única clave privada
+        """
+        self.private_keys = dict(private_keys)
+        self.public_keys = dict(public_keys)
+        for kid, private_pem in self.private_keys.items():
+            self.public_keys[kid] = public_pem_from_private(private_pem)
+
+        if not active_kid and len(self.private_keys) > 1:
+            raise ValueError(
+                "JWT_ACTIVE_KID es obligatoria con más de una clave privada en JWT_KEYS_DIR "
+                f"({', '.join(sorted(self.private_keys))})"
+            )
+        self.active_kid = active_kid or next(iter(self.private_keys), None)
+        self._jwks: Optional[dict] = None
+        if self.active_kid is not None and self.active_kid not in self.private_keys:
+            raise ValueError(f"JWT_ACTIVE_KID={self.active_kid} no tiene clave privada en JWT_KEYS_DIR")
+
+    @property
+    def signing_key(self) -> str:
+        return self.private_keys[self.active_kid]
+
+    def public_key(self, kid: Optional[str]) -> Optional[str]:
+        return self.public_keys.get(kid) if kid else None
+
+    def jwks(self) -> dict:
+        """Documento JWKS con todas las claves públicas vigentes"""
+        if self._jwks is None:
+            keys: List[dict] = []
+            for kid in sorted(self.public_keys):
+                key = jwk.construct(self.public_keys[kid], RS256).to_dict()
+                key.update({"kid": kid, "use": "sig"})
+                keys.append(key)
+            self._jwks = {"keys": keys}
+        return self._jwks
+
+
+def public_pem_from_private(private_pem: str) -> str:
+    private_key = serialization.load_pem_private_key(private_pem.encode(), password=None)
+    return private_key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+
+
+def load_keyring(directory: str, active_kid: Optional[str] = None) -> Optional[KeyRing]:
+    """KeyRing con las claves de directory; None si no hay claves (modo HS256)"""
+    if not directory or not os.path.isdir(directory):
+        return None
+
+    private_keys, public_keys = {}, {}
+    for filename in sorted(os.listdir(directory)):
+        path = os.path.join(directory, filename)
+        with open(path, encoding="utf-8") as f:
+            if filename.endswith(".pub.pem"):
+                public_keys[filename[:-len(".pub.pem")]] = f.read()
+            elif filename.endswith(".pem"):
+                private_keys[filename[:-len(".pem")]] = f.read()
+
+    if not private_keys:
+        return None
+    return KeyRing(private_keys, public_keys, active_kid)
+
+
+def generate_private_key_pem(key_size: int = 2048) -> str:
+    """Clave RSA nueva en PEM (PKCS8, sin contraseña)"""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=key_size)
+    return private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ).decode()
+
+
+keyring = load_keyring(JWT_KEYS_DIR, JWT_ACTIVE_KID or None)
+
+
+if __name__ == "__main__":
+    # python jwt_keys.py <kid>: genera JWT_KEYS_DIR/<kid>.pem
+    if len(sys.argv) != 2 or not JWT_KEYS_DIR:
+        sys.exit("Uso: JWT_KEYS_DIR=/ruta python jwt_keys.py <kid>")
+    os.makedirs(JWT_KEYS_DIR, exist_ok=True)
+    path = os.path.join(JWT_KEYS_DIR, f"{sys.argv[1]}.pem")
+    if os.path.exists(path):
+        sys.exit(f"{path} ya existe")
+    with open(os.open(path, os.O_WRONLY | os.O_CREAT, 0o600), "w", encoding="utf-8") as f:
+        f.write(generate_private_key_pem())
+    print(f"Clave generada: {path}")
@@ -1,29 +1,37 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from database import engine, Base
+from database import Base, SessionLocal, get_engine, prime_pool, replica_router
 from routes import router
+from outbox import OutboxDispatcher, OutboxPurger, build_sink_from_env
+from revocation import revocation_list
+from serialization import DefaultJSONResponse
+from compression import CompressionMiddleware
+from settings import get_settings
+from auth import warm_up_hashing
+from health import readiness_checker
+from migrations import upgrade as upgrade_schema
+import jwt_keys
+import asyncio
 import os
 import logging
+import time
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-# Solo crear las tablas si no existen (NO borrar las existentes)
-Base.metadata.create_all(bind=engine)
+settings = get_settings()
 
-# Crear directorios si no existen
-os.makedirs("uploaded_cvs", exist_ok=True)
-os.makedirs("profile_pictures", exist_ok=True)
-# ⭐ DIRECTORIOS TEMPORALES (ya existían)
-os.makedirs("temp_files", exist_ok=True)  # Para archivos temporales
-os.makedirs("temp_registrations", exist_ok=True)  # Para datos de registro temporal
+# Configurar logging (LOG_LEVEL)
+settings.configure_logging()
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="UserAPI",
     description="API de usuarios con autenticación JWT y verificación de email temporal",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson para todas las respuestas JSON (si está instalado)
+    default_response_class=DefaultJSONResponse
 )
 
 def get_allowed_origins() -> list[str]:
@@ -31,12 +39,46 @@ def get_allowed_origins() -> list[str]:
     origins = [
         "http://localhost:4200",
     ]
-    extra_origins = os.getenv("ALLOWED_ORIGINS", "")
-    if extra_origins:
-        origins.extend([origin.strip() for origin in extra_origins.split(",") if origin.strip()])
+    origins.extend(settings.allowed_origins)
     return origins
 
 ALLOWED_ORIGINS = get_allowed_origins()
+
+def bootstrap() -> None:
+    """
+    Tablas y directorios que necesita la app
+
+    Corre en el startup y no al importar main: importar la app (tests, herramientas,
+    arranque en frío) no abre conexiones a la DB.
+    """
+    # Solo crear las tablas si no existen (NO borrar las existentes); con el esquema
+    # manejado por fuera se puede saltear con DB_CREATE_TABLES=false
+    if settings.db_create_tables:
+        Base.metadata.create_all(bind=get_engine())
+
+    # create_all no toca tablas existentes: las migraciones agregan columnas e índices
+    # nuevos antes de recibir tráfico (o corren en el deploy: DB_MIGRATE_ON_STARTUP=false)
+    if settings.db_migrate_on_startup:
+        upgrade_schema(get_engine())
+
+    # Crear directorios si no existen: CVs, fotos de perfil, archivos y registros temporales
+    for directory in settings.upload_dirs:
+        os.makedirs(directory, exist_ok=True)
+
+def warm_up() -> dict:
+    """
+    Warm-up (WARMUP_ON_STARTUP=true): abre conexiones del pool y carga bcrypt para que
+    los primeros requests no paguen el connect ni la inicialización del backend
+    """
+    start = time.perf_counter()
+    connections = prime_pool()
+    bcrypt_ms = warm_up_hashing()
+    return {
+        "connections": connections,
+        "bcrypt_ms": round(bcrypt_ms, 1),
+        "total_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
 ALLOW_ORIGIN_REGEX = (
     r"^https://frontend(-qa)?-[a-z0-9-]+(\.us-central1\.run\.app|-uc\.a\.run\.app)$"
 )
@@ -52,14 +94,76 @@ async def startup_event():
         print(f"   - {origin}")
     print(f"📋 CORS regex permitido: {ALLOW_ORIGIN_REGEX}")
 
-# Middleware para logging de requests
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    origin = request.headers.get("origin", "No origin header")
-    logger.info(f"Request: {request.method} {request.url.path} | Origin: {origin}")
-    response = await call_next(request)
-    logger.info(f"Response status: {response.status_code}")
-    return response
+    await asyncio.to_thread(bootstrap)
+
+    # uvicorn no acepta conexiones hasta que termina el startup: con el warm-up
+    # activo, la instancia recibe tráfico recién con el pool y bcrypt listos
+    if settings.warmup_on_startup:
+        stats = await asyncio.to_thread(warm_up)
+        print(f"🔥 Warm-up: {stats}")
+
+    # Filtro de tokens revocados: carga inicial y recarga periódica
+    revocation_list.start(SessionLocal)
+
+    # Réplicas de lectura: chequeo de salud periódico (sin réplicas no hace nada)
+    replica_router.start()
+
+    # Despacho del outbox de eventos (OUTBOX_SINK=memory|file|webhook)
+    sink = build_sink_from_env()
+    if sink is not None:
+        app.state.outbox_dispatcher = OutboxDispatcher(SessionLocal, sink)
+        app.state.outbox_dispatcher.start()
+        print(f"📤 Outbox dispatcher activo ({type(sink).__name__})")
+
+    # Retención del outbox; sin dispatcher también se purgan los pendientes viejos
+    app.state.outbox_purger = OutboxPurger(SessionLocal, include_pending=sink is None)
+    app.state.outbox_purger.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Detener tareas en background"""
+    await revocation_list.stop()
+    await replica_router.stop()
+    dispatcher = getattr(app.state, "outbox_dispatcher", None)
+    if dispatcher is not None:
+        await dispatcher.stop()
+    purger = getattr(app.state, "outbox_purger", None)
+    if purger is not None:
+        await purger.stop()
+
+class RequestLoggingMiddleware:
+    """
+    Logging de requests como middleware ASGI puro
+
+    A diferencia de @app.middleware("http") (BaseHTTPMiddleware), no re-emite el
+    cuerpo de la respuesta como stream, así CompressionMiddleware sigue viendo las
+    respuestas completas en un solo chunk.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = Headers(scope=scope).get("origin", "No origin header")
+        logger.info(f"Request: {scope['method']} {scope['path']} | Origin: {origin}")
+
+        async def send_with_logging(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                logger.info(f"Response status: {message['status']}")
+            await send(message)
+
+        await self.app(scope, receive, send_with_logging)
+
+# Middleware para logging de requests (LOG_REQUESTS=false lo saca de la cadena)
+if settings.log_requests:
+    app.add_middleware(RequestLoggingMiddleware)
+
+# Compresión gzip/brotli (ver compression.py: COMPRESSION_* en el entorno)
+app.add_middleware(CompressionMiddleware)
 
 # Configurar CORS
 app.add_middleware(
@@ -71,11 +175,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Servir archivos estáticos (CVs)
-app.mount("/uploaded_cvs", StaticFiles(directory="uploaded_cvs"), name="uploaded_cvs")
+# Servir archivos estáticos (CVs). check_dir=False: los directorios se crean en el startup
+app.mount("/uploaded_cvs", StaticFiles(directory=settings.upload_cvs_dir, check_dir=False), name="uploaded_cvs")
 
 # Servir fotos de perfil
-app.mount("/profile_pictures", StaticFiles(directory="profile_pictures"), name="profile_pictures")
+app.mount("/profile_pictures", StaticFiles(directory=settings.profile_pictures_dir, check_dir=False), name="profile_pictures")
 
 # Incluir las rutas
 app.include_router(router, prefix="/api/v1", tags=["users"])
@@ -92,6 +196,30 @@ async def root():
         ]
     }
 
+@app.get("/.well-known/jwks.json")
+async def jwks():
+    """Claves públicas para verificar localmente los access tokens RS256 (vacío en modo HS256)"""
+    keyring = jwt_keys.keyring
+    return JSONResponse(
+        content=keyring.jwks() if keyring is not None else {"keys": []},
+        headers={"Cache-Control": f"public, max-age={jwt_keys.JWKS_MAX_AGE_SECONDS}"}
+    )
+
+@app.get("/livez")
+async def livez():
+    """Liveness: el proceso atiende requests (no verifica dependencias)"""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 503 si la DB, el pool, el disco o el hashing no están listos (ver health.py)"""
+    result = await readiness_checker.status()
+    return JSONResponse(
+        status_code=200 if result["ready"] else 503,
+        content={"status": "ready" if result["ready"] else "not_ready", "checks": result["checks"]},
+        headers={"Cache-Control": "no-store"}
+    )
+
 @app.get("/health")
 async def health_check():
     return {
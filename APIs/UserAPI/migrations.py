@@ -0,0 +1,216 @@
+"""
+Migraciones del esquema de UserAPI
+
+create_all solo crea las tablas que no existen: sobre una DB ya desplegada no
+agrega columnas ni índices nuevos a tablas existentes. Cada migración de
+MIGRATIONS lleva una DB existente al esquema de models.py; todas son idempotentes
+(sobre una DB recién creada con create_all no cambian nada) y se registran en
+schema_migrations al aplicarse, cada una en su propia transacción.
+
+Corren en el startup (main.bootstrap, antes de que la instancia reciba tráfico)
+salvo con DB_MIGRATE_ON_STARTUP=false; en ese caso hay que correrlas como paso
+del deploy, antes de rutear tráfico a la nueva versión:
+    python migrations.py
+
+Una migración que necesita intervención manual lanza MigrationError: el startup
+falla y la migración queda pendiente hasta resolverlo.
+
+En PostgreSQL se toma un advisory lock: si varias instancias arrancan a la vez,
+una aplica las migraciones y las demás esperan y no encuentran nada pendiente.
+"""
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+import logging
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from models import USER_EMAIL_PATTERN_INDEX, USER_EMAIL_TRGM_INDEX, USER_SEARCH_INDEX, USERS_FTS_TABLE
+
+logger = logging.getLogger(__name__)
+
+# Clave del advisory lock de PostgreSQL (arbitraria, fija para la app)
+MIGRATIONS_LOCK_KEY = 72_001_027
+
+
+class MigrationError(RuntimeError):
+    """Una migración no puede aplicarse sin intervención manual"""
+
+
+_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("name", String(100), primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# =====================================================
+# MIGRACIONES
+# =====================================================
+
+def _users_email_lower(conn: Connection) -> None:
+    """
+    Índice único sobre lower(email) (INSERT ... ON CONFLICT (lower(email)) lo necesita)
+
+    Si hay emails que solo difieren en mayúsculas la migración se aborta listando
+    las cuentas en conflicto: se resuelven a mano (qué cuenta conserva el email es
+    decisión de un operador, no del startup) y se vuelve a correr.
+    """
+    conflicts = conn.execute(text(
+        "SELECT lower(email), id FROM users "
+        "WHERE lower(email) IN (SELECT lower(email) FROM users GROUP BY lower(email) HAVING count(*) > 1) "
+        "ORDER BY lower(email), id"
+    )).all()
+    if conflicts:
+        by_email: Dict[str, List[int]] = {}
+        for email, user_id in conflicts:
+            by_email.setdefault(email, []).append(user_id)
+        raise MigrationError(
+            "Emails duplicados sin distinguir mayúsculas (resolver a mano antes de migrar): "
+            + "; ".join(f"{email}: usuarios {', '.join(map(str, ids))}" for email, ids in by_email.items())
+        )
+
+    conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email_lower ON users (lower(email))"))
+
+
+def _users_version_id(conn: Connection) -> None:
+    """Columna version_id (control de concurrencia optimista); las filas existentes arrancan en 1"""
+    if "version_id" not in _column_names(conn, "users"):
+        conn.execute(text("ALTER TABLE users ADD COLUMN version_id INTEGER DEFAULT 1 NOT NULL"))
+
+
+def _users_updated_at(conn: Connection) -> None:
+    """
+    Columna updated_at (change feed interno) y su índice (updated_at, id)
+
+    Se agrega NOT NULL con un default constante (SQLite no acepta agregar una columna
+    con un default no constante, y en PostgreSQL no reescribe la tabla) y se
+    rellena con created_at; el default queda solo para las filas ya existentes.
+    """
+    if "updated_at" not in _column_names(conn, "users"):
+        column_type = DateTime().compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE users ADD COLUMN updated_at {column_type} DEFAULT '1970-01-01 00:00:00' NOT NULL"))
+        conn.execute(
+            text("UPDATE users SET updated_at = coalesce(created_at, :now)"),
+            {"now": datetime.utcnow()},
+        )
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("ALTER TABLE users ALTER COLUMN updated_at DROP DEFAULT"))
+
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_updated_at_id ON users (updated_at, id)"))
+
+
+def _users_email_search_indexes(conn: Connection) -> None:
+    """Índices del autocompletado de recruiters: prefijo (text_pattern_ops) y trigram"""
+    if conn.dialect.name != "postgresql":
+        return
+    conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    conn.execute(text(USER_EMAIL_PATTERN_INDEX))
+    conn.execute(text(USER_EMAIL_TRGM_INDEX))
+
+
+def _outbox_events_failed_at(conn: Connection) -> None:
+    """Columna failed_at del outbox (eventos que agotaron los reintentos)"""
+    # Sin la tabla no hay nada que migrar: create_all la crea completa
+    if inspect(conn).has_table("outbox_events") and "failed_at" not in _column_names(conn, "outbox_events"):
+        column_type = DateTime().compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE outbox_events ADD COLUMN failed_at {column_type}"))
+
+
+def _users_search_index(conn: Connection) -> None:
+    """
+    Índice de la búsqueda full-text para los usuarios existentes
+
+    PostgreSQL: índice GIN sobre el tsvector (se llena al crearlo). SQLite: tabla
+    FTS5 reconstruida desde users (UserService solo la actualiza en cada cambio).
+    """
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(USER_SEARCH_INDEX))
+    elif conn.dialect.name == "sqlite":
+        conn.execute(text(USERS_FTS_TABLE))
+        conn.execute(text("DELETE FROM users_fts"))
+        conn.execute(text(
+            "INSERT INTO users_fts (rowid, nombre, apellido, email, descripcion) "
+            "SELECT id, nombre, coalesce(apellido, ''), email, coalesce(descripcion, '') FROM users"
+        ))
+
+
+def _users_search_index_email_parts(conn: Connection) -> None:
+    """
+    Índice de búsqueda con el email también separado en usuario y dominio (PostgreSQL)
+
+    La expresión indexada cambió: se crea el índice nuevo y se borra el anterior,
+    que la consulta ya no puede usar.
+    """
+    if conn.dialect.name != "postgresql":
+        return
+    conn.execute(text(USER_SEARCH_INDEX))
+    conn.execute(text("DROP INDEX IF EXISTS ix_users_search_tsv"))
+
+
+def _column_names(conn: Connection, table: str) -> set:
+    return {column["name"] for column in inspect(conn).get_columns(table)}
+
+
+Migration = Tuple[str, Callable[[Connection], None]]
+
+# En orden de aplicación; el nombre no se cambia una vez desplegada la migración
+MIGRATIONS: List[Migration] = [
+    ("0001_users_email_lower", _users_email_lower),
+    ("0002_users_version_id", _users_version_id),
+    ("0003_users_updated_at", _users_updated_at),
+    ("0004_users_email_search_indexes", _users_email_search_indexes),
+    ("0005_outbox_events_failed_at", _outbox_events_failed_at),
+    ("0006_users_search_index", _users_search_index),
+    ("0007_users_search_index_email_parts", _users_search_index_email_parts),
+]
+
+# =====================================================
+# EJECUCIÓN
+# =====================================================
+
+def upgrade(engine: Engine) -> List[str]:
+    """
+    Aplica las migraciones pendientes en orden
+
+    Returns:
+        Los nombres de las migraciones aplicadas (vacía si no había pendientes)
+    """
+    applied = []
+    with engine.connect() as conn:
+        postgres = conn.dialect.name == "postgresql"
+        if postgres:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATIONS_LOCK_KEY})
+            conn.commit()
+        try:
+            _metadata.create_all(conn)
+            conn.commit()
+            done = set(conn.scalars(select(schema_migrations.c.name)))
+            for name, migrate in MIGRATIONS:
+                if name in done:
+                    continue
+                migrate(conn)
+                conn.execute(schema_migrations.insert().values(name=name, applied_at=datetime.utcnow()))
+                conn.commit()
+                logger.info("Migración aplicada: %s", name)
+                applied.append(name)
+        finally:
+            conn.rollback()
+            if postgres:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATIONS_LOCK_KEY})
+                conn.commit()
+    return applied
+
+
+def main() -> None:
+    from database import get_engine
+
+    logging.basicConfig(level=logging.INFO)
+    applied = upgrade(get_engine())
+    print(f"Migraciones aplicadas: {', '.join(applied)}" if applied else "El esquema está al día")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, Enum, Text, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Date, Enum, Text, Boolean, ForeignKey, DateTime, Index, func, event, DDL
 from sqlalchemy.orm import relationship
 from database import Base
 import enum
@@ -36,13 +36,142 @@ class User(Base):
     # Campos específicos de empresas (nullable para candidatos y admin)
     descripcion = Column(Text, nullable=True)
 
-    # Timestamps
+    # Timestamps (updated_at alimenta el change feed interno: /internal/users/changes)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    # Control de concurrencia optimista: se incrementa en cada UPDATE y se expone como ETag
+    version_id = Column(Integer, nullable=False, default=1)
+
+    # Índice funcional único: las búsquedas por lower(email) siguen siendo index scans
+    __table_args__ = (
+        Index("ix_users_email_lower", func.lower(email), unique=True),
+        # Recorrido del change feed por cursor (updated_at, id)
+        Index("ix_users_updated_at_id", updated_at, id),
+    )
+
+    __mapper_args__ = {"version_id_col": version_id}
 
     # Relaciones para recruiters
     recruiting_for = relationship("CompanyRecruiter", foreign_keys="CompanyRecruiter.recruiter_id", back_populates="recruiter")
     company_recruiters = relationship("CompanyRecruiter", foreign_keys="CompanyRecruiter.company_id", back_populates="company")
 
+class OutboxEvent(Base):
+    """Evento de cambio escrito en la misma transacción que el cambio (transactional outbox)"""
+    __tablename__ = "outbox_events"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    event_type = Column(String, nullable=False)
+    aggregate_id = Column(Integer, nullable=False, index=True)
+    payload = Column(Text, nullable=False)  # JSON
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Estado de entrega (lo maneja outbox.OutboxDispatcher)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    dispatched_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    # Agotó OUTBOX_MAX_ATTEMPTS: no se reintenta (dead letter)
+    failed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_outbox_events_pending", dispatched_at, next_attempt_at),
+    )
+
+class UserSession(Base):
+    """
+    Refresh token emitido en un login (ver sessions.py)
+
+    Solo se guarda el hash del token. Cada refresh marca la fila como usada y emite
+    otra en la misma familia; presentar un token ya usado revoca la familia entera.
+    """
+    __tablename__ = "user_sessions"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    family_id = Column(String(36), nullable=False, index=True)
+    token_hash = Column(String(64), nullable=False, unique=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    used_at = Column(DateTime, nullable=True)
+    revoked_at = Column(DateTime, nullable=True)
+
+class RevokedToken(Base):
+    """Access token revocado antes de su exp (ver revocation.py); se purga al expirar"""
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(String(64), primary_key=True)
+    user_id = Column(Integer, nullable=True, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+# =====================================================
+# ÍNDICE DE BÚSQUEDA FULL-TEXT
+# =====================================================
+
+# Documento indexado en PostgreSQL. La consulta de búsqueda debe usar exactamente
+# esta expresión para que el planner elija el índice GIN. El parser indexa un email
+# como un único lexema: va también separado en @ para buscar por usuario o dominio.
+USER_SEARCH_TSVECTOR = (
+    "to_tsvector('simple', coalesce(nombre, '') || ' ' || coalesce(apellido, '') || ' ' "
+    "|| coalesce(email, '') || ' ' || replace(coalesce(email, ''), '@', ' ') || ' ' "
+    "|| coalesce(descripcion, ''))"
+)
+
+# PostgreSQL: índice GIN funcional, la DB lo mantiene sola en cada INSERT/UPDATE
+# (el nombre cambia con la expresión: ver migrations._users_search_index_email_parts)
+USER_SEARCH_INDEX = f"CREATE INDEX IF NOT EXISTS ix_users_search_tsv_v2 ON users USING gin ({USER_SEARCH_TSVECTOR})"
+event.listen(
+    User.__table__,
+    "after_create",
+    DDL(USER_SEARCH_INDEX).execute_if(dialect="postgresql"),
+)
+
+# SQLite (tests/desarrollo): tabla FTS5 con rowid = users.id, sincronizada desde UserService
+USERS_FTS_TABLE = "CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(nombre, apellido, email, descripcion)"
+event.listen(
+    User.__table__,
+    "after_create",
+    DDL(USERS_FTS_TABLE).execute_if(dialect="sqlite"),
+)
+event.listen(
+    User.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS users_fts").execute_if(dialect="sqlite"),
+)
+
+# PostgreSQL: índice para LIKE 'prefijo%' sobre lower(email) en el autocompletado de
+# recruiters; ix_users_email_lower usa la collation de la DB y no sirve para LIKE
+USER_EMAIL_PATTERN_INDEX = (
+    "CREATE INDEX IF NOT EXISTS ix_users_email_lower_pattern ON users (lower(email) text_pattern_ops)"
+)
+event.listen(
+    User.__table__,
+    "after_create",
+    DDL(USER_EMAIL_PATTERN_INDEX).execute_if(dialect="postgresql"),
+)
+
+# PostgreSQL: índice trigram sobre lower(email) para el autocompletado difuso de recruiters
+USER_EMAIL_TRGM_INDEX = "CREATE INDEX IF NOT EXISTS ix_users_email_trgm ON users USING gin (lower(email) gin_trgm_ops)"
+event.listen(
+    User.__table__,
+    "after_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+event.listen(
+    User.__table__,
+    "after_create",
+    DDL(USER_EMAIL_TRGM_INDEX).execute_if(dialect="postgresql"),
+)
+
+def normalize_email(email: str) -> str:
+    """Forma canónica de un email: sin espacios alrededor y en minúsculas"""
+    return email.strip().lower()
+
+def email_matches(email: str):
+    """Criterio case-insensitive por email que aprovecha el índice ix_users_email_lower"""
+    return func.lower(User.email) == normalize_email(email)
+
 class CompanyRecruiter(Base):
     __tablename__ = "company_recruiters"
 
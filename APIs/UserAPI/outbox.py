@@ -0,0 +1,336 @@
+"""
+Transactional outbox para eventos de cambio de usuarios
+
+Los cambios (registro, actualización de perfil, altas/bajas de recruiters) escriben
+un OutboxEvent en la misma transacción. OutboxDispatcher los publica en lotes a un
+sink configurable, con entrega at-least-once y reintentos con backoff exponencial:
+los consumidores deben deduplicar por el "id" del evento. Un evento que agota
+OUTBOX_MAX_ATTEMPTS queda como fallido (failed_at, con su last_error) y deja de
+reintentarse; se vuelve a encolar con requeue_failed.
+
+OutboxPurger borra periódicamente los eventos despachados o fallidos con más de
+OUTBOX_RETENTION_DAYS. Sin sink (OUTBOX_SINK=none) nadie despacha: también borra
+los pendientes con esa antigüedad, para que la tabla no crezca sin límite.
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import List, Optional
+import asyncio
+import json
+import logging
+import queue
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, sessionmaker
+
+from models import OutboxEvent, User
+from schemas import UserResponse
+from settings import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+OUTBOX_SINK = settings.outbox_sink  # none | memory | file | webhook
+OUTBOX_FILE_PATH = settings.outbox_file_path
+OUTBOX_WEBHOOK_URL = settings.outbox_webhook_url
+OUTBOX_BATCH_SIZE = settings.outbox_batch_size
+OUTBOX_POLL_SECONDS = settings.outbox_poll_seconds
+OUTBOX_BACKOFF_SECONDS = settings.outbox_backoff_seconds
+OUTBOX_MAX_BACKOFF_SECONDS = settings.outbox_max_backoff_seconds
+OUTBOX_MAX_ATTEMPTS = settings.outbox_max_attempts
+OUTBOX_RETENTION_DAYS = settings.outbox_retention_days
+OUTBOX_PURGE_SECONDS = settings.outbox_purge_seconds
+
+# =====================================================
+# ESCRITURA (dentro de la transacción del cambio)
+# =====================================================
+
+def user_payload(user: User) -> dict:
+    """Representación pública del usuario para el payload de los eventos"""
+    return UserResponse.model_validate(user).model_dump(mode="json")
+
+def record_event(db: Session, event_type: str, aggregate_id: int, payload: dict) -> OutboxEvent:
+    """
+    Agrega un evento al outbox; se persiste con el commit de la transacción del cambio
+
+    Args:
+        db: Sesión de la transacción en curso
+        event_type: Tipo de evento (user.created, user.updated, recruiter.linked, ...)
+        aggregate_id: ID del usuario (o empresa) afectado
+        payload: Datos del evento, serializables a JSON
+    """
+    event = OutboxEvent(
+        event_type=event_type,
+        aggregate_id=aggregate_id,
+        payload=json.dumps(payload, default=str)
+    )
+    db.add(event)
+    return event
+
+# =====================================================
+# SINKS
+# =====================================================
+
+class EventSink(ABC):
+    """Destino de publicación; publish debe fallar con excepción si no entregó el lote"""
+
+    @abstractmethod
+    def publish(self, events: List[dict]) -> None:
+        """Entrega el lote completo o lanza una excepción"""
+
+class InMemorySink(EventSink):
+    """Cola en memoria (tests y desarrollo)"""
+
+    def __init__(self):
+        self.queue: "queue.Queue[dict]" = queue.Queue()
+
+    def publish(self, events: List[dict]) -> None:
+        for event in events:
+            self.queue.put(event)
+
+    def drain(self) -> List[dict]:
+        """Retorna y quita todos los eventos publicados hasta ahora"""
+        events = []
+        while not self.queue.empty():
+            events.append(self.queue.get_nowait())
+        return events
+
+class FileSink(EventSink):
+    """Agrega cada evento como una línea JSON a un archivo"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def publish(self, events: List[dict]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            for event in events:
+                f.write(json.dumps(event) + "\n")
+
+class WebhookSink(EventSink):
+    """POST del lote como {"events": [...]} a una URL; cualquier respuesta no 2xx es un fallo"""
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def publish(self, events: List[dict]) -> None:
+        # httpx solo hace falta con este sink: no se importa en el arranque
+        import httpx
+        response = httpx.post(self.url, json={"events": events}, timeout=self.timeout)
+        response.raise_for_status()
+
+def build_sink_from_env() -> Optional[EventSink]:
+    """Sink según OUTBOX_SINK; None si el despacho está deshabilitado"""
+    if OUTBOX_SINK == "memory":
+        return InMemorySink()
+    if OUTBOX_SINK == "file":
+        return FileSink(OUTBOX_FILE_PATH)
+    if OUTBOX_SINK == "webhook" and OUTBOX_WEBHOOK_URL:
+        return WebhookSink(OUTBOX_WEBHOOK_URL)
+    return None
+
+# =====================================================
+# DISPATCHER
+# =====================================================
+
+class OutboxDispatcher:
+    """Publica en lotes los eventos pendientes del outbox, con reintentos y backoff"""
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        sink: EventSink,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        backoff_seconds: float = OUTBOX_BACKOFF_SECONDS,
+        max_backoff_seconds: float = OUTBOX_MAX_BACKOFF_SECONDS,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS
+    ):
+        self.session_factory = session_factory
+        self.sink = sink
+        self.batch_size = batch_size
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.max_attempts = max_attempts
+        self._task: Optional[asyncio.Task] = None
+
+    def dispatch_once(self) -> int:
+        """
+        Publica un lote de eventos pendientes
+
+        Returns:
+            Cantidad de eventos publicados (0 si no había pendientes o el sink falló)
+        """
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            query = db.query(OutboxEvent).filter(
+                OutboxEvent.dispatched_at.is_(None),
+                OutboxEvent.failed_at.is_(None),
+                OutboxEvent.next_attempt_at <= now
+            ).order_by(OutboxEvent.id).limit(self.batch_size)
+            if db.get_bind().dialect.name == "postgresql":
+                # Varias instancias despachando en paralelo no toman el mismo lote
+                query = query.with_for_update(skip_locked=True)
+            events = query.all()
+            if not events:
+                return 0
+
+            try:
+                self.sink.publish([self._to_message(event) for event in events])
+            except Exception as e:
+                logger.warning(f"Outbox: fallo publicando {len(events)} eventos: {e}")
+                for event in events:
+                    event.attempts += 1
+                    event.last_error = str(e)[:1000]
+                    if event.attempts >= self.max_attempts:
+                        # Dead letter: no se reintenta más hasta que alguien lo reencole
+                        event.failed_at = now
+                        logger.error(
+                            f"Outbox: evento {event.id} ({event.event_type}) marcado como fallido "
+                            f"tras {event.attempts} intentos: {event.last_error}"
+                        )
+                        continue
+                    delay = min(self.backoff_seconds * 2 ** (event.attempts - 1), self.max_backoff_seconds)
+                    event.next_attempt_at = now + timedelta(seconds=delay)
+                db.commit()
+                return 0
+
+            for event in events:
+                event.dispatched_at = now
+            db.commit()
+            return len(events)
+        finally:
+            db.close()
+
+    def requeue_failed(self, event_ids: Optional[List[int]] = None) -> int:
+        """
+        Vuelve a encolar eventos fallidos (todos, o solo event_ids) con los intentos en cero
+
+        Returns:
+            Cantidad de eventos reencolados
+        """
+        db = self.session_factory()
+        try:
+            query = db.query(OutboxEvent).filter(OutboxEvent.failed_at.isnot(None))
+            if event_ids is not None:
+                query = query.filter(OutboxEvent.id.in_(event_ids))
+            requeued = query.update(
+                {
+                    OutboxEvent.failed_at: None,
+                    OutboxEvent.attempts: 0,
+                    OutboxEvent.next_attempt_at: datetime.utcnow(),
+                },
+                synchronize_session=False
+            )
+            db.commit()
+            return requeued
+        finally:
+            db.close()
+
+    async def run(self, poll_seconds: float = OUTBOX_POLL_SECONDS) -> None:
+        """Loop de despacho: vacía el outbox y espera poll_seconds cuando no hay pendientes"""
+        while True:
+            try:
+                dispatched = await asyncio.to_thread(self.dispatch_once)
+            except Exception as e:
+                logger.error(f"Outbox: error en el dispatcher: {e}")
+                dispatched = 0
+            if dispatched < self.batch_size:
+                await asyncio.sleep(poll_seconds)
+
+    def start(self) -> None:
+        """Arranca el loop de despacho en background (requiere event loop corriendo)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Detiene el loop de despacho"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @staticmethod
+    def _to_message(event: OutboxEvent) -> dict:
+        return {
+            "id": event.id,
+            "type": event.event_type,
+            "aggregate_id": event.aggregate_id,
+            "created_at": event.created_at.isoformat(),
+            "payload": json.loads(event.payload)
+        }
+
+# =====================================================
+# RETENCIÓN
+# =====================================================
+
+def purge_events(db: Session, retention_days: float = OUTBOX_RETENTION_DAYS, include_pending: bool = False) -> int:
+    """
+    Borra los eventos despachados o fallidos hace más de retention_days
+
+    Args:
+        db: Sesión (hace commit)
+        retention_days: Antigüedad a partir de la cual se borran
+        include_pending: También los pendientes creados hace más de retention_days
+            (solo cuando no hay dispatcher que los vaya a publicar)
+
+    Returns:
+        Cantidad de eventos borrados
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    conditions = [OutboxEvent.dispatched_at < cutoff, OutboxEvent.failed_at < cutoff]
+    if include_pending:
+        conditions.append(OutboxEvent.created_at < cutoff)
+    purged = db.query(OutboxEvent).filter(or_(*conditions)).delete(synchronize_session=False)
+    db.commit()
+    return purged
+
+class OutboxPurger:
+    """Purga periódica del outbox (ver purge_events)"""
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        include_pending: bool = False,
+        retention_days: float = OUTBOX_RETENTION_DAYS
+    ):
+        self.session_factory = session_factory
+        self.include_pending = include_pending
+        self.retention_days = retention_days
+        self._task: Optional[asyncio.Task] = None
+
+    def purge_once(self) -> int:
+        db = self.session_factory()
+        try:
+            return purge_events(db, self.retention_days, self.include_pending)
+        finally:
+            db.close()
+
+    async def run(self, purge_seconds: float = OUTBOX_PURGE_SECONDS) -> None:
+        """Loop de purga: una pasada cada purge_seconds"""
+        while True:
+            try:
+                purged = await asyncio.to_thread(self.purge_once)
+                if purged:
+                    logger.info(f"Outbox: {purged} eventos purgados")
+            except Exception as e:
+                logger.error(f"Outbox: error purgando eventos: {e}")
+            await asyncio.sleep(purge_seconds)
+
+    def start(self) -> None:
+        """Arranca el loop de purga en background (requiere event loop corriendo)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Detiene el loop de purga"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,205 @@
+"""
+Rate limiting y load shedding del login
+
+Cada intento de /login consume un token de dos buckets (por IP y por email). Sin
+tokens se responde 429 con Retry-After antes de tocar bcrypt. Además, un límite
+global de verificaciones de contraseña en vuelo por proceso corta ráfagas con 503
+en lugar de encolarlas y dejar sin CPU al resto de las rutas.
+
+El estado de los buckets vive en un backend intercambiable: en memoria (por
+proceso, default) o Redis (RATE_LIMIT_BACKEND=redis, compartido entre instancias;
+requiere el paquete redis).
+"""
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from threading import Lock
+from typing import Optional, Tuple
+import math
+import time
+
+from fastapi import HTTPException, Request, status
+
+from cache import TTLCache
+from settings import get_settings
+
+settings = get_settings()
+
+RATE_LIMIT_BACKEND = settings.rate_limit_backend  # memory | redis
+RATE_LIMIT_REDIS_URL = settings.rate_limit_redis_url
+LOGIN_IP_BURST = settings.login_ip_burst
+LOGIN_IP_PER_MINUTE = settings.login_ip_per_minute
+LOGIN_EMAIL_BURST = settings.login_email_burst
+LOGIN_EMAIL_PER_MINUTE = settings.login_email_per_minute
+LOGIN_MAX_CONCURRENT_VERIFICATIONS = settings.login_max_concurrent_verifications
+TRUSTED_PROXY_HOPS = settings.trusted_proxy_hops
+
+# =====================================================
+# BACKENDS DE TOKEN BUCKET
+# =====================================================
+
+class RateLimitBackend(ABC):
+    """Estado compartido de token buckets"""
+
+    @abstractmethod
+    def take(self, key: str, capacity: int, refill_per_second: float) -> Tuple[bool, float]:
+        """
+        Consume un token del bucket key
+
+        Returns:
+            (permitido, segundos hasta que haya un token si no se permitió)
+        """
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Buckets en una TTLCache del proceso: un bucket que expira equivale a uno lleno"""
+
+    def __init__(self, name: str = "login_rate_limits", maxsize: int = 100_000):
+        self._buckets = TTLCache(name, maxsize=maxsize, ttl=3600)
+        self._lock = Lock()
+
+    def take(self, key: str, capacity: int, refill_per_second: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill_per_second)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            # Expira cuando se habría rellenado entero: no hace falta guardarlo más
+            self._buckets.set(key, (tokens, now), ttl=(capacity - tokens) / refill_per_second + 1)
+        return allowed, 0.0 if allowed else (1 - tokens) / refill_per_second
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Buckets en Redis, actualizados atómicamente con un script Lua"""
+
+    _SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(data[1]) or capacity
+    local ts = tonumber(data[2]) or now
+    tokens = math.min(capacity, tokens + (now - ts) * rate)
+    local allowed = 0
+    local retry = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    else
+        retry = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1)
+    return {allowed, tostring(retry)}
+    """
+
+    def __init__(self, url: str, prefix: str = "userapi:ratelimit:"):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._script = self.client.register_script(self._SCRIPT)
+
+    def take(self, key: str, capacity: int, refill_per_second: float) -> Tuple[bool, float]:
+        allowed, retry_after = self._script(keys=[self.prefix + key], args=[capacity, refill_per_second])
+        return bool(allowed), float(retry_after)
+
+def build_rate_limit_backend_from_env() -> RateLimitBackend:
+    """Backend según RATE_LIMIT_BACKEND"""
+    if RATE_LIMIT_BACKEND == "redis":
+        return RedisRateLimitBackend(RATE_LIMIT_REDIS_URL)
+    return InMemoryRateLimitBackend()
+
+# =====================================================
+# LÍMITES DEL LOGIN
+# =====================================================
+
+class LoginRateLimiter:
+    """Token buckets por IP y por email para /login"""
+
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        ip_burst: int = LOGIN_IP_BURST,
+        ip_per_minute: float = LOGIN_IP_PER_MINUTE,
+        email_burst: int = LOGIN_EMAIL_BURST,
+        email_per_minute: float = LOGIN_EMAIL_PER_MINUTE,
+        trusted_proxy_hops: int = TRUSTED_PROXY_HOPS
+    ):
+        self.backend = backend
+        self.trusted_proxy_hops = trusted_proxy_hops
+        self.ip_burst = ip_burst
+        self.ip_rate = ip_per_minute / 60
+        self.email_burst = email_burst
+        self.email_rate = email_per_minute / 60
+
+    def client_ip(self, request: Request) -> Optional[str]:
+        """
+        IP del cliente para el bucket por IP
+
+        Detrás de un proxy (Cloud Run, load balancer) request.client es el proxy y
+        todos los clientes compartirían un bucket. Con TRUSTED_PROXY_HOPS=n se toma la
+        n-ésima entrada de X-Forwarded-For desde la derecha: la que agregó el primero
+        de los n proxies propios. Las entradas anteriores las puede mandar el cliente.
+        """
+        peer = request.client.host if request.client else None
+        if self.trusted_proxy_hops <= 0:
+            return peer
+        forwarded = [
+            entry.strip()
+            for header in request.headers.getlist("x-forwarded-for")
+            for entry in header.split(",")
+            if entry.strip()
+        ]
+        if len(forwarded) < self.trusted_proxy_hops:
+            # Llegó sin pasar por todos los proxies esperados: no hay entrada confiable
+            return peer
+        return forwarded[-self.trusted_proxy_hops]
+
+    def check(self, client_ip: Optional[str], email: str) -> None:
+        """
+        Consume un intento de login
+
+        Raises:
+            HTTPException 429 con Retry-After si la IP o el email agotaron su bucket
+        """
+        allowed, retry_after = self.backend.take(f"ip:{client_ip or 'unknown'}", self.ip_burst, self.ip_rate)
+        if allowed:
+            allowed, retry_after = self.backend.take(f"email:{email}", self.email_burst, self.email_rate)
+        if not allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Demasiados intentos de login, probá de nuevo más tarde",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+
+class ConcurrencyLimiter:
+    """Cupo de operaciones en vuelo por proceso; sin cupo falla en el acto (no encola)"""
+
+    def __init__(self, max_inflight: int = LOGIN_MAX_CONCURRENT_VERIFICATIONS, retry_after: int = 1):
+        self.max_inflight = max_inflight
+        self.retry_after = retry_after
+        self.inflight = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Reserva un cupo mientras dura el bloque
+
+        Raises:
+            HTTPException 503 con Retry-After si no hay cupo
+        """
+        if self.inflight >= self.max_inflight:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Servicio saturado, probá de nuevo en unos segundos",
+                headers={"Retry-After": str(self.retry_after)}
+            )
+        self.inflight += 1
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+
+
+login_rate_limiter = LoginRateLimiter(build_rate_limit_backend_from_env())
+password_verification_limiter = ConcurrencyLimiter()
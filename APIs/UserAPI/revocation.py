@@ -0,0 +1,182 @@
+"""
+Revocación de access tokens antes de su exp
+
+Cada token lleva un jti. Revocar (logout) inserta el jti en la tabla
+revoked_tokens. Cada instancia mantiene en memoria un Bloom filter con los jti
+revocados y vigentes, que recarga de la tabla cada REVOCATION_REFRESH_SECONDS:
+
+- jti fuera del filtro: no está revocado, sin tocar la DB (el caso común)
+- jti en el filtro: puede ser un falso positivo, se confirma con una consulta exacta
+
+Un token revocado en otra instancia se rechaza acá recién después de la próxima
+recarga; en la instancia que atendió el logout, de inmediato.
+"""
+from datetime import datetime
+from threading import Lock
+from typing import Iterable, Optional, Set
+import asyncio
+import hashlib
+import logging
+import math
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from models import RevokedToken
+from settings import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+REVOCATION_REFRESH_SECONDS = settings.revocation_refresh_seconds
+REVOCATION_FILTER_CAPACITY = settings.revocation_filter_capacity
+REVOCATION_FILTER_ERROR_RATE = settings.revocation_filter_error_rate
+
+# =====================================================
+# BLOOM FILTER
+# =====================================================
+
+class BloomFilter:
+    """Bloom filter sobre un bytearray, con k índices por double hashing de SHA-256"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self._lock = Lock()
+
+    def _indexes(self, item: str) -> Iterable[int]:
+        digest = hashlib.sha256(item.encode()).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str) -> None:
+        with self._lock:
+            for index in self._indexes(item):
+                self._bits[index >> 3] |= 1 << (index & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[index >> 3] & (1 << (index & 7)) for index in self._indexes(item))
+
+# =====================================================
+# LISTA DE REVOCACIÓN
+# =====================================================
+
+class RevocationList:
+    """Filtro en memoria de jti revocados, respaldado por la tabla revoked_tokens"""
+
+    def __init__(
+        self,
+        capacity: int = REVOCATION_FILTER_CAPACITY,
+        error_rate: float = REVOCATION_FILTER_ERROR_RATE
+    ):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._filter = BloomFilter(capacity, error_rate)
+        self.loaded_at: Optional[datetime] = None
+        self.filter_hits = 0
+        self.false_positives = 0
+        self._task: Optional[asyncio.Task] = None
+        # _lock ordena las altas locales contra el reemplazo del filtro; _revoked_during_refresh
+        # junta las altas hechas mientras una recarga lee la tabla (ver refresh)
+        self._lock = Lock()
+        self._refresh_lock = Lock()
+        self._revoked_during_refresh: Optional[Set[str]] = None
+
+    def revoke(self, db: Session, jti: str, expires_at: datetime, user_id: Optional[int] = None) -> None:
+        """Revoca un token: fila en la tabla (commit) y alta inmediata en el filtro local"""
+        db.merge(RevokedToken(jti=jti, user_id=user_id, expires_at=expires_at))
+        db.commit()
+        with self._lock:
+            self._filter.add(jti)
+            if self._revoked_during_refresh is not None:
+                self._revoked_during_refresh.add(jti)
+
+    def is_revoked(self, db: Session, jti: str) -> bool:
+        """True si el jti está revocado; solo consulta la DB si el filtro da positivo"""
+        if jti not in self._filter:
+            return False
+        self.filter_hits += 1
+        revoked = db.get(RevokedToken, jti) is not None
+        if not revoked:
+            self.false_positives += 1
+        return revoked
+
+    def refresh(self, db: Session) -> int:
+        """
+        Reconstruye el filtro con los jti vigentes de la tabla y purga los vencidos
+
+        Un revoke local que llega mientras se lee la tabla puede no estar en la
+        lectura y caer en el filtro viejo: esos jti se registran aparte y se agregan
+        al filtro nuevo en el mismo paso (bajo _lock) en que se lo reemplaza.
+
+        Returns:
+            Cantidad de tokens revocados cargados
+        """
+        with self._refresh_lock:
+            with self._lock:
+                self._revoked_during_refresh = set()
+            try:
+                now = datetime.utcnow()
+                db.query(RevokedToken).filter(RevokedToken.expires_at <= now).delete(synchronize_session=False)
+                db.commit()
+                jtis = [jti for (jti,) in db.query(RevokedToken.jti)]
+
+                # Si la tabla superó la capacidad configurada, el filtro nuevo crece para
+                # mantener la tasa de falsos positivos
+                new_filter = BloomFilter(max(self.capacity, 2 * len(jtis)), self.error_rate)
+                for jti in jtis:
+                    new_filter.add(jti)
+                with self._lock:
+                    for jti in self._revoked_during_refresh:
+                        new_filter.add(jti)
+                    self._filter = new_filter
+            finally:
+                with self._lock:
+                    self._revoked_during_refresh = None
+            self.loaded_at = now
+            return len(jtis)
+
+    def stats(self) -> dict:
+        return {
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "filter_bits": self._filter.size,
+            "hash_count": self._filter.hash_count,
+            "filter_hits": self.filter_hits,
+            "false_positives": self.false_positives,
+        }
+
+    async def run(self, session_factory: sessionmaker, refresh_seconds: float = REVOCATION_REFRESH_SECONDS) -> None:
+        """Loop de recarga periódica del filtro"""
+        while True:
+            try:
+                await asyncio.to_thread(self._refresh_with, session_factory)
+            except Exception as e:
+                logger.error(f"Revocación: error recargando el filtro: {e}")
+            await asyncio.sleep(refresh_seconds)
+
+    def start(self, session_factory: sessionmaker) -> None:
+        """Arranca la recarga periódica en background (requiere event loop corriendo)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run(session_factory))
+
+    async def stop(self) -> None:
+        """Detiene la recarga periódica"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _refresh_with(self, session_factory: sessionmaker) -> int:
+        db = session_factory()
+        try:
+            return self.refresh(db)
+        finally:
+            db.close()
+
+
+revocation_list = RevocationList()
@@ -1,21 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Header
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Header, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from datetime import date
-import os
-
-from database import get_db
-from schemas import UserResponse, CandidatoCreate, EmpresaCreate, UserUpdate, Token, UserLogin
+from typing import List, Optional, Tuple
+from datetime import date, datetime, timedelta
+import base64
+import binascii
+
+import database
+from database import get_db, get_read_db, mark_recent_write, pool_stats, session_like
+from schemas import UserResponse, CandidatoCreate, EmpresaCreate, UserUpdate, Token, TokenData, TokenRefresh, UserLogin, UserChangesPage
 from services import UserService
-from auth import create_access_token, get_current_user
-from models import User, GenderEnum, UserRoleEnum, CompanyRecruiter
-
+from sessions import SessionService
+from ratelimit import login_rate_limiter, password_verification_limiter
+from revocation import revocation_list
+from auth import ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token, get_current_user, get_current_user_read, verify_token
+from models import User, GenderEnum, UserRoleEnum, CompanyRecruiter, email_matches, normalize_email
+from cache import (
+    TTLCache, NOT_FOUND, all_cache_stats, INTERNAL_USER_NEGATIVE_TTL, internal_user_cache, internal_user_flight,
+    internal_user_needs_primary
+)
+from outbox import record_event
+from serialization import (
+    JSON_MEDIA_TYPE, MSGPACK_AVAILABLE, MSGPACK_MEDIA_TYPE,
+    USER_WIRE_FIELDS, dumps_json, encode_map, encode_user, encode_user_page, field_attribute, negotiate_media_type,
+    project_user, users_json_response
+)
+from settings import Settings, get_settings
+
+settings = get_settings()
 router = APIRouter()
 security = HTTPBearer()
 
 # 🔒 SEGURIDAD: API Key para comunicación interna entre servicios
-INTERNAL_API_KEY = os.getenv("INTERNAL_SERVICE_API_KEY", "internal-service-key-change-in-production")
+INTERNAL_API_KEY = settings.internal_api_key
 
 # ✅ HEALTH CHECK ENDPOINT
 @router.get("/health")
@@ -27,15 +45,86 @@ async def health_check():
         "version": "2.0.0"
     }
 
-def verify_internal_api_key(x_internal_api_key: Optional[str] = Header(None)):
+# Change feed: no se entregan cambios más nuevos que este margen, para no saltear
+# transacciones que todavía no hicieron commit con un updated_at anterior al cursor
+CHANGES_FEED_LAG_SECONDS = settings.changes_feed_lag_seconds
+
+# Cache de sugerencias de recruiters: (fragmento normalizado, limit) -> lista de dicts
+recruiter_suggestions_cache = TTLCache(
+    "recruiter_suggestions",
+    maxsize=settings.recruiter_suggestions_cache_size,
+    ttl=settings.recruiter_suggestions_cache_ttl
+)
+
+def verify_internal_api_key(
+    x_internal_api_key: Optional[str] = Header(None),
+    settings: Settings = Depends(get_settings)
+):
     """Verifica que la API key interna sea válida para comunicación entre servicios"""
-    if x_internal_api_key is None or x_internal_api_key != INTERNAL_API_KEY:
+    if x_internal_api_key is None or x_internal_api_key != settings.internal_api_key:
         raise HTTPException(
             status_code=403,
             detail="API key interna inválida o faltante"
         )
     return True
 
+# =====================================================
+# SPARSE FIELDSETS
+# =====================================================
+
+def sparse_fields(
+    fields: Optional[str] = Query(
+        None,
+        description="Campos a incluir separados por coma (ej: id,email,role); por defecto todos"
+    )
+) -> Optional[Tuple[str, ...]]:
+    """Valida ?fields= contra los campos de UserResponse (400 si hay desconocidos)"""
+    if not fields or not fields.strip():
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(USER_WIRE_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Campos desconocidos: {', '.join(sorted(unknown))}. Disponibles: {', '.join(USER_WIRE_FIELDS)}"
+        )
+    return tuple(field for field in USER_WIRE_FIELDS if field in requested)
+
+def sparse_columns(fields: Optional[Tuple[str, ...]]) -> Optional[List[str]]:
+    """Columnas del modelo User a cargar para un fieldset"""
+    return [field_attribute(field) for field in fields] if fields else None
+
+# =====================================================
+# ETAGS (GETs condicionales y concurrencia optimista)
+# =====================================================
+
+def user_etag(user: User, media_type: str = JSON_MEDIA_TYPE) -> str:
+    """
+    ETag fuerte de un perfil: cambia con cada UPDATE (version_id)
+    Cada representación tiene el suyo (sufijo -mp en msgpack): con un ETag compartido,
+    un 304 validaría en un cache el cuerpo JSON para un cliente que pidió msgpack
+    """
+    suffix = "-mp" if media_type == MSGPACK_MEDIA_TYPE else ""
+    return f'"{user.id}-{user.version_id}{suffix}"'
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """True si algún ETag listado en If-None-Match / If-Match coincide, o es *"""
+    if not header:
+        return False
+    candidates = [candidate.strip().removeprefix("W/") for candidate in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+def expected_version(if_match: Optional[str], user: User) -> Optional[int]:
+    """Versión que el cliente espera modificar según If-Match (412 si ya no es la actual)"""
+    if not if_match or if_match.strip() == "*":
+        return None
+    if not etag_matches(if_match, user_etag(user)):
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="El perfil fue modificado por otra request, volvé a cargarlo"
+        )
+    return user.version_id
+
 # =====================================================
 # REGISTRO Y LOGIN
 # =====================================================
@@ -109,10 +198,17 @@ async def register_empresa(
         )
 
 @router.post("/login", response_model=Token)
-async def login(user_login: UserLogin, db: Session = Depends(get_db)):
-    """Autentica usuario y retorna JWT token"""
+async def login(user_login: UserLogin, request: Request, db: Session = Depends(get_db)):
+    """
+    Autentica usuario y retorna JWT token
+    Limitado por IP y por email (429) y por verificaciones de contraseña en vuelo (503)
+    """
+    login_rate_limiter.check(login_rate_limiter.client_ip(request), normalize_email(user_login.email))
+
     user_service = UserService(db)
-    user = user_service.authenticate_user(user_login.email, user_login.password)
+    # bcrypt fuera del event loop, con cupo global para no saturar la CPU
+    async with password_verification_limiter.slot():
+        user = await run_in_threadpool(user_service.authenticate_user, user_login.email, user_login.password)
 
     if not user:
         raise HTTPException(
@@ -122,32 +218,92 @@ async def login(user_login: UserLogin, db: Session = Depends(get_db)):
         )
 
     access_token = create_access_token(data={"sub": user.email})
+    refresh_token = SessionService(db).issue(user)
+    db.commit()
     return {
         "access_token": access_token,
         "token_type": "bearer",
-        "user": user
+        "user": user,
+        "refresh_token": refresh_token
     }
 
+@router.post("/token/refresh", response_model=Token)
+async def refresh_access_token(body: TokenRefresh, db: Session = Depends(get_db)):
+    """
+    Canjea un refresh token por un access token nuevo, sin volver a verificar la contraseña
+    El refresh token rota: el usado deja de servir y la respuesta trae el siguiente
+    """
+    user, refresh_token = SessionService(db).rotate(body.refresh_token)
+    return {
+        "access_token": create_access_token(data={"sub": user.email}),
+        "token_type": "bearer",
+        "user": user,
+        "refresh_token": refresh_token
+    }
+
+@router.post("/logout")
+async def logout(
+    body: Optional[TokenRefresh] = None,
+    token_data: TokenData = Depends(verify_token),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Revoca el access token usado en la request (y, si se envía, la sesión del refresh token)
+    Un refresh token de otro usuario se ignora: no puede cerrar sesiones ajenas
+    """
+    if token_data.jti:
+        expires_at = token_data.exp or datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        revocation_list.revoke(db, token_data.jti, expires_at, user_id=current_user.id)
+    if body is not None:
+        SessionService(db).revoke(body.refresh_token, user_id=current_user.id)
+    return {"message": "Sesión cerrada"}
+
+@router.post("/sessions/revoke-all")
+async def revoke_my_sessions(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Cierra todas las sesiones del usuario: ningún refresh token emitido vuelve a servir"""
+    revoked = SessionService(db).revoke_all(current_user.id)
+    return {"message": "Sesiones revocadas", "revoked": revoked}
+
 # =====================================================
 # PERFIL DE USUARIO
 # =====================================================
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_profile(current_user: User = Depends(get_current_user)):
-    """Obtiene el perfil del usuario autenticado"""
+async def get_current_user_profile(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    fields: Optional[Tuple[str, ...]] = Depends(sparse_fields),
+    current_user: User = Depends(get_current_user_read)
+):
+    """
+    Obtiene el perfil del usuario autenticado (304 si If-None-Match coincide)
+    Con ?fields= devuelve solo esos campos, sin ETag (el ETag identifica el perfil completo)
+    """
+    if fields:
+        return Response(content=dumps_json(project_user(current_user, fields)), media_type=JSON_MEDIA_TYPE)
+
+    etag = user_etag(current_user)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
     return current_user
 
 @router.put("/me/candidato", response_model=UserResponse)
 async def update_candidato_profile(
+    request: Request,
+    response: Response,
     nombre: Optional[str] = Form(None),
     apellido: Optional[str] = Form(None),
     genero: Optional[GenderEnum] = Form(None),
     fecha_nacimiento: Optional[date] = Form(None),
     profile_picture: Optional[UploadFile] = File(None),
+    if_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Actualiza perfil de candidato"""
+    """Actualiza perfil de candidato (412 si If-Match no coincide con la versión actual)"""
     if current_user.role != UserRoleEnum.candidato:
         raise HTTPException(status_code=403, detail="Solo candidatos pueden usar este endpoint")
 
@@ -159,24 +315,43 @@ async def update_candidato_profile(
         fecha_nacimiento=fecha_nacimiento
     )
 
-    return user_service.update_user(current_user.id, user_update, profile_picture=profile_picture)
+    user = user_service.update_user(
+        current_user.id,
+        user_update,
+        profile_picture=profile_picture,
+        expected_version=expected_version(if_match, current_user)
+    )
+    mark_recent_write(request.headers.get("authorization"), response)
+    response.headers["ETag"] = user_etag(user)
+    return user
 
 @router.put("/me/empresa", response_model=UserResponse)
 async def update_empresa_profile(
+    request: Request,
+    response: Response,
     nombre: Optional[str] = Form(None),
     descripcion: Optional[str] = Form(None),
     profile_picture: Optional[UploadFile] = File(None),
+    if_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Actualiza perfil de empresa"""
+    """Actualiza perfil de empresa (412 si If-Match no coincide con la versión actual)"""
     if current_user.role != UserRoleEnum.empresa:
         raise HTTPException(status_code=403, detail="Solo empresas pueden usar este endpoint")
 
     user_service = UserService(db)
     user_update = UserUpdate(nombre=nombre, descripcion=descripcion)
 
-    return user_service.update_user(current_user.id, user_update, profile_picture=profile_picture)
+    user = user_service.update_user(
+        current_user.id,
+        user_update,
+        profile_picture=profile_picture,
+        expected_version=expected_version(if_match, current_user)
+    )
+    mark_recent_write(request.headers.get("authorization"), response)
+    response.headers["ETag"] = user_etag(user)
+    return user
 
 # =====================================================
 # ENDPOINTS ADMIN
@@ -186,29 +361,92 @@ async def update_empresa_profile(
 async def get_all_users(
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    fields: Optional[Tuple[str, ...]] = Depends(sparse_fields),
+    current_user: User = Depends(get_current_user_read),
+    db: Session = Depends(get_read_db)
 ):
     """Obtiene todos los usuarios (solo admin)"""
     if current_user.role != UserRoleEnum.admin:
         raise HTTPException(status_code=403, detail="Solo administradores")
 
     user_service = UserService(db)
-    return user_service.get_all_users(skip, limit)
+    users = user_service.get_all_users(skip, limit, columns=sparse_columns(fields))
+    return users_json_response(users, fields)
 
 @router.get("/admin/candidates", response_model=List[UserResponse])
 async def get_all_candidates(
     skip: int = 0,
     limit: int = 100,
+    fields: Optional[Tuple[str, ...]] = Depends(sparse_fields),
+    current_user: User = Depends(get_current_user_read),
+    db: Session = Depends(get_read_db)
+):
+    """Obtiene todos los candidatos (solo admin)"""
+    if current_user.role != UserRoleEnum.admin:
+        raise HTTPException(status_code=403, detail="Solo administradores")
+
+    user_service = UserService(db)
+    users = user_service.get_all_candidates(skip, limit, columns=sparse_columns(fields))
+    return users_json_response(users, fields)
+
+@router.get("/admin/caches")
+async def get_cache_stats(current_user: User = Depends(get_current_user_read)):
+    """Métricas de las caches en memoria de esta instancia: hits, misses, tamaño (solo admin)"""
+    if current_user.role != UserRoleEnum.admin:
+        raise HTTPException(status_code=403, detail="Solo administradores")
+
+    return all_cache_stats()
+
+@router.delete("/admin/users/{user_id}/sessions")
+async def revoke_user_sessions(
+    user_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Obtiene todos los candidatos (solo admin)"""
+    """Revoca todas las sesiones de un usuario (solo admin)"""
+    if current_user.role != UserRoleEnum.admin:
+        raise HTTPException(status_code=403, detail="Solo administradores")
+
+    revoked = SessionService(db).revoke_all(user_id)
+    return {"message": "Sesiones revocadas", "revoked": revoked}
+
+@router.get("/admin/db/pool")
+async def get_db_pool_stats(current_user: User = Depends(get_current_user_read)):
+    """Estadísticas en vivo de los pools de conexiones de esta instancia (solo admin)"""
     if current_user.role != UserRoleEnum.admin:
         raise HTTPException(status_code=403, detail="Solo administradores")
 
+    return {
+        "primary": pool_stats(database.engine),
+        "replicas": [pool_stats(replica) for replica in database.replica_router.engines]
+    }
+
+# =====================================================
+# BÚSQUEDA DE USUARIOS
+# =====================================================
+
+@router.get("/users/search", response_model=List[UserResponse])
+async def search_users(
+    q: str = Query(..., min_length=1, max_length=200),
+    role: Optional[UserRoleEnum] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    fields: Optional[Tuple[str, ...]] = Depends(sparse_fields),
+    current_user: User = Depends(get_current_user_read),
+    db: Session = Depends(get_read_db)
+):
+    """Búsqueda full-text de usuarios por nombre, apellido, email y descripción (admin y empresas)"""
+    if current_user.role not in (UserRoleEnum.admin, UserRoleEnum.empresa):
+        raise HTTPException(status_code=403, detail="Solo administradores y empresas")
+
+    # Las empresas nunca ven cuentas admin en los resultados
+    exclude_roles = [] if current_user.role == UserRoleEnum.admin else [UserRoleEnum.admin]
+
     user_service = UserService(db)
-    return user_service.get_all_candidates(skip, limit)
+    users = user_service.search_users(
+        q, role=role, exclude_roles=exclude_roles, skip=skip, limit=limit, columns=sparse_columns(fields)
+    )
+    return users_json_response(users, fields)
 
 # =====================================================
 # GESTIÓN DE RECRUITERS
@@ -217,6 +455,8 @@ async def get_all_candidates(
 @router.post("/companies/add-recruiter")
 async def add_recruiter_to_company(
     recruiter_email: str,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -225,7 +465,7 @@ async def add_recruiter_to_company(
         raise HTTPException(status_code=403, detail="Solo empresas pueden asignar recruiters")
 
     # Buscar al recruiter por email
-    recruiter = db.query(User).filter(User.email == recruiter_email).first()
+    recruiter = db.query(User).filter(email_matches(recruiter_email)).first()
     if not recruiter:
         raise HTTPException(status_code=404, detail="Recruiter no encontrado")
 
@@ -247,14 +487,44 @@ async def add_recruiter_to_company(
         recruiter_id=recruiter.id
     )
     db.add(new_relation)
+    record_event(db, "recruiter.linked", current_user.id, {"company_id": current_user.id, "recruiter_id": recruiter.id})
     db.commit()
+    mark_recent_write(request.headers.get("authorization"), response)
 
     return {"message": f"Recruiter {recruiter_email} asignado exitosamente"}
 
+@router.get("/companies/recruiter-suggestions")
+async def get_recruiter_suggestions(
+    q: str = Query(..., min_length=2, max_length=100),
+    limit: int = Query(10, ge=1, le=25),
+    current_user: User = Depends(get_current_user_read),
+    db: Session = Depends(get_read_db)
+):
+    """Autocompletado de candidatos por email para asignar como recruiters (solo empresas)"""
+    if current_user.role != UserRoleEnum.empresa:
+        raise HTTPException(status_code=403, detail="Solo empresas")
+
+    cache_key = (normalize_email(q), limit)
+    suggestions = recruiter_suggestions_cache.get(cache_key)
+    if suggestions is None:
+        user_service = UserService(db)
+        suggestions = [
+            {
+                "id": user.id,
+                "email": user.email,
+                "nombre": user.nombre,
+                "apellido": user.apellido
+            }
+            for user in user_service.suggest_recruiters(q, limit)
+        ]
+        recruiter_suggestions_cache.set(cache_key, suggestions)
+
+    return {"suggestions": suggestions}
+
 @router.get("/companies/my-recruiters")
 async def get_my_recruiters(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_read),
+    db: Session = Depends(get_read_db)
 ):
     """Obtiene todos los recruiters de una empresa"""
     if current_user.role != UserRoleEnum.empresa:
@@ -282,6 +552,8 @@ async def get_my_recruiters(
 @router.delete("/companies/remove-recruiter")
 async def remove_recruiter_from_company(
     recruiter_email: str,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -290,7 +562,7 @@ async def remove_recruiter_from_company(
         raise HTTPException(status_code=403, detail="Solo empresas")
 
     # Buscar el recruiter por email
-    recruiter = db.query(User).filter(User.email == recruiter_email).first()
+    recruiter = db.query(User).filter(email_matches(recruiter_email)).first()
     if not recruiter:
         raise HTTPException(status_code=404, detail="Recruiter no encontrado")
 
@@ -303,14 +575,16 @@ async def remove_recruiter_from_company(
         raise HTTPException(status_code=404, detail="Relación no encontrada")
 
     db.delete(relation)
+    record_event(db, "recruiter.unlinked", current_user.id, {"company_id": current_user.id, "recruiter_id": recruiter.id})
     db.commit()
+    mark_recent_write(request.headers.get("authorization"), response)
 
     return {"message": "Recruiter eliminado exitosamente"}
 
 @router.get("/me/recruiting-for")
 async def get_recruiting_for(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_read),
+    db: Session = Depends(get_read_db)
 ):
     """Obtiene las empresas para las que el usuario es recruiter"""
     relations = db.query(CompanyRecruiter).filter(
@@ -335,6 +609,8 @@ async def get_recruiting_for(
 @router.delete("/me/resign-from-company/{company_id}")
 async def resign_from_company(
     company_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -349,7 +625,9 @@ async def resign_from_company(
         raise HTTPException(status_code=404, detail="No eres recruiter de esta empresa")
 
     db.delete(relation)
+    record_event(db, "recruiter.unlinked", company_id, {"company_id": company_id, "recruiter_id": current_user.id})
     db.commit()
+    mark_recent_write(request.headers.get("authorization"), response)
 
     return {"message": "Has renunciado exitosamente como recruiter"}
 
@@ -357,23 +635,135 @@ async def resign_from_company(
 # ENDPOINT INTERNO (Para JobsAPI y otros servicios)
 # =====================================================
 
+def encode_changes_cursor(user: User) -> str:
+    """Cursor opaco del change feed a partir del último usuario entregado"""
+    raw = f"{user.updated_at.isoformat()}|{user.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_changes_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decodifica un cursor del change feed en (updated_at, id)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        updated_at, user_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(updated_at), int(user_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+@router.get("/internal/users/changes", response_model=UserChangesPage)
+async def get_user_changes(
+    since: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    accept: Optional[str] = Header(None),
+    db: Session = Depends(get_read_db),
+    _: bool = Depends(verify_internal_api_key)
+):
+    """
+    Change feed interno: usuarios creados o modificados después del cursor `since`
+    Permite a JobsAPI/MatcheoAPI mantener una copia local en lugar de consultar cada usuario
+    Requiere API key interna en header X-Internal-Api-Key
+    Con Accept: application/msgpack responde msgpack (ver serialization.py)
+    """
+    after = decode_changes_cursor(since) if since else None
+    until = datetime.utcnow() - timedelta(seconds=CHANGES_FEED_LAG_SECONDS)
+
+    user_service = UserService(db)
+    users = user_service.get_users_changed_since(after=after, until=until, limit=limit + 1)
+    has_more = len(users) > limit
+    users = users[:limit]
+    next_cursor = encode_changes_cursor(users[-1]) if users else since
+
+    if negotiate_media_type(accept) == MSGPACK_MEDIA_TYPE:
+        return Response(
+            content=encode_user_page(users, next_cursor, has_more),
+            media_type=MSGPACK_MEDIA_TYPE,
+            headers={"Vary": "Accept"}
+        )
+
+    page = UserChangesPage.model_validate(
+        {"users": users, "next_cursor": next_cursor, "has_more": has_more},
+        from_attributes=True
+    )
+    return Response(content=page.model_dump_json(), media_type=JSON_MEDIA_TYPE, headers={"Vary": "Accept"})
+
+def _load_internal_user(user_id: int, source: Session):
+    """
+    Consulta y serializa un usuario para el endpoint interno, y cachea el resultado
+    La entrada es {media type: (etag, bytes)} con el cuerpo ya codificado en cada formato
+    Si el usuario se invalidó mientras se consultaba, el resultado no se cachea
+    Consulta con una sesión propia sobre el engine de source: el resultado lo
+    comparten todas las requests del single-flight, no solo la que lo inició
+    """
+    generation = internal_user_cache.generation(user_id)
+    db = session_like(source)
+    try:
+        user = UserService(db).get_user_by_id(user_id)
+        if not user:
+            internal_user_cache.set(user_id, NOT_FOUND, ttl=INTERNAL_USER_NEGATIVE_TTL, generation=generation)
+            return NOT_FOUND
+
+        entry = {JSON_MEDIA_TYPE: (user_etag(user), UserResponse.model_validate(user).model_dump_json().encode())}
+        if MSGPACK_AVAILABLE:
+            entry[MSGPACK_MEDIA_TYPE] = (user_etag(user, MSGPACK_MEDIA_TYPE), encode_user(user))
+    finally:
+        db.close()
+    internal_user_cache.set(user_id, entry, generation=generation)
+    return entry
+
+def _internal_user_fields(user_id: int, fields: Tuple[str, ...], accept: Optional[str], db: Session) -> Response:
+    """Respuesta del endpoint interno reducida a un fieldset"""
+    user = UserService(db).get_user_by_id(user_id, columns=sparse_columns(fields))
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuario no encontrado"
+        )
+
+    data = project_user(user, fields)
+    if negotiate_media_type(accept) == MSGPACK_MEDIA_TYPE:
+        return Response(content=encode_map(data), media_type=MSGPACK_MEDIA_TYPE, headers={"Vary": "Accept"})
+    return Response(content=dumps_json(data), media_type=JSON_MEDIA_TYPE, headers={"Vary": "Accept"})
+
 @router.get("/internal/users/{user_id}", response_model=UserResponse)
 async def get_user_internal(
     user_id: int,
-    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
+    fields: Optional[Tuple[str, ...]] = Depends(sparse_fields),
+    db: Session = Depends(get_read_db),
+    primary_db: Session = Depends(get_db),
     _: bool = Depends(verify_internal_api_key)
 ):
     """
     Endpoint interno para que otros servicios obtengan datos de usuario
     Requiere API key interna en header X-Internal-Api-Key
+    Soporta GET condicional: con If-None-Match vigente responde 304 sin cuerpo
+    Las respuestas (incluidos los 404) se cachean ya serializadas, y N requests
+    concurrentes por el mismo ID que no están en cache hacen una sola consulta
+    Con Accept: application/msgpack responde msgpack (ver serialization.py)
+    Con ?fields= consulta solo esas columnas, sin cache ni ETag; en msgpack el
+    usuario viaja como mapa {campo: valor} en lugar del layout posicional
     """
-    user_service = UserService(db)
-    user = user_service.get_user_by_id(user_id)
+    if fields:
+        return await run_in_threadpool(_internal_user_fields, user_id, fields, accept, db)
+
+    entry = internal_user_cache.get(user_id)
+    if entry is None:
+        # Recién cambiado: la réplica puede no tener el cambio todavía
+        source = primary_db if internal_user_needs_primary(user_id) else db
+        entry = await internal_user_flight.do(
+            user_id, lambda: run_in_threadpool(_load_internal_user, user_id, source)
+        )
 
-    if not user:
+    if entry is NOT_FOUND:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Usuario no encontrado"
         )
 
-    return user
+    media_type = negotiate_media_type(accept)
+    etag, body = entry[media_type]
+    headers = {"ETag": etag, "Vary": "Accept"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(content=body, media_type=media_type, headers=headers)
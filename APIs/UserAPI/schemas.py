@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import date, datetime
-from typing import Optional
+from typing import List, Optional
 from models import GenderEnum, UserRoleEnum
 
 # =====================================================
@@ -41,10 +41,18 @@ class UserResponse(BaseModel):
     fecha_nacimiento: Optional[date] = None
     descripcion: Optional[str] = None
     created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
 
+class UserChangesPage(BaseModel):
+    """Página del change feed interno de usuarios"""
+    users: List[UserResponse]
+    # Cursor a enviar como ?since= en la próxima llamada
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+
 # =====================================================
 # SCHEMAS PARA ACTUALIZACIÓN
 # =====================================================
@@ -68,6 +76,14 @@ class Token(BaseModel):
     access_token: str
     token_type: str
     user: UserResponse
+    # Refresh token opaco para POST /token/refresh (rota en cada uso)
+    refresh_token: Optional[str] = None
+
+class TokenRefresh(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     email: Optional[str] = None
+    # ID único del token y su vencimiento (para revocarlo antes del exp)
+    jti: Optional[str] = None
+    exp: Optional[datetime] = None
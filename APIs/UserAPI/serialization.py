@@ -0,0 +1,199 @@
+"""
+Serialización de respuestas
+
+JSON: la app usa ORJSONResponse como clase de respuesta por defecto, y los endpoints
+que devuelven listas de usuarios las serializan directo de los objetos ORM a bytes
+con un TypeAdapter de pydantic, salteando la validación + jsonable_encoder + json
+de FastAPI.
+
+msgpack: además de JSON, los endpoints internos responden msgpack cuando el cliente lo pide
+en el header Accept. En msgpack cada usuario viaja como un array posicional en el
+orden de USER_WIRE_FIELDS (sin repetir los nombres de campo), precedido por la
+versión del layout: los consumidores deben rechazar versiones que no conocen.
+Si se agrega un campo, va al final y se incrementa USER_WIRE_VERSION.
+"""
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence
+import enum
+import json
+
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from pydantic import TypeAdapter
+
+try:
+    import msgpack
+except ImportError:  # msgpack es opcional: sin él solo se negocia JSON
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa el json de la stdlib
+    orjson = None
+
+from schemas import UserResponse
+
+MSGPACK_AVAILABLE = msgpack is not None
+
+# Clase de respuesta por defecto de la app
+DefaultJSONResponse = ORJSONResponse if orjson is not None else JSONResponse
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+_MSGPACK_ALIASES = {MSGPACK_MEDIA_TYPE, "application/x-msgpack"}
+
+USER_WIRE_VERSION = 1
+USER_WIRE_FIELDS = (
+    "id",
+    "email",
+    "nombre",
+    "role",
+    "verified",
+    "profile_picture",
+    "apellido",
+    "genero",
+    "fecha_nacimiento",
+    "descripcion",
+    "created_at",
+    "updated_at",
+)
+
+# =====================================================
+# JSON
+# =====================================================
+
+_USER_LIST_ADAPTER = TypeAdapter(List[UserResponse])
+
+def users_json(users: Sequence[Any]) -> bytes:
+    """Lista de usuarios (ORM o UserResponse) serializada a JSON en un solo paso"""
+    return _USER_LIST_ADAPTER.dump_json(_USER_LIST_ADAPTER.validate_python(users, from_attributes=True))
+
+def users_json_response(users: Sequence[Any], fields: Optional[Sequence[str]] = None) -> Response:
+    """
+    Respuesta JSON ya serializada para endpoints que devuelven List[UserResponse]
+    Con fields, cada usuario incluye solo esos campos (ver project_user)
+    """
+    if fields:
+        body = dumps_json([project_user(user, fields) for user in users])
+    else:
+        body = users_json(users)
+    return Response(content=body, media_type=JSON_MEDIA_TYPE)
+
+def dumps_json(data: Any) -> bytes:
+    """JSON compacto con orjson si está disponible"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode()
+
+# =====================================================
+# SPARSE FIELDSETS (?fields=)
+# =====================================================
+
+def field_attribute(field: str) -> str:
+    """Atributo del modelo User del que sale un campo de UserResponse"""
+    return _ORM_ATTRIBUTES.get(field, field)
+
+def project_user(user: Any, fields: Sequence[str]) -> Dict[str, Any]:
+    """
+    Usuario ORM reducido a los campos pedidos, con los valores como en JSON
+    Solo lee esos atributos: no dispara la carga de columnas diferidas por load_only
+    """
+    return {field: _wire_value(getattr(user, field_attribute(field))) for field in fields}
+
+# =====================================================
+# NEGOCIACIÓN
+# =====================================================
+
+def negotiate_media_type(accept: Optional[str]) -> str:
+    """
+    Elige el formato de respuesta según el header Accept
+
+    Retorna MSGPACK_MEDIA_TYPE solo si msgpack está instalado y el cliente lo prefiere
+    (q mayor o igual que el de JSON); en cualquier otro caso, JSON.
+    """
+    if not accept or not MSGPACK_AVAILABLE:
+        return JSON_MEDIA_TYPE
+
+    msgpack_q = json_q = 0.0
+    for media_range in accept.split(","):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        media_type = media_type.lower()
+        if media_type in _MSGPACK_ALIASES:
+            msgpack_q = max(msgpack_q, q)
+        elif media_type in (JSON_MEDIA_TYPE, "application/*", "*/*"):
+            json_q = max(json_q, q)
+
+    return MSGPACK_MEDIA_TYPE if msgpack_q > 0 and msgpack_q >= json_q else JSON_MEDIA_TYPE
+
+# =====================================================
+# CODIFICACIÓN
+# =====================================================
+
+# Atributo de origen de cada campo en el modelo ORM (el resto coincide con el nombre)
+_ORM_ATTRIBUTES = {"verified": "email_verified"}
+
+def _wire_value(value: Any) -> Any:
+    """Mismos valores que UserResponse en modo JSON: enums por valor, fechas en ISO 8601"""
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+def user_to_wire(user: Any) -> List[Any]:
+    """
+    Usuario (ORM o UserResponse) como array posicional según USER_WIRE_FIELDS
+    Lee los atributos directamente, sin pasar por la validación de pydantic
+    """
+    if isinstance(user, UserResponse):
+        return [_wire_value(getattr(user, field)) for field in USER_WIRE_FIELDS]
+    return [_wire_value(getattr(user, _ORM_ATTRIBUTES.get(field, field))) for field in USER_WIRE_FIELDS]
+
+def user_from_wire(values: Sequence[Any]) -> Dict[str, Any]:
+    """Array posicional a dict con los nombres de USER_WIRE_FIELDS"""
+    return dict(zip(USER_WIRE_FIELDS, values))
+
+def encode_user(user: Any) -> bytes:
+    """Un usuario en msgpack: [versión, *campos]"""
+    return msgpack.packb([USER_WIRE_VERSION, *user_to_wire(user)])
+
+def decode_user(body: bytes) -> Dict[str, Any]:
+    """Inversa de encode_user"""
+    version, *values = msgpack.unpackb(body)
+    _check_version(version)
+    return user_from_wire(values)
+
+def encode_map(data: Dict[str, Any]) -> bytes:
+    """Dict arbitrario en msgpack (usuarios proyectados con ?fields=)"""
+    return msgpack.packb(data)
+
+def encode_user_page(users: Sequence[Any], next_cursor: Optional[str], has_more: bool) -> bytes:
+    """Página del change feed en msgpack, con los usuarios como arrays posicionales"""
+    return msgpack.packb({
+        "v": USER_WIRE_VERSION,
+        "fields": list(USER_WIRE_FIELDS),
+        "users": [user_to_wire(user) for user in users],
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+    })
+
+def decode_user_page(body: bytes) -> Dict[str, Any]:
+    """Inversa de encode_user_page, con los usuarios como dicts"""
+    page = msgpack.unpackb(body)
+    _check_version(page["v"])
+    return {
+        "users": [user_from_wire(values) for values in page["users"]],
+        "next_cursor": page["next_cursor"],
+        "has_more": page["has_more"],
+    }
+
+def _check_version(version: int) -> None:
+    if version != USER_WIRE_VERSION:
+        raise ValueError(f"Versión de layout msgpack no soportada: {version}")
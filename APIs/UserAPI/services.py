@@ -5,13 +5,18 @@ Funcionalidades:
 - Autenticación (login)
 - Registro (candidatos y empresas)
 - Consultas de usuarios
+- Búsqueda full-text
 - Actualización de perfil
 - Funciones admin básicas
 """
 from __future__ import annotations
-from sqlalchemy.orm import Session
+from sqlalchemy import func, literal_column, select, text, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, load_only
 from fastapi import HTTPException, status, UploadFile
-from typing import List, Optional, TYPE_CHECKING
+from typing import List, Optional, Sequence, Tuple, TYPE_CHECKING
+from datetime import datetime
 import os
 import uuid
 import re
@@ -20,8 +25,13 @@ if TYPE_CHECKING:
     from models import User
     from schemas import CandidatoCreate, EmpresaCreate, UserUpdate
 
-from models import UserRoleEnum, GenderEnum
-from auth import get_password_hash, verify_password
+from models import UserRoleEnum, GenderEnum, email_matches, normalize_email, USER_SEARCH_TSVECTOR
+from auth import get_password_hash, verify_and_update_password
+from outbox import record_event, user_payload
+from settings import get_settings
+from cache import invalidate_internal_user
+
+settings = get_settings()
 
 
 class UserService:
@@ -35,27 +45,182 @@ class UserService:
     # =====================================================
 
     def get_user_by_email(self, email: str) -> Optional['User']:
-        """Obtiene un usuario por email"""
+        """Obtiene un usuario por email (case-insensitive)"""
         from models import User
-        return self.db.query(User).filter(User.email == email).first()
+        return self.db.query(User).filter(email_matches(email)).first()
 
-    def get_user_by_id(self, user_id: int) -> Optional['User']:
-        """Obtiene un usuario por ID"""
+    def get_user_by_id(self, user_id: int, columns: Optional[Sequence[str]] = None) -> Optional['User']:
+        """Obtiene un usuario por ID (columns: solo esas columnas, ver _load_only)"""
         from models import User
-        return self.db.query(User).filter(User.id == user_id).first()
+        return self._load_only(self.db.query(User), columns).filter(User.id == user_id).first()
 
-    def get_all_users(self, skip: int = 0, limit: int = 100) -> List['User']:
+    def get_all_users(self, skip: int = 0, limit: int = 100, columns: Optional[Sequence[str]] = None) -> List['User']:
         """Obtiene todos los usuarios (endpoint admin)"""
         from models import User
-        return self.db.query(User).offset(skip).limit(limit).all()
+        return self._load_only(self.db.query(User), columns).offset(skip).limit(limit).all()
 
-    def get_all_candidates(self, skip: int = 0, limit: int = 100) -> List['User']:
+    def get_all_candidates(
+        self, skip: int = 0, limit: int = 100, columns: Optional[Sequence[str]] = None
+    ) -> List['User']:
         """Obtiene todos los candidatos (endpoint admin)"""
         from models import User
-        return self.db.query(User).filter(
+        return self._load_only(self.db.query(User), columns).filter(
             User.role == UserRoleEnum.candidato
         ).offset(skip).limit(limit).all()
 
+    def get_users_changed_since(
+        self,
+        after: Optional[Tuple[datetime, int]] = None,
+        until: Optional[datetime] = None,
+        limit: int = 100
+    ) -> List['User']:
+        """
+        Usuarios creados o modificados después de un cursor, en orden (updated_at, id)
+
+        Args:
+            after: Cursor (updated_at, id) del último usuario ya entregado; None = desde el inicio
+            until: Ignora cambios posteriores a este instante (transacciones aún en vuelo)
+            limit: Tamaño máximo de la página
+
+        Returns:
+            Lista de usuarios ordenada por (updated_at, id)
+        """
+        from models import User
+
+        query = self.db.query(User)
+        if after is not None:
+            query = query.filter(tuple_(User.updated_at, User.id) > tuple_(*after))
+        if until is not None:
+            query = query.filter(User.updated_at <= until)
+        return query.order_by(User.updated_at, User.id).limit(limit).all()
+
+    # =====================================================
+    # BÚSQUEDA FULL-TEXT
+    # =====================================================
+
+    def search_users(
+        self,
+        query: str,
+        role: Optional[UserRoleEnum] = None,
+        exclude_roles: Optional[List[UserRoleEnum]] = None,
+        skip: int = 0,
+        limit: int = 20,
+        columns: Optional[Sequence[str]] = None
+    ) -> List['User']:
+        """
+        Busca usuarios por nombre, apellido, email y descripción, ordenados por relevancia
+
+        Usa el índice GIN sobre tsvector en PostgreSQL y la tabla FTS5 en SQLite.
+
+        Args:
+            query: Texto libre a buscar
+            role: Filtra por rol (opcional)
+            exclude_roles: Roles que nunca deben aparecer en el resultado
+            skip: Offset de paginación
+            limit: Tamaño de página
+            columns: Carga solo esas columnas del modelo (además de id)
+
+        Returns:
+            Lista de usuarios, el más relevante primero
+        """
+        from models import User
+
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return []
+
+        if self.db.get_bind().dialect.name == "sqlite":
+            # Cada término como prefijo entre comillas: evita inyectar sintaxis FTS5
+            match = " ".join(f'"{term}"*' for term in terms)
+            # from_statement ignora load_only: la proyección va en el SELECT
+            # (columns son atributos ya validados del modelo, no texto del cliente)
+            select_list = ", ".join(f"users.{column}" for column in sorted({"id", *columns})) if columns else "users.*"
+            sql = (
+                f"SELECT {select_list} FROM users JOIN users_fts ON users_fts.rowid = users.id "
+                "WHERE users_fts MATCH :match"
+            )
+            params = {"match": match, "skip": skip, "limit": limit}
+            if role is not None:
+                sql += " AND users.role = :role"
+                params["role"] = role.name
+            for i, excluded in enumerate(exclude_roles or []):
+                sql += f" AND users.role != :excluded_{i}"
+                params[f"excluded_{i}"] = excluded.name
+            sql += " ORDER BY bm25(users_fts), users.id LIMIT :limit OFFSET :skip"
+            return self.db.query(User).from_statement(text(sql)).params(**params).all()
+
+        document = literal_column(USER_SEARCH_TSVECTOR)
+        ts_query = self._prefix_tsquery(query)
+        search = self._load_only(self.db.query(User), columns).filter(document.op("@@")(ts_query))
+        if role is not None:
+            search = search.filter(User.role == role)
+        if exclude_roles:
+            search = search.filter(User.role.notin_(exclude_roles))
+        return search.order_by(
+            func.ts_rank(document, ts_query).desc(), User.id
+        ).offset(skip).limit(limit).all()
+
+    @staticmethod
+    def _prefix_tsquery(query: str):
+        """
+        tsquery de PostgreSQL con cada lexema de la búsqueda como prefijo: 'term':* & 'otro':*
+
+        Los lexemas salen de to_tsvector('simple', query), el mismo parser del índice:
+        un email queda como un único lexema, igual que en el documento indexado.
+        quote_literal los escapa, así que el texto del cliente no inyecta operadores.
+        """
+        lexemes = func.unnest(func.to_tsvector("simple", query)).table_valued("lexeme")
+        terms = select(
+            func.string_agg(func.quote_literal(lexemes.c.lexeme).concat(":*"), " & ")
+        ).scalar_subquery()
+        return func.to_tsquery("simple", terms)
+
+    def suggest_recruiters(self, fragment: str, limit: int = 10) -> List['User']:
+        """
+        Sugiere candidatos para asignar como recruiters a partir de un fragmento de email
+
+        Primero busca por prefijo con LIKE 'prefijo%' sobre lower(email), que en
+        PostgreSQL resuelve el índice ix_users_email_lower_pattern (text_pattern_ops:
+        compara byte a byte, así que sirve para LIKE con cualquier collation de la DB);
+        si faltan resultados completa con coincidencias parciales (índice trigram).
+
+        Args:
+            fragment: Texto tipeado por la empresa
+            limit: Cantidad máxima de sugerencias
+
+        Returns:
+            Lista de candidatos, primero los que matchean por prefijo
+        """
+        from models import User
+
+        prefix = normalize_email(fragment)
+        if not prefix:
+            return []
+
+        email = func.lower(User.email)
+        # LIKE :prefix || '%' con % y _ escapados: un rango ["abc", "abd") no es
+        # equivalente bajo collations que no ordenan byte a byte (en_US.UTF-8)
+        suggestions = self.db.query(User).filter(
+            email.startswith(prefix, autoescape=True),
+            User.role == UserRoleEnum.candidato
+        ).order_by(email).limit(limit).all()
+
+        if len(suggestions) < limit and len(prefix) >= 3:
+            seen = [user.id for user in suggestions]
+            fuzzy = self.db.query(User).filter(
+                email.contains(prefix, autoescape=True),
+                User.role == UserRoleEnum.candidato
+            )
+            if seen:
+                fuzzy = fuzzy.filter(User.id.notin_(seen))
+            if self.db.get_bind().dialect.name == "postgresql":
+                fuzzy = fuzzy.order_by(func.similarity(email, prefix).desc(), email)
+            else:
+                fuzzy = fuzzy.order_by(func.length(email), email)
+            suggestions.extend(fuzzy.limit(limit - len(suggestions)).all())
+
+        return suggestions
+
     # =====================================================
     # AUTENTICACIÓN
     # =====================================================
@@ -70,6 +235,9 @@ class UserService:
 
         Returns:
             User si las credenciales son válidas, None en caso contrario
+
+        Si el hash guardado tiene un costo de bcrypt distinto de BCRYPT_ROUNDS, se
+        reemplaza por uno nuevo (la contraseña en claro solo está disponible acá).
         """
         # Truncar contraseña a 72 bytes (límite bcrypt)
         password_bytes = password.encode('utf-8')[:72]
@@ -79,9 +247,13 @@ class UserService:
         if not user:
             return None
 
-        if not verify_password(password_truncated, user.hashed_password):
+        valid, new_hash = verify_and_update_password(password_truncated, user.hashed_password)
+        if not valid:
             return None
 
+        if new_hash:
+            self._store_rehashed_password(user, new_hash)
+
         return user
 
     # =====================================================
@@ -106,16 +278,6 @@ class UserService:
         Raises:
             HTTPException: Si el email ya existe
         """
-        from models import User
-
-        # Verificar que el email no exista
-        existing_user = self.get_user_by_email(candidato_data.email)
-        if existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"El email {candidato_data.email} ya está registrado"
-            )
-
         # Truncar contraseña a 72 bytes (límite bcrypt)
         password_bytes = candidato_data.password.encode('utf-8')[:72]
         password_truncated = password_bytes.decode('utf-8', errors='ignore')
@@ -125,9 +287,9 @@ class UserService:
         if profile_picture and profile_picture.filename:
             profile_pic_filename = self._save_profile_picture(profile_picture, candidato_data.email)
 
-        # Crear usuario directamente
-        new_user = User(
-            email=candidato_data.email,
+        # Crear usuario directamente (un único INSERT, el conflicto de email se resuelve en la DB)
+        new_user = self._insert_user(dict(
+            email=normalize_email(candidato_data.email),
             hashed_password=get_password_hash(password_truncated),
             nombre=candidato_data.nombre,
             apellido=candidato_data.apellido,
@@ -137,11 +299,14 @@ class UserService:
             verified=True,
             email_verified=True,
             profile_picture=profile_pic_filename
-        )
+        ))
+        self._sync_search_index(new_user)
+        record_event(self.db, "user.created", new_user.id, user_payload(new_user))
 
-        self.db.add(new_user)
+        # Sin refresh: id, created_at y defaults ya vinieron en el RETURNING
         self.db.commit()
-        self.db.refresh(new_user)
+        # Puede haber un 404 cacheado para este ID
+        invalidate_internal_user(new_user.id)
 
         return new_user
 
@@ -163,16 +328,6 @@ class UserService:
         Raises:
             HTTPException: Si el email ya existe
         """
-        from models import User
-
-        # Verificar que el email no exista
-        existing_user = self.get_user_by_email(empresa_data.email)
-        if existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"El email {empresa_data.email} ya está registrado"
-            )
-
         # Truncar contraseña a 72 bytes (límite bcrypt)
         password_bytes = empresa_data.password.encode('utf-8')[:72]
         password_truncated = password_bytes.decode('utf-8', errors='ignore')
@@ -182,9 +337,9 @@ class UserService:
         if profile_picture and profile_picture.filename:
             profile_pic_filename = self._save_profile_picture(profile_picture, empresa_data.email)
 
-        # Crear empresa directamente
-        new_user = User(
-            email=empresa_data.email,
+        # Crear empresa directamente (un único INSERT, el conflicto de email se resuelve en la DB)
+        new_user = self._insert_user(dict(
+            email=normalize_email(empresa_data.email),
             hashed_password=get_password_hash(password_truncated),
             nombre=empresa_data.nombre,
             descripcion=empresa_data.descripcion,
@@ -192,11 +347,14 @@ class UserService:
             verified=True,
             email_verified=True,
             profile_picture=profile_pic_filename
-        )
+        ))
+        self._sync_search_index(new_user)
+        record_event(self.db, "user.created", new_user.id, user_payload(new_user))
 
-        self.db.add(new_user)
+        # Sin refresh: id, created_at y defaults ya vinieron en el RETURNING
         self.db.commit()
-        self.db.refresh(new_user)
+        # Puede haber un 404 cacheado para este ID
+        invalidate_internal_user(new_user.id)
 
         return new_user
 
@@ -208,49 +366,91 @@ class UserService:
         self,
         user_id: int,
         user_update: 'UserUpdate',
-        profile_picture: Optional[UploadFile] = None
+        profile_picture: Optional[UploadFile] = None,
+        expected_version: Optional[int] = None
     ) -> 'User':
         """
         Actualiza el perfil de un usuario
 
+        Solo escribe las columnas que cambian, con un único
+        UPDATE ... WHERE id = :id RETURNING; si nada cambia no escribe.
+
         Args:
             user_id: ID del usuario a actualizar
             user_update: Datos a actualizar (UserUpdate schema)
             profile_picture: Nueva foto de perfil opcional
+            expected_version: version_id que el cliente leyó (If-Match); None = sin chequeo
 
         Returns:
             User actualizado
 
         Raises:
-            HTTPException: Si el usuario no existe
+            HTTPException: Si el usuario no existe (404) o cambió de versión (412)
         """
-        user = self.get_user_by_id(user_id)
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Usuario no encontrado"
-            )
+        from models import User
 
-        # Actualizar campos básicos
-        update_data = user_update.model_dump(exclude_unset=True)
+        # Usuario ya cargado en esta sesión (p. ej. por get_current_user): sin query extra
+        user = self.db.identity_map.get(self.db.identity_key(User, user_id))
+        if user is not None:
+            self._check_version(user, expected_version)
 
-        for field, value in update_data.items():
-            if field != "password" and hasattr(user, field) and value is not None:
-                setattr(user, field, value)
+        # Campos básicos: los enviados con valor (None = no cambiar)
+        changes = {
+            field: value
+            for field, value in user_update.model_dump(exclude_unset=True).items()
+            if field != "password" and hasattr(User, field) and value is not None
+        }
+        if user is not None:
+            changes = {field: value for field, value in changes.items() if getattr(user, field) != value}
 
         # Actualizar contraseña si se proporciona
         if hasattr(user_update, 'password') and user_update.password:
             password_bytes = user_update.password.encode('utf-8')[:72]
             password_truncated = password_bytes.decode('utf-8', errors='ignore')
-            user.hashed_password = get_password_hash(password_truncated)
+            changes["hashed_password"] = get_password_hash(password_truncated)
 
-        # Actualizar foto de perfil si se proporciona
+        # Actualizar foto de perfil si se proporciona (el nombre de archivo usa el email)
         if profile_picture and profile_picture.filename and profile_picture.size > 0:
-            profile_pic_filename = self._save_profile_picture(profile_picture, user.email)
-            user.profile_picture = profile_pic_filename
-
+            user = user or self._get_user_or_404(user_id)
+            changes["profile_picture"] = self._save_profile_picture(profile_picture, user.email)
+
+        if not changes:
+            user = user or self._get_user_or_404(user_id)
+            self._check_version(user, expected_version)
+            return user
+
+        # version_id se incrementa a mano: version_id_col no aplica a UPDATEs por statement.
+        # updated_at explícito: el mismo valor queda en la fila, en la respuesta y en el evento
+        stmt = update(User).where(User.id == user_id).values(
+            **changes, version_id=User.version_id + 1, updated_at=datetime.utcnow()
+        )
+        if expected_version is not None:
+            stmt = stmt.where(User.version_id == expected_version)
+        # populate_existing: el User que ya estaba en la sesión toma la fila escrita
+        # (otra request pudo cambiarla desde que se cargó). Vía from_statement: el
+        # RETURNING de un UPDATE ORM no pisa los objetos ya cargados
+        if self.db.get_bind().dialect.update_returning:
+            user = self.db.scalars(
+                select(User).from_statement(stmt.returning(User)).execution_options(populate_existing=True)
+            ).first()
+        elif self.db.execute(stmt).rowcount:
+            user = self.db.query(User).populate_existing().filter(User.id == user_id).first()
+        else:
+            user = None
+        if user is None:
+            # El usuario no existe (404) u otra request cambió la versión antes del UPDATE (412)
+            self.db.rollback()
+            self._get_user_or_404(user_id)
+            raise self._version_conflict()
+
+        self._sync_search_index(user)
+        record_event(self.db, "user.updated", user.id, {
+            "changed_fields": sorted(field for field in changes if field != "hashed_password"),
+            "user": user_payload(user)
+        })
+        # Sin refresh: la sesión no expira atributos en el commit (expire_on_commit=False)
         self.db.commit()
-        self.db.refresh(user)
+        invalidate_internal_user(user.id)
 
         return user
 
@@ -258,6 +458,131 @@ class UserService:
     # FUNCIONES AUXILIARES PRIVADAS
     # =====================================================
 
+    def _store_rehashed_password(self, user: 'User', new_hash: str) -> None:
+        """
+        Guarda un rehash de la contraseña sin tratarlo como un cambio del perfil
+
+        UPDATE directo: no incrementa version_id (ETags de los clientes siguen
+        vigentes) ni updated_at (no aparece en el change feed).
+        """
+        from models import User
+        self.db.execute(
+            update(User)
+            .where(User.id == user.id)
+            .values(hashed_password=new_hash, updated_at=User.updated_at)
+        )
+        self.db.commit()
+
+    @staticmethod
+    def _load_only(query, columns: Optional[Sequence[str]]):
+        """
+        Restringe el SELECT a las columnas pedidas (nombres de atributo del modelo User)
+        El resto queda diferido: no debe leerse de los objetos resultantes
+        """
+        from models import User
+        if not columns:
+            return query
+        return query.options(load_only(*(getattr(User, column) for column in columns)))
+
+    def _get_user_or_404(self, user_id: int) -> 'User':
+        """Obtiene un usuario por ID o lanza 404"""
+        user = self.get_user_by_id(user_id)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Usuario no encontrado"
+            )
+        return user
+
+    def _check_version(self, user: 'User', expected_version: Optional[int]) -> None:
+        """Lanza 412 si el cliente pidió una versión (If-Match) distinta de la actual"""
+        if expected_version is not None and user.version_id != expected_version:
+            raise self._version_conflict()
+
+    @staticmethod
+    def _version_conflict() -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="El perfil fue modificado por otra request, volvé a cargarlo"
+        )
+
+    def _insert_user(self, values: dict) -> 'User':
+        """
+        Inserta un usuario con un único statement (INSERT ... ON CONFLICT (lower(email)) DO NOTHING RETURNING)
+
+        Reemplaza el patrón "buscar por email y después insertar": evita un round trip
+        y la carrera entre dos registros concurrentes con el mismo email.
+
+        Args:
+            values: Columnas del usuario a crear
+
+        Returns:
+            User creado (cargado desde el RETURNING)
+
+        Raises:
+            HTTPException: Si el email ya existe
+        """
+        from models import User
+
+        dialect = self.db.get_bind().dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+            stmt = (
+                dialect_insert(User)
+                .values(**values)
+                .on_conflict_do_nothing(index_elements=[func.lower(User.email)])
+                .returning(User)
+            )
+            new_user = self.db.scalars(stmt).first()
+        else:
+            # Fallback para otros dialectos: INSERT vía ORM y conflicto vía IntegrityError
+            new_user = User(**values)
+            self.db.add(new_user)
+            try:
+                self.db.flush()
+            except IntegrityError:
+                self.db.rollback()
+                new_user = None
+
+        if new_user is None:
+            # Si se guardó una foto para este registro, no dejarla huérfana
+            if values.get("profile_picture"):
+                picture_path = os.path.join(settings.profile_pictures_dir, values["profile_picture"])
+                if os.path.exists(picture_path):
+                    os.remove(picture_path)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"El email {values['email']} ya está registrado"
+            )
+
+        return new_user
+
+    def _sync_search_index(self, user: 'User') -> None:
+        """
+        Actualiza la entrada de búsqueda full-text del usuario en la misma transacción
+
+        En PostgreSQL el índice GIN es funcional y se mantiene solo; en SQLite se
+        reescribe la fila de users_fts correspondiente al usuario.
+        """
+        if self.db.get_bind().dialect.name != "sqlite":
+            return
+
+        self.db.flush()
+        self.db.execute(text("DELETE FROM users_fts WHERE rowid = :id"), {"id": user.id})
+        self.db.execute(
+            text(
+                "INSERT INTO users_fts (rowid, nombre, apellido, email, descripcion) "
+                "VALUES (:id, :nombre, :apellido, :email, :descripcion)"
+            ),
+            {
+                "id": user.id,
+                "nombre": user.nombre,
+                "apellido": user.apellido or "",
+                "email": user.email,
+                "descripcion": user.descripcion or "",
+            },
+        )
+
     def _save_profile_picture(self, picture_file: UploadFile, email: str) -> str:
         """
         Guarda una foto de perfil en el sistema de archivos (seguro contra path injection)
@@ -270,7 +595,7 @@ class UserService:
             Nombre del archivo guardado
         """
         # Crear directorio si no existe
-        base_dir = "profile_pictures"
+        base_dir = settings.profile_pictures_dir
         os.makedirs(base_dir, exist_ok=True)
 
         # Whitelist de extensiones permitidas (seguridad)
@@ -0,0 +1,147 @@
+"""
+Sesiones con refresh tokens rotativos
+
+El login emite, además del access token (JWT de vida corta), un refresh token
+opaco. POST /token/refresh lo canjea por un access token nuevo con una consulta
+por hash, sin volver a pagar bcrypt. Cada canje rota el refresh token: el usado
+queda marcado y se emite otro en la misma familia. Si un token ya usado se vuelve
+a presentar (robado y reutilizado, o el cliente legítimo llega tarde) se revoca
+toda la familia y ambos tienen que volver a loguearse.
+"""
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+import hashlib
+import secrets
+import uuid
+
+from fastapi import HTTPException, status
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from models import User, UserSession
+from settings import get_settings
+
+settings = get_settings()
+
+REFRESH_TOKEN_EXPIRE_DAYS = settings.refresh_token_expire_days
+
+
+def hash_refresh_token(token: str) -> str:
+    """SHA-256 del token: es aleatorio de 256 bits, no necesita un hash lento"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class SessionService:
+    """Emisión, rotación y revocación de refresh tokens"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def issue(self, user: User, family_id: Optional[str] = None) -> str:
+        """
+        Crea una sesión para el usuario (no hace commit)
+
+        Args:
+            user: Usuario autenticado
+            family_id: Familia a continuar en una rotación; None = login nuevo
+
+        Returns:
+            El refresh token en claro (solo se guarda su hash)
+        """
+        token = secrets.token_urlsafe(32)
+        self.db.add(UserSession(
+            user_id=user.id,
+            family_id=family_id or str(uuid.uuid4()),
+            token_hash=hash_refresh_token(token),
+            expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+        ))
+        return token
+
+    def rotate(self, token: str) -> Tuple[User, str]:
+        """
+        Canjea un refresh token vigente por uno nuevo de la misma familia
+
+        Returns:
+            (usuario, nuevo refresh token)
+
+        Raises:
+            HTTPException 401 si el token no existe, expiró, fue revocado o ya se usó
+            (en este último caso además se revoca la familia)
+        """
+        now = datetime.utcnow()
+        session = self.db.query(UserSession).filter(
+            UserSession.token_hash == hash_refresh_token(token)
+        ).first()
+        if session is None or session.revoked_at is not None or session.expires_at <= now:
+            raise self._invalid_token()
+
+        # Marcado condicional: de dos canjes concurrentes del mismo token gana uno solo
+        claimed = self.db.execute(
+            update(UserSession)
+            .where(UserSession.id == session.id, UserSession.used_at.is_(None))
+            .values(used_at=now)
+        ).rowcount
+        if not claimed:
+            self.revoke_family(session.family_id)
+            self.db.commit()
+            raise self._invalid_token("Refresh token reutilizado: la sesión fue revocada")
+
+        user = self.db.get(User, session.user_id)
+        if user is None:
+            self.db.rollback()
+            raise self._invalid_token()
+
+        new_token = self.issue(user, family_id=session.family_id)
+        self.db.commit()
+        return user, new_token
+
+    def revoke_family(self, family_id: str) -> int:
+        """Revoca todas las sesiones vigentes de una familia (no hace commit)"""
+        return self.db.execute(
+            update(UserSession)
+            .where(UserSession.family_id == family_id, UserSession.revoked_at.is_(None))
+            .values(revoked_at=datetime.utcnow())
+        ).rowcount
+
+    def revoke(self, token: str, user_id: Optional[int] = None) -> int:
+        """
+        Revoca la familia de un refresh token (logout de ese dispositivo)
+
+        Args:
+            token: Refresh token presentado
+            user_id: Dueño esperado; un token de otro usuario se ignora
+
+        Returns:
+            Cantidad de sesiones revocadas (0 si el token no existe o es de otro usuario)
+        """
+        session = self.db.query(UserSession).filter(
+            UserSession.token_hash == hash_refresh_token(token)
+        ).first()
+        if session is None or (user_id is not None and session.user_id != user_id):
+            return 0
+        revoked = self.revoke_family(session.family_id)
+        self.db.commit()
+        return revoked
+
+    def revoke_all(self, user_id: int) -> int:
+        """
+        Revoca todas las sesiones de un usuario (logout de todos los dispositivos)
+
+        Returns:
+            Cantidad de sesiones revocadas
+        """
+        revoked = self.db.execute(
+            update(UserSession)
+            .where(UserSession.user_id == user_id, UserSession.revoked_at.is_(None))
+            .values(revoked_at=datetime.utcnow())
+        ).rowcount
+        self.db.commit()
+        return revoked
+
+    @staticmethod
+    def _invalid_token(detail: str = "Refresh token inválido o expirado") -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=detail,
+            headers={"WWW-Authenticate": "Bearer"}
+        )
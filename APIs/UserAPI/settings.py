@@ -0,0 +1,350 @@
+"""
+Configuración de UserAPI
+
+Todas las variables de entorno se leen acá, una sola vez: get_settings() carga el
+.env (si existe), parsea y valida todo, y cachea el resultado. Los módulos toman
+sus valores del objeto Settings al importarse, y las rutas que necesiten la
+configuración la reciben con Depends(get_settings) (sobreescribible en los tests
+con app.dependency_overrides).
+
+Si algún valor es inválido, el arranque falla con un SettingsError que lista
+todos los problemas juntos, en lugar de romper más tarde en el primer uso.
+
+Fuera de producción SECRET_KEY e INTERNAL_SERVICE_API_KEY tienen valores de
+desarrollo; con ENVIRONMENT=production son obligatorias.
+"""
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Mapping, Optional, Tuple
+import logging
+import os
+
+from dotenv import load_dotenv
+
+# Valores de desarrollo de los secretos (rechazados con ENVIRONMENT=production)
+DEV_SECRET_KEY = "test-secret-key-for-ci"
+DEV_INTERNAL_API_KEY = "internal-service-key-change-in-production"
+
+_TRUE = ("true", "1", "yes", "on")
+_FALSE = ("false", "0", "no", "off")
+
+
+class SettingsError(ValueError):
+    """Configuración inválida; el mensaje lista todos los errores encontrados"""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("Configuración inválida:\n" + "\n".join(f"  - {error}" for error in errors))
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Configuración tipada y validada de la aplicación"""
+
+    # General y logging
+    environment: str = "development"
+    log_level: str = "INFO"
+    log_requests: bool = True
+    allowed_origins: Tuple[str, ...] = ()
+
+    # Base de datos y pool de conexiones
+    database_url: Optional[str] = None
+    database_replica_urls: Tuple[str, ...] = ()
+    replica_retry_seconds: float = 30
+    read_your_writes_seconds: float = 5
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_pool_use_lifo: bool = True
+    db_external_pooler: bool = False
+    db_create_tables: bool = True
+    db_migrate_on_startup: bool = True
+
+    # Arranque en frío
+    warmup_on_startup: bool = False
+    warmup_db_connections: int = 2
+
+    # Readiness (/readyz)
+    readiness_cache_seconds: float = 2
+    readiness_max_pool_saturation: float = 1.0
+    readiness_min_free_disk_mb: float = 100
+
+    # Tokens y secretos
+    secret_key: str = field(default=DEV_SECRET_KEY, repr=False)
+    internal_api_key: str = field(default=DEV_INTERNAL_API_KEY, repr=False)
+    algorithm: str = "HS256"
+    access_token_expire_minutes: int = 30
+    refresh_token_expire_days: int = 30
+    jwt_accept_hs256: bool = True
+    jwt_keys_dir: str = ""
+    jwt_active_kid: str = ""
+    jwks_max_age_seconds: int = 300
+
+    # Hashing de contraseñas
+    bcrypt_rounds: int = 12
+    bcrypt_target_ms: float = 250
+    login_max_concurrent_verifications: int = 8
+
+    # Rate limiting del login
+    rate_limit_backend: str = "memory"
+    rate_limit_redis_url: str = "redis://localhost:6379/0"
+    login_ip_burst: int = 20
+    login_ip_per_minute: float = 20
+    login_email_burst: int = 5
+    login_email_per_minute: float = 5
+    trusted_proxy_hops: int = 0
+
+    # Caches en memoria
+    token_cache_enabled: bool = True
+    token_cache_size: int = 10000
+    internal_user_cache_size: int = 10000
+    internal_user_cache_ttl: float = 30
+    internal_user_negative_ttl: float = 5
+    recruiter_suggestions_cache_size: int = 1024
+    recruiter_suggestions_cache_ttl: float = 30
+    revocation_refresh_seconds: float = 30
+    revocation_filter_capacity: int = 100000
+    revocation_filter_error_rate: float = 0.001
+    changes_feed_lag_seconds: float = 2
+
+    # Compresión de respuestas
+    compression_minimum_size: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    compression_cache_size: int = 512
+    compression_cache_ttl: float = 300
+
+    # Outbox de eventos
+    outbox_sink: str = "none"
+    outbox_file_path: str = "outbox_events.jsonl"
+    outbox_webhook_url: str = ""
+    outbox_batch_size: int = 100
+    outbox_poll_seconds: float = 1
+    outbox_backoff_seconds: float = 1
+    outbox_max_backoff_seconds: float = 300
+    outbox_max_attempts: int = 10
+    outbox_retention_days: float = 7
+    outbox_purge_seconds: float = 3600
+
+    # Directorios de archivos subidos
+    upload_cvs_dir: str = "uploaded_cvs"
+    profile_pictures_dir: str = "profile_pictures"
+    temp_files_dir: str = "temp_files"
+    temp_registrations_dir: str = "temp_registrations"
+
+    @property
+    def is_production(self) -> bool:
+        return self.environment == "production"
+
+    @property
+    def upload_dirs(self) -> Tuple[str, ...]:
+        """Directorios que la app crea al arrancar y en los que escribe archivos"""
+        return (self.upload_cvs_dir, self.profile_pictures_dir, self.temp_files_dir, self.temp_registrations_dir)
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str]) -> "Settings":
+        """
+        Parsea y valida la configuración desde un mapping de variables de entorno
+
+        Raises:
+            SettingsError: con todos los valores inválidos o faltantes
+        """
+        env = _EnvReader(environ)
+        settings = cls(
+            environment=env.choice("ENVIRONMENT", "development", ("development", "test", "staging", "production")),
+            log_level=env.choice("LOG_LEVEL", "INFO", ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")),
+            log_requests=env.flag("LOG_REQUESTS", True),
+            allowed_origins=env.csv("ALLOWED_ORIGINS"),
+
+            database_url=env.string("DATABASE_URL") or None,
+            database_replica_urls=env.csv("DATABASE_REPLICA_URLS"),
+            replica_retry_seconds=env.number("REPLICA_RETRY_SECONDS", 30, minimum=0),
+            read_your_writes_seconds=env.number("READ_YOUR_WRITES_SECONDS", 5, minimum=0),
+            db_pool_size=env.integer("DB_POOL_SIZE", 5, minimum=1),
+            db_max_overflow=env.integer("DB_MAX_OVERFLOW", 10, minimum=-1),
+            db_pool_timeout=env.number("DB_POOL_TIMEOUT", 30, minimum=0),
+            db_pool_recycle=env.integer("DB_POOL_RECYCLE", 1800, minimum=-1),
+            db_pool_pre_ping=env.flag("DB_POOL_PRE_PING", True),
+            db_pool_use_lifo=env.flag("DB_POOL_USE_LIFO", True),
+            db_external_pooler=env.flag("DB_EXTERNAL_POOLER", False),
+            db_create_tables=env.flag("DB_CREATE_TABLES", True),
+            db_migrate_on_startup=env.flag("DB_MIGRATE_ON_STARTUP", True),
+
+            warmup_on_startup=env.flag("WARMUP_ON_STARTUP", False),
+            warmup_db_connections=env.integer("WARMUP_DB_CONNECTIONS", 2, minimum=1),
+
+            readiness_cache_seconds=env.number("READINESS_CACHE_SECONDS", 2, minimum=0),
+            readiness_max_pool_saturation=env.number("READINESS_MAX_POOL_SATURATION", 1.0, minimum=0, exclusive=True),
+            readiness_min_free_disk_mb=env.number("READINESS_MIN_FREE_DISK_MB", 100, minimum=0),
+
+            secret_key=env.string("SECRET_KEY", DEV_SECRET_KEY),
+            internal_api_key=env.string("INTERNAL_SERVICE_API_KEY", DEV_INTERNAL_API_KEY),
+            algorithm=env.choice("ALGORITHM", "HS256", ("HS256", "HS384", "HS512")),
+            access_token_expire_minutes=env.integer("ACCESS_TOKEN_EXPIRE_MINUTES", 30, minimum=1),
+            refresh_token_expire_days=env.integer("REFRESH_TOKEN_EXPIRE_DAYS", 30, minimum=1),
+            jwt_accept_hs256=env.flag("JWT_ACCEPT_HS256", True),
+            jwt_keys_dir=env.string("JWT_KEYS_DIR"),
+            jwt_active_kid=env.string("JWT_ACTIVE_KID"),
+            jwks_max_age_seconds=env.integer("JWKS_MAX_AGE_SECONDS", 300, minimum=0),
+
+            # passlib acepta costos de bcrypt entre 4 y 31
+            bcrypt_rounds=env.integer("BCRYPT_ROUNDS", 12, minimum=4, maximum=31),
+            bcrypt_target_ms=env.number("BCRYPT_TARGET_MS", 250, minimum=1),
+            login_max_concurrent_verifications=env.integer("LOGIN_MAX_CONCURRENT_VERIFICATIONS", 8, minimum=1),
+
+            rate_limit_backend=env.choice("RATE_LIMIT_BACKEND", "memory", ("memory", "redis")),
+            rate_limit_redis_url=env.string("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0"),
+            login_ip_burst=env.integer("LOGIN_IP_BURST", 20, minimum=1),
+            login_ip_per_minute=env.number("LOGIN_IP_PER_MINUTE", 20, minimum=0, exclusive=True),
+            login_email_burst=env.integer("LOGIN_EMAIL_BURST", 5, minimum=1),
+            login_email_per_minute=env.number("LOGIN_EMAIL_PER_MINUTE", 5, minimum=0, exclusive=True),
+            # Proxies propios delante de la app que agregan a X-Forwarded-For
+            # (Cloud Run: 1; Cloud Run detrás de un load balancer externo: 2)
+            trusted_proxy_hops=env.integer("TRUSTED_PROXY_HOPS", 0, minimum=0),
+
+            token_cache_enabled=env.flag("TOKEN_CACHE_ENABLED", True),
+            token_cache_size=env.integer("TOKEN_CACHE_SIZE", 10000, minimum=0),
+            internal_user_cache_size=env.integer("INTERNAL_USER_CACHE_SIZE", 10000, minimum=0),
+            internal_user_cache_ttl=env.number("INTERNAL_USER_CACHE_TTL", 30, minimum=0),
+            internal_user_negative_ttl=env.number("INTERNAL_USER_NEGATIVE_TTL", 5, minimum=0),
+            recruiter_suggestions_cache_size=env.integer("RECRUITER_SUGGESTIONS_CACHE_SIZE", 1024, minimum=0),
+            recruiter_suggestions_cache_ttl=env.number("RECRUITER_SUGGESTIONS_CACHE_TTL", 30, minimum=0),
+            revocation_refresh_seconds=env.number("REVOCATION_REFRESH_SECONDS", 30, minimum=0, exclusive=True),
+            revocation_filter_capacity=env.integer("REVOCATION_FILTER_CAPACITY", 100000, minimum=1),
+            revocation_filter_error_rate=env.number("REVOCATION_FILTER_ERROR_RATE", 0.001, minimum=0, maximum=1, exclusive=True),
+            changes_feed_lag_seconds=env.number("CHANGES_FEED_LAG_SECONDS", 2, minimum=0),
+
+            compression_minimum_size=env.integer("COMPRESSION_MINIMUM_SIZE", 1024, minimum=0),
+            compression_gzip_level=env.integer("COMPRESSION_GZIP_LEVEL", 6, minimum=0, maximum=9),
+            compression_brotli_quality=env.integer("COMPRESSION_BROTLI_QUALITY", 4, minimum=0, maximum=11),
+            compression_cache_size=env.integer("COMPRESSION_CACHE_SIZE", 512, minimum=0),
+            compression_cache_ttl=env.number("COMPRESSION_CACHE_TTL", 300, minimum=0),
+
+            outbox_sink=env.choice("OUTBOX_SINK", "none", ("none", "memory", "file", "webhook")),
+            outbox_file_path=env.string("OUTBOX_FILE_PATH", "outbox_events.jsonl"),
+            outbox_webhook_url=env.string("OUTBOX_WEBHOOK_URL"),
+            outbox_batch_size=env.integer("OUTBOX_BATCH_SIZE", 100, minimum=1),
+            outbox_poll_seconds=env.number("OUTBOX_POLL_SECONDS", 1, minimum=0, exclusive=True),
+            outbox_backoff_seconds=env.number("OUTBOX_BACKOFF_SECONDS", 1, minimum=0),
+            outbox_max_backoff_seconds=env.number("OUTBOX_MAX_BACKOFF_SECONDS", 300, minimum=0),
+            outbox_max_attempts=env.integer("OUTBOX_MAX_ATTEMPTS", 10, minimum=1),
+            outbox_retention_days=env.number("OUTBOX_RETENTION_DAYS", 7, minimum=0, exclusive=True),
+            outbox_purge_seconds=env.number("OUTBOX_PURGE_SECONDS", 3600, minimum=0, exclusive=True),
+
+            upload_cvs_dir=env.string("UPLOAD_CVS_DIR", "uploaded_cvs"),
+            profile_pictures_dir=env.string("PROFILE_PICTURES_DIR", "profile_pictures"),
+            temp_files_dir=env.string("TEMP_FILES_DIR", "temp_files"),
+            temp_registrations_dir=env.string("TEMP_REGISTRATIONS_DIR", "temp_registrations"),
+        )
+
+        errors = env.errors + settings._check()
+        if errors:
+            raise SettingsError(errors)
+        return settings
+
+    def _check(self) -> List[str]:
+        """Validaciones que cruzan más de un valor"""
+        errors = []
+        if not self.database_url:
+            errors.append("DATABASE_URL es obligatoria")
+        if self.is_production:
+            if self.secret_key == DEV_SECRET_KEY:
+                errors.append("SECRET_KEY es obligatoria con ENVIRONMENT=production")
+            if self.internal_api_key == DEV_INTERNAL_API_KEY:
+                errors.append("INTERNAL_SERVICE_API_KEY es obligatoria con ENVIRONMENT=production")
+        if self.warmup_db_connections > self.db_pool_size:
+            errors.append("WARMUP_DB_CONNECTIONS no puede superar DB_POOL_SIZE")
+        if self.outbox_sink == "webhook" and not self.outbox_webhook_url:
+            errors.append("OUTBOX_SINK=webhook requiere OUTBOX_WEBHOOK_URL")
+        if self.outbox_max_backoff_seconds < self.outbox_backoff_seconds:
+            errors.append("OUTBOX_MAX_BACKOFF_SECONDS no puede ser menor que OUTBOX_BACKOFF_SECONDS")
+        return errors
+
+    def configure_logging(self) -> None:
+        """Aplica LOG_LEVEL al logging de la aplicación"""
+        logging.basicConfig(level=getattr(logging, self.log_level))
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """
+    Configuración de la aplicación, parseada una sola vez por proceso
+
+    También sirve como dependency de FastAPI: Depends(get_settings).
+    """
+    # No pisa variables ya definidas en el entorno (las de Cloud Run tienen prioridad)
+    load_dotenv()
+    return Settings.from_env(os.environ)
+
+# =====================================================
+# PARSEO DE VARIABLES
+# =====================================================
+
+class _EnvReader:
+    """Lee variables tipadas y acumula los errores en lugar de cortar en el primero"""
+
+    def __init__(self, environ: Mapping[str, str]):
+        self.environ = environ
+        self.errors: List[str] = []
+
+    def string(self, name: str, default: str = "") -> str:
+        return self.environ.get(name, default).strip()
+
+    def csv(self, name: str) -> Tuple[str, ...]:
+        return tuple(item.strip() for item in self.environ.get(name, "").split(",") if item.strip())
+
+    def flag(self, name: str, default: bool) -> bool:
+        raw = self.environ.get(name)
+        if raw is None or not raw.strip():
+            return default
+        value = raw.strip().lower()
+        if value in _TRUE:
+            return True
+        if value in _FALSE:
+            return False
+        self.errors.append(f"{name}={raw!r} no es un booleano (true/false)")
+        return default
+
+    def choice(self, name: str, default: str, options: Tuple[str, ...]) -> str:
+        """Una de options, sin distinguir mayúsculas; retorna la forma canónica"""
+        value = self.string(name, default) or default
+        for option in options:
+            if value.lower() == option.lower():
+                return option
+        self.errors.append(f"{name}={value!r} no es una opción válida ({', '.join(options)})")
+        return default
+
+    def integer(self, name: str, default: int, minimum: Optional[int] = None, maximum: Optional[int] = None) -> int:
+        return self._parse(name, default, int, "un entero", minimum, maximum, exclusive=False)
+
+    def number(
+        self,
+        name: str,
+        default: float,
+        minimum: Optional[float] = None,
+        maximum: Optional[float] = None,
+        exclusive: bool = False
+    ) -> float:
+        return float(self._parse(name, default, float, "un número", minimum, maximum, exclusive))
+
+    def _parse(self, name, default, parse, kind, minimum, maximum, exclusive):
+        raw = self.environ.get(name)
+        if raw is None or not raw.strip():
+            return default
+        try:
+            value = parse(raw.strip())
+        except ValueError:
+            self.errors.append(f"{name}={raw!r} no es {kind}")
+            return default
+
+        # exclusive: los límites no son valores válidos (p. ej. tasas que deben ser > 0)
+        below = minimum is not None and (value <= minimum if exclusive else value < minimum)
+        above = maximum is not None and (value >= maximum if exclusive else value > maximum)
+        if below or above:
+            low = "" if minimum is None else f"{'>' if exclusive else '>='} {minimum}"
+            high = "" if maximum is None else f"{'<' if exclusive else '<='} {maximum}"
+            self.errors.append(f"{name}={raw!r} fuera de rango ({' y '.join(part for part in (low, high) if part)})")
+            return default
+        return value
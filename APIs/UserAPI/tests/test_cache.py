@@ -0,0 +1,179 @@
+"""
+Tests para cache.py (TTLCache en memoria)
+"""
+import asyncio
+import time
+
+from cache import SingleFlight, TTLCache, all_cache_stats, clear_all_caches
+
+
+class TestTTLCache:
+    """Tests para el LRU con TTL"""
+
+    def test_get_set_y_metricas(self):
+        """
+        GIVEN una cache vacía
+        WHEN se guarda un valor y se consulta dos veces una key existente y una inexistente
+        THEN se registran hits y misses
+        """
+        cache = TTLCache("test_basico", maxsize=10, ttl=60)
+        cache.set("a", 1)
+
+        assert cache.get("a") == 1
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+
+        stats = cache.stats()
+        assert stats["hits"] == 2
+        assert stats["misses"] == 1
+        assert stats["size"] == 1
+
+    def test_expiracion_por_entrada(self):
+        """
+        GIVEN una entrada con TTL corto
+        WHEN pasa el TTL
+        THEN la entrada deja de estar disponible
+        """
+        cache = TTLCache("test_expiracion", maxsize=10, ttl=60)
+        cache.set("corta", "x", ttl=0.01)
+        cache.set("larga", "y")
+
+        time.sleep(0.02)
+
+        assert cache.get("corta") is None
+        assert cache.get("larga") == "y"
+
+    def test_lru_desaloja_la_menos_usada(self):
+        """
+        GIVEN una cache llena
+        WHEN se agrega una entrada nueva
+        THEN se desaloja la entrada usada hace más tiempo
+        """
+        cache = TTLCache("test_lru", maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.stats()["evictions"] == 1
+
+    def test_registro_global(self):
+        """
+        GIVEN caches con nombre
+        WHEN se consultan las métricas globales y se vacían todas
+        THEN aparecen por nombre y quedan vacías
+        """
+        cache = TTLCache("test_registro", maxsize=10, ttl=60)
+        cache.set("a", 1)
+
+        assert "test_registro" in all_cache_stats()
+
+        clear_all_caches()
+        assert len(cache) == 0
+
+    def test_carga_invalidada_no_se_guarda(self):
+        """
+        GIVEN una carga que leyó la generación de la key antes de consultar la fuente
+        WHEN la key se invalida antes de que la carga guarde su valor
+        THEN el valor viejo se descarta, y una carga posterior sí se guarda
+        """
+        cache = TTLCache("test_generaciones", maxsize=10, ttl=60)
+        generation = cache.generation("a")
+        cache.invalidate("a")
+        cache.set("a", "viejo", generation=generation)
+
+        assert cache.get("a") is None
+
+        cache.set("a", "nuevo", generation=cache.generation("a"))
+        assert cache.get("a") == "nuevo"
+
+    def test_registro_de_generaciones_acotado(self):
+        """
+        GIVEN más keys invalidadas que el tamaño de la cache
+        WHEN una carga empezada antes de invalidar una key ya descartada del registro intenta guardar
+        THEN igual se descarta
+        """
+        cache = TTLCache("test_generaciones_acotadas", maxsize=2, ttl=60)
+        generation = cache.generation("a")
+        for key in ("a", "b", "c", "d"):
+            cache.invalidate(key)
+        cache.set("a", "viejo", generation=generation)
+
+        assert cache.get("a") is None
+        assert len(cache._generations) == 2
+
+
+class TestSingleFlight:
+    """Tests para el agrupamiento de cargas concurrentes"""
+
+    def test_cargas_concurrentes_se_ejecutan_una_vez(self):
+        """
+        GIVEN diez requests concurrentes por la misma key
+        WHEN todas piden la carga
+        THEN la carga se ejecuta una sola vez y todas reciben el mismo resultado
+        """
+        flight = SingleFlight()
+        calls = []
+
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "usuario"
+
+        async def main():
+            return await asyncio.gather(*(flight.do(1, load) for _ in range(10)))
+
+        results = asyncio.run(main())
+
+        assert results == ["usuario"] * 10
+        assert len(calls) == 1
+
+    def test_error_se_propaga_a_todos(self):
+        """
+        GIVEN una carga que falla
+        WHEN varias requests esperan la misma key
+        THEN todas reciben el error y la key queda libre para reintentar
+        """
+        flight = SingleFlight()
+
+        async def load():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("db caída")
+
+        async def main():
+            results = await asyncio.gather(*(flight.do("k", load) for _ in range(3)), return_exceptions=True)
+            retry = await flight.do("k", lambda: asyncio.sleep(0, result="ok"))
+            return results, retry
+
+        results, retry = asyncio.run(main())
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert retry == "ok"
+
+    def test_cancelar_al_primero_no_cancela_a_los_demas(self):
+        """
+        GIVEN una carga en vuelo iniciada por una request y otra esperándola
+        WHEN se cancela la request que inició la carga
+        THEN la otra recibe el resultado igual
+        """
+        flight = SingleFlight()
+
+        async def load():
+            await asyncio.sleep(0.02)
+            return "usuario"
+
+        async def main():
+            leader = asyncio.ensure_future(flight.do("k", load))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flight.do("k", load))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await follower, leader.cancelled()
+
+        result, leader_cancelled = asyncio.run(main())
+
+        assert result == "usuario"
+        assert leader_cancelled
@@ -13,16 +13,22 @@ Cubre:
 Objetivo: >80% code coverage
 """
 import pytest
+from contextlib import contextmanager
+from datetime import date
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 import tempfile
 import os
 
 from main import app
 from database import Base, get_db
-from models import User, UserRoleEnum, CompanyRecruiter
+from models import User, UserRoleEnum, CompanyRecruiter, GenderEnum
 from auth import create_access_token, get_password_hash
+from cache import clear_all_caches
+from schemas import CandidatoCreate
+from services import UserService
 
 
 @pytest.fixture(scope="function")
@@ -33,7 +39,7 @@ def test_db():
         f"sqlite:///{db_path}",
         connect_args={"check_same_thread": False}
     )
-    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
     Base.metadata.create_all(bind=engine)
 
     def override_get_db():
@@ -44,14 +50,32 @@ def test_db():
             db.close()
 
     app.dependency_overrides[get_db] = override_get_db
+    clear_all_caches()
     yield TestingSessionLocal
 
     app.dependency_overrides.clear()
+    clear_all_caches()
     Base.metadata.drop_all(bind=engine)
     os.close(db_fd)
     os.unlink(db_path)
 
 
+@contextmanager
+def count_statements(session_factory):
+    """Registra los statements SQL ejecutados sobre el engine de la sesión"""
+    engine = session_factory.kw["bind"]
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.lstrip().upper())
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
 @pytest.fixture
 def client(test_db):
     """Cliente de test con DB limpia"""
@@ -219,6 +243,100 @@ class TestRegistro:
 
         assert response.status_code == 422
 
+    def test_register_candidato_un_solo_insert(self, client, test_db):
+        """
+        GIVEN un email nuevo
+        WHEN se registra un candidato
+        THEN se ejecuta un único INSERT ... ON CONFLICT sin SELECT previo
+        """
+        with count_statements(test_db) as statements:
+            response = client.post("/api/v1/register-candidato", data={
+                "email": "single@test.com",
+                "password": "TestPass123!",
+                "nombre": "Juan",
+                "apellido": "Pérez",
+                "genero": "masculino",
+                "fecha_nacimiento": "1990-01-01"
+            })
+
+        assert response.status_code == 200
+        inserts = [s for s in statements if s.startswith("INSERT INTO USERS ")]
+        assert len(inserts) == 1
+        assert "ON CONFLICT" in inserts[0]
+        assert statements[0].startswith("INSERT")
+        # Ni chequeo previo ni refresh posterior: la respuesta sale del RETURNING
+        assert not [s for s in statements if s.startswith("SELECT")]
+
+    def test_register_conflicto_concurrente_retorna_400(self, test_db):
+        """
+        GIVEN un email insertado por otra transacción después de cualquier chequeo
+        WHEN el servicio intenta crear el mismo email
+        THEN el conflicto se traduce en HTTPException 400 (no IntegrityError)
+        """
+        db = test_db()
+        db.add(User(
+            email="race@test.com",
+            hashed_password="hash",
+            nombre="Primero",
+            role=UserRoleEnum.candidato
+        ))
+        db.commit()
+
+        with pytest.raises(HTTPException) as exc_info:
+            UserService(db).create_candidato_simple(CandidatoCreate(
+                email="race@test.com",
+                password="TestPass123!",
+                nombre="Segundo",
+                apellido="Pérez",
+                genero=GenderEnum.masculino,
+                fecha_nacimiento=date(1990, 1, 1)
+            ))
+        db.close()
+
+        assert exc_info.value.status_code == 400
+        assert "ya está registrado" in exc_info.value.detail
+
+    def test_register_email_duplicado_distinto_case(self, client):
+        """
+        GIVEN una empresa registrada con email en minúsculas
+        WHEN se intenta registrar el mismo email con otras mayúsculas
+        THEN retorna error 400 y el email queda normalizado
+        """
+        first = client.post("/api/v1/register-empresa", data={
+            "email": "  Empresa@Test.com ",
+            "password": "TestPass123!",
+            "nombre": "Tech Corp",
+            "descripcion": "Tech company"
+        })
+        assert first.status_code == 200
+        assert first.json()["email"] == "empresa@test.com"
+
+        response = client.post("/api/v1/register-empresa", data={
+            "email": "EMPRESA@TEST.COM",
+            "password": "TestPass123!",
+            "nombre": "Another Corp",
+            "descripcion": "Another company"
+        })
+
+        assert response.status_code == 400
+
+    def test_lookup_por_email_usa_indice_funcional(self, test_db):
+        """
+        GIVEN el índice funcional lower(email)
+        WHEN se busca un usuario por email sin importar mayúsculas
+        THEN el plan de ejecución usa ix_users_email_lower
+        """
+        from sqlalchemy import select
+        from models import email_matches
+
+        engine = test_db.kw["bind"]
+        query = select(User.id).where(email_matches("Alguien@Test.com"))
+        sql = str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+        with engine.connect() as conn:
+            plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+
+        assert any("ix_users_email_lower" in row[-1] for row in plan)
+
 
 # =====================================================
 # TESTS DE AUTENTICACIÓN
@@ -255,6 +373,32 @@ class TestAutenticacion:
         assert data["token_type"] == "bearer"
         assert data["user"]["email"] == "candidato@test.com"
 
+    def test_login_email_case_insensitive(self, client):
+        """
+        GIVEN un candidato registrado
+        WHEN hace login con el email en otras mayúsculas
+        THEN recibe token válido y /me lo resuelve
+        """
+        client.post("/api/v1/register-candidato", data={
+            "email": "candidato@test.com",
+            "password": "TestPass123!",
+            "nombre": "Juan",
+            "apellido": "Pérez",
+            "genero": "masculino",
+            "fecha_nacimiento": "1990-01-01"
+        })
+
+        response = client.post("/api/v1/login", json={
+            "email": "Candidato@TEST.com",
+            "password": "TestPass123!"
+        })
+
+        assert response.status_code == 200
+        token = response.json()["access_token"]
+        me = client.get("/api/v1/me", headers={"Authorization": f"Bearer {token}"})
+        assert me.status_code == 200
+        assert me.json()["email"] == "candidato@test.com"
+
     def test_login_empresa_exitoso(self, client):
         """
         GIVEN una empresa registrada
@@ -319,6 +463,415 @@ class TestAutenticacion:
         assert response.status_code == 401
 
 
+class TestCacheDeTokens:
+    """Tests para la cache de tokens verificados en verify_token"""
+
+    @pytest.fixture
+    def decodes(self, monkeypatch):
+        """Cuenta las llamadas a jwt.decode"""
+        import auth
+        calls = []
+        original = auth.jwt.decode
+
+        def counting_decode(*args, **kwargs):
+            calls.append(1)
+            return original(*args, **kwargs)
+
+        monkeypatch.setattr(auth.jwt, "decode", counting_decode)
+        return calls
+
+    def _token(self, client):
+        client.post("/api/v1/register-empresa", data={
+            "email": "empresa@test.com",
+            "password": "TestPass123!",
+            "nombre": "Tech Corp",
+            "descripcion": "Tech company"
+        })
+        return create_access_token(data={"sub": "empresa@test.com"})
+
+    def test_firma_se_verifica_una_vez(self, client, decodes):
+        """
+        GIVEN un token válido
+        WHEN se usa en tres requests
+        THEN jwt.decode se ejecuta una sola vez
+        """
+        headers = {"Authorization": f"Bearer {self._token(client)}"}
+
+        for _ in range(3):
+            assert client.get("/api/v1/me", headers=headers).status_code == 200
+
+        assert len(decodes) == 1
+
+    def test_kill_switch(self, client, decodes, monkeypatch):
+        """
+        GIVEN la cache deshabilitada con TOKEN_CACHE_ENABLED
+        WHEN el mismo token se usa dos veces
+        THEN se decodifica en cada request
+        """
+        import auth
+        monkeypatch.setattr(auth, "TOKEN_CACHE_ENABLED", False)
+        headers = {"Authorization": f"Bearer {self._token(client)}"}
+
+        client.get("/api/v1/me", headers=headers)
+        client.get("/api/v1/me", headers=headers)
+
+        assert len(decodes) == 2
+
+    def test_token_expirado_no_se_cachea(self, client):
+        """
+        GIVEN un token ya expirado
+        WHEN se usa
+        THEN recibe 401 y no queda en la cache
+        """
+        from datetime import timedelta
+        from auth import verified_token_cache
+        self._token(client)
+        token = create_access_token(data={"sub": "empresa@test.com"}, expires_delta=timedelta(seconds=-1))
+
+        response = client.get("/api/v1/me", headers={"Authorization": f"Bearer {token}"})
+
+        assert response.status_code == 401
+        assert len(verified_token_cache) == 0
+
+    def test_metricas_en_admin_caches(self, client, admin_token):
+        """
+        GIVEN un admin que ya usó su token
+        WHEN consulta /admin/caches
+        THEN ve las métricas de verified_tokens
+        """
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        client.get("/api/v1/me", headers=headers)
+
+        stats = client.get("/api/v1/admin/caches", headers=headers).json()
+
+        assert stats["verified_tokens"]["size"] == 1
+        assert stats["verified_tokens"]["hits"] >= 1
+
+
+class TestLimitesLogin:
+    """Tests para el rate limiting y load shedding de /login"""
+
+    def test_demasiados_intentos_por_email(self, client, monkeypatch):
+        """
+        GIVEN un límite de 5 intentos por email
+        WHEN se falla el login 6 veces seguidas con el mismo email
+        THEN el sexto recibe 429 con Retry-After sin verificar la contraseña
+        """
+        import ratelimit
+        monkeypatch.setattr(ratelimit.login_rate_limiter, "email_burst", 5)
+
+        for _ in range(5):
+            response = client.post("/api/v1/login", json={"email": "nadie@test.com", "password": "x"})
+            assert response.status_code == 401
+
+        response = client.post("/api/v1/login", json={"email": "NADIE@test.com", "password": "x"})
+
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+
+    def test_limite_por_ip_detras_del_proxy(self, client, monkeypatch):
+        """
+        GIVEN la app detrás de un proxy confiable y un límite de 2 intentos por IP
+        WHEN dos clientes con IPs reenviadas distintas fallan el login por la misma conexión
+        THEN cada IP tiene su propio bucket y solo la que se pasa del límite recibe 429
+        """
+        import ratelimit
+        monkeypatch.setattr(ratelimit.login_rate_limiter, "trusted_proxy_hops", 1)
+        monkeypatch.setattr(ratelimit.login_rate_limiter, "ip_burst", 2)
+
+        def login(forwarded_for, email):
+            return client.post(
+                "/api/v1/login",
+                json={"email": email, "password": "x"},
+                headers={"X-Forwarded-For": forwarded_for}
+            )
+
+        assert login("203.0.113.1", "a@test.com").status_code == 401
+        assert login("203.0.113.1", "b@test.com").status_code == 401
+        assert login("198.51.100.7", "c@test.com").status_code == 401
+        assert login("203.0.113.1", "d@test.com").status_code == 429
+
+    def test_sin_cupo_de_verificacion(self, client, monkeypatch):
+        """
+        GIVEN el cupo de verificaciones de contraseña agotado
+        WHEN llega un login
+        THEN recibe 503 con Retry-After
+        """
+        import ratelimit
+        monkeypatch.setattr(ratelimit.password_verification_limiter, "max_inflight", 0)
+
+        response = client.post("/api/v1/login", json={"email": "alguien@test.com", "password": "x"})
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
+
+class TestCostoBcrypt:
+    """Tests para el costo configurable de bcrypt y el rehash en login"""
+
+    def _crear_usuario(self, test_db, rounds):
+        from auth import build_pwd_context
+        db = test_db()
+        db.add(User(
+            email="viejo@test.com",
+            hashed_password=build_pwd_context(rounds).hash("TestPass123!"),
+            nombre="Usuario Viejo",
+            role=UserRoleEnum.candidato,
+            email_verified=True
+        ))
+        db.commit()
+        db.close()
+
+    def _hash_guardado(self, test_db):
+        db = test_db()
+        user = db.query(User).filter(User.email == "viejo@test.com").first()
+        db.close()
+        return user
+
+    def test_login_rehashea_hash_desactualizado(self, client, test_db, monkeypatch):
+        """
+        GIVEN un usuario con un hash de costo 4 y la app configurada en costo 5
+        WHEN hace login
+        THEN el hash guardado pasa a costo 5 sin cambiar version_id ni updated_at
+        """
+        import auth
+        self._crear_usuario(test_db, rounds=4)
+        before = self._hash_guardado(test_db)
+        monkeypatch.setattr(auth, "pwd_context", auth.build_pwd_context(5))
+
+        response = client.post("/api/v1/login", json={"email": "viejo@test.com", "password": "TestPass123!"})
+
+        after = self._hash_guardado(test_db)
+        assert response.status_code == 200
+        assert after.hashed_password.startswith("$2b$05$")
+        assert after.version_id == before.version_id
+        assert after.updated_at == before.updated_at
+        relogin = client.post("/api/v1/login", json={"email": "viejo@test.com", "password": "TestPass123!"})
+        assert relogin.status_code == 200
+
+    def test_hash_vigente_no_se_reescribe(self, client, test_db, monkeypatch):
+        """
+        GIVEN un usuario con un hash del costo configurado
+        WHEN hace login
+        THEN el hash no cambia
+        """
+        import auth
+        self._crear_usuario(test_db, rounds=4)
+        before = self._hash_guardado(test_db).hashed_password
+        monkeypatch.setattr(auth, "pwd_context", auth.build_pwd_context(4))
+
+        client.post("/api/v1/login", json={"email": "viejo@test.com", "password": "TestPass123!"})
+
+        assert self._hash_guardado(test_db).hashed_password == before
+
+    def test_calibracion_respeta_objetivo(self):
+        """
+        GIVEN un objetivo de latencia muy alto
+        WHEN se calibra entre costos 4 y 6
+        THEN se elige el máximo; con objetivo 0 se elige el mínimo
+        """
+        from auth import calibrate_bcrypt_rounds
+
+        assert calibrate_bcrypt_rounds(target_ms=60_000, min_rounds=4, max_rounds=6)[0] == 6
+        assert calibrate_bcrypt_rounds(target_ms=0, min_rounds=4, max_rounds=6)[0] == 4
+
+    def test_contexto_de_hashing_perezoso(self, monkeypatch):
+        """
+        GIVEN el CryptContext todavía sin construir
+        WHEN se corre el warm-up de hashing
+        THEN se construye con el costo configurado y el hash ya funciona
+        """
+        import auth
+        build = auth.build_pwd_context
+        monkeypatch.setattr(auth, "pwd_context", None)
+        monkeypatch.setattr(auth, "build_pwd_context", lambda: build(4))
+
+        assert auth.warm_up_hashing() > 0
+        assert auth.pwd_context is not None
+        assert auth.verify_password("TestPass123!", auth.get_password_hash("TestPass123!"))
+
+
+class TestRefreshTokens:
+    """Tests para sesiones con refresh tokens rotativos"""
+
+    def _login(self, client):
+        client.post("/api/v1/register-empresa", data={
+            "email": "empresa@test.com",
+            "password": "TestPass123!",
+            "nombre": "Tech Corp",
+            "descripcion": "Tech company"
+        })
+        return client.post("/api/v1/login", json={
+            "email": "empresa@test.com",
+            "password": "TestPass123!"
+        }).json()
+
+    def test_login_emite_refresh_token(self, client):
+        """
+        GIVEN un usuario registrado
+        WHEN hace login
+        THEN recibe access token y refresh token
+        """
+        tokens = self._login(client)
+
+        assert tokens["access_token"]
+        assert tokens["refresh_token"]
+
+    def test_refresh_rota_sin_verificar_password(self, client, monkeypatch):
+        """
+        GIVEN un refresh token vigente
+        WHEN se canjea en /token/refresh
+        THEN se obtiene un access token válido y otro refresh token, sin pasar por bcrypt
+        """
+        import services
+        tokens = self._login(client)
+        monkeypatch.setattr(services, "verify_and_update_password", lambda *args: pytest.fail("no debe verificar password"))
+
+        response = client.post("/api/v1/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+
+        assert response.status_code == 200
+        refreshed = response.json()
+        assert refreshed["refresh_token"] != tokens["refresh_token"]
+        assert refreshed["user"]["email"] == "empresa@test.com"
+        me = client.get("/api/v1/me", headers={"Authorization": f"Bearer {refreshed['access_token']}"})
+        assert me.status_code == 200
+
+    def test_reuso_revoca_la_familia(self, client):
+        """
+        GIVEN un refresh token ya rotado
+        WHEN se lo vuelve a presentar
+        THEN recibe 401 y el token que lo reemplazó también queda revocado
+        """
+        tokens = self._login(client)
+        rotated = client.post("/api/v1/token/refresh", json={"refresh_token": tokens["refresh_token"]}).json()
+
+        reused = client.post("/api/v1/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+        after = client.post("/api/v1/token/refresh", json={"refresh_token": rotated["refresh_token"]})
+
+        assert reused.status_code == 401
+        assert after.status_code == 401
+
+    def test_token_invalido(self, client):
+        """
+        GIVEN un refresh token inexistente
+        WHEN se lo canjea
+        THEN recibe 401
+        """
+        response = client.post("/api/v1/token/refresh", json={"refresh_token": "no-existe"})
+
+        assert response.status_code == 401
+
+    def test_logout_revoca_el_access_token(self, client):
+        """
+        GIVEN un usuario logueado dos veces
+        WHEN cierra sesión con uno de sus tokens
+        THEN ese token deja de servir y el otro sigue siendo válido
+        """
+        first = self._login(client)
+        second = client.post("/api/v1/login", json={
+            "email": "empresa@test.com",
+            "password": "TestPass123!"
+        }).json()
+        headers = {"Authorization": f"Bearer {first['access_token']}"}
+        assert client.get("/api/v1/me", headers=headers).status_code == 200
+
+        response = client.post("/api/v1/logout", headers=headers)
+
+        assert response.status_code == 200
+        assert client.get("/api/v1/me", headers=headers).status_code == 401
+        other = client.get("/api/v1/me", headers={"Authorization": f"Bearer {second['access_token']}"})
+        assert other.status_code == 200
+
+    def test_logout_con_refresh_token(self, client):
+        """
+        GIVEN un usuario logueado
+        WHEN cierra sesión enviando su refresh token
+        THEN el refresh token tampoco sirve más
+        """
+        tokens = self._login(client)
+
+        client.post(
+            "/api/v1/logout",
+            json={"refresh_token": tokens["refresh_token"]},
+            headers={"Authorization": f"Bearer {tokens['access_token']}"}
+        )
+
+        refresh = client.post("/api/v1/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+        assert refresh.status_code == 401
+
+    def test_logout_con_refresh_token_ajeno_no_lo_revoca(self, client):
+        """
+        GIVEN un usuario que tiene el refresh token de otro
+        WHEN cierra su sesión enviando ese refresh token
+        THEN la sesión del otro usuario sigue vigente
+        """
+        victim = self._login(client)
+        client.post("/api/v1/register-empresa", data={
+            "email": "otra@test.com",
+            "password": "TestPass123!",
+            "nombre": "Otra Corp",
+            "descripcion": "Otra company"
+        })
+        attacker = client.post("/api/v1/login", json={
+            "email": "otra@test.com",
+            "password": "TestPass123!"
+        }).json()
+
+        response = client.post(
+            "/api/v1/logout",
+            json={"refresh_token": victim["refresh_token"]},
+            headers={"Authorization": f"Bearer {attacker['access_token']}"}
+        )
+
+        assert response.status_code == 200
+        refresh = client.post("/api/v1/token/refresh", json={"refresh_token": victim["refresh_token"]})
+        assert refresh.status_code == 200
+
+    def test_revocar_todas_las_sesiones(self, client):
+        """
+        GIVEN un usuario con dos sesiones abiertas
+        WHEN revoca todas
+        THEN ninguno de sus refresh tokens vuelve a servir
+        """
+        first = self._login(client)
+        second = client.post("/api/v1/login", json={
+            "email": "empresa@test.com",
+            "password": "TestPass123!"
+        }).json()
+
+        response = client.post(
+            "/api/v1/sessions/revoke-all",
+            headers={"Authorization": f"Bearer {first['access_token']}"}
+        )
+
+        assert response.json()["revoked"] == 2
+        for tokens in (first, second):
+            refresh = client.post("/api/v1/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+            assert refresh.status_code == 401
+
+    def test_admin_revoca_sesiones_de_un_usuario(self, client, admin_token):
+        """
+        GIVEN un usuario con una sesión abierta
+        WHEN un admin revoca sus sesiones
+        THEN su refresh token deja de servir; un no-admin no puede hacerlo
+        """
+        tokens = self._login(client)
+
+        forbidden = client.delete(
+            "/api/v1/admin/users/2/sessions",
+            headers={"Authorization": f"Bearer {tokens['access_token']}"}
+        )
+        response = client.delete(
+            "/api/v1/admin/users/2/sessions",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+
+        assert forbidden.status_code == 403
+        assert response.json()["revoked"] == 1
+        refresh = client.post("/api/v1/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+        assert refresh.status_code == 401
+
+
 # =====================================================
 # TESTS DE PERFIL
 # =====================================================
@@ -405,6 +958,109 @@ class TestPerfil:
         assert user["nombre"] == "Juan Carlos"
         assert user["apellido"] == "González"
 
+    def test_update_profile_sin_relectura(self, client, test_db):
+        """
+        GIVEN un candidato autenticado
+        WHEN actualiza su perfil
+        THEN no hay ningún SELECT después del UPDATE (ni refresh ni lazy loads al serializar)
+        """
+        client.post("/api/v1/register-candidato", data={
+            "email": "candidato@test.com",
+            "password": "TestPass123!",
+            "nombre": "Juan",
+            "apellido": "Pérez",
+            "genero": "masculino",
+            "fecha_nacimiento": "1990-01-01"
+        })
+        token = create_access_token(data={"sub": "candidato@test.com"})
+
+        with count_statements(test_db) as statements:
+            response = client.put(
+                "/api/v1/me/candidato",
+                data={"nombre": "Juan Carlos"},
+                headers={"Authorization": f"Bearer {token}"}
+            )
+
+        assert response.status_code == 200
+        assert response.json()["nombre"] == "Juan Carlos"
+        update_index = next(i for i, s in enumerate(statements) if s.startswith("UPDATE USERS"))
+        assert not [s for s in statements[update_index:] if s.startswith("SELECT")]
+
+    def test_update_profile_un_solo_update_parcial(self, client, test_db):
+        """
+        GIVEN un candidato autenticado
+        WHEN cambia un solo campo (y reenvía otro sin cambios)
+        THEN se ejecuta un único UPDATE que solo escribe la columna modificada
+        """
+        client.post("/api/v1/register-candidato", data={
+            "email": "candidato@test.com",
+            "password": "TestPass123!",
+            "nombre": "Juan",
+            "apellido": "Pérez",
+            "genero": "masculino",
+            "fecha_nacimiento": "1990-01-01"
+        })
+        token = create_access_token(data={"sub": "candidato@test.com"})
+
+        with count_statements(test_db) as statements:
+            response = client.put(
+                "/api/v1/me/candidato",
+                data={"nombre": "Juan", "apellido": "González"},
+                headers={"Authorization": f"Bearer {token}"}
+            )
+
+        assert response.status_code == 200
+        assert response.json()["apellido"] == "González"
+        updates = [s for s in statements if s.startswith("UPDATE USERS")]
+        assert len(updates) == 1
+        assert "SET APELLIDO=" in updates[0]
+        assert "NOMBRE=" not in updates[0]
+        assert "RETURNING" in updates[0]
+
+    def test_update_profile_sin_cambios_no_escribe(self, client, test_db):
+        """
+        GIVEN un candidato autenticado
+        WHEN reenvía sus datos sin cambios
+        THEN no se ejecuta ningún UPDATE y recibe su perfil
+        """
+        client.post("/api/v1/register-candidato", data={
+            "email": "candidato@test.com",
+            "password": "TestPass123!",
+            "nombre": "Juan",
+            "apellido": "Pérez",
+            "genero": "masculino",
+            "fecha_nacimiento": "1990-01-01"
+        })
+        token = create_access_token(data={"sub": "candidato@test.com"})
+
+        with count_statements(test_db) as statements:
+            response = client.put(
+                "/api/v1/me/candidato",
+                data={"nombre": "Juan"},
+                headers={"Authorization": f"Bearer {token}"}
+            )
+
+        assert response.status_code == 200
+        assert response.json()["nombre"] == "Juan"
+        assert not [s for s in statements if s.startswith("UPDATE")]
+
+    def test_update_user_inexistente_retorna_404(self, test_db):
+        """
+        GIVEN un ID que no existe
+        WHEN se intenta actualizar, con y sin cambios
+        THEN se lanza HTTPException 404
+        """
+        from schemas import UserUpdate
+
+        db = test_db()
+        service = UserService(db)
+
+        for user_update in (UserUpdate(nombre="Nadie"), UserUpdate()):
+            with pytest.raises(HTTPException) as exc_info:
+                service.update_user(9999, user_update)
+            assert exc_info.value.status_code == 404
+        db.close()
+
     def test_update_empresa_profile(self, client):
         """
         GIVEN una empresa autenticada
@@ -473,24 +1129,181 @@ class TestPerfil:
 
 
 # =====================================================
-# TESTS DE ENDPOINTS ADMIN
+# TESTS DE ETAGS Y CONCURRENCIA OPTIMISTA
 # =====================================================
 
-class TestAdmin:
-    """Tests para endpoints administrativos"""
+class TestETags:
+    """Tests para ETag / If-None-Match / If-Match en endpoints de perfil"""
 
-    def test_admin_get_all_users(self, client, admin_token):
-        """
-        GIVEN un admin autenticado y varios usuarios
-        WHEN solicita todos los usuarios
-        THEN recibe la lista completa
-        """
-        # Crear usuarios
+    def _registrar_candidato(self, client):
         client.post("/api/v1/register-candidato", data={
-            "email": "candidato1@test.com",
+            "email": "candidato@test.com",
             "password": "TestPass123!",
-            "nombre": "User1",
-            "apellido": "Test",
+            "nombre": "Juan",
+            "apellido": "Pérez",
+            "genero": "masculino",
+            "fecha_nacimiento": "1990-01-01"
+        })
+        token = create_access_token(data={"sub": "candidato@test.com"})
+        return {"Authorization": f"Bearer {token}"}
+
+    def test_me_retorna_304_con_etag_vigente(self, client):
+        """
+        GIVEN un candidato que ya leyó su perfil
+        WHEN vuelve a pedirlo con If-None-Match
+        THEN recibe 304 sin cuerpo
+        """
+        headers = self._registrar_candidato(client)
+        first = client.get("/api/v1/me", headers=headers)
+        etag = first.headers["ETag"]
+
+        second = client.get("/api/v1/me", headers={**headers, "If-None-Match": etag})
+
+        assert second.status_code == 304
+        assert second.content == b""
+        assert second.headers["ETag"] == etag
+
+    def test_update_cambia_el_etag(self, client):
+        """
+        GIVEN un ETag leído antes de una actualización
+        WHEN se pide el perfil con ese ETag viejo
+        THEN se recibe 200 con el nuevo ETag
+        """
+        headers = self._registrar_candidato(client)
+        old_etag = client.get("/api/v1/me", headers=headers).headers["ETag"]
+
+        update = client.put("/api/v1/me/candidato", data={"nombre": "Juan Carlos"}, headers=headers)
+        response = client.get("/api/v1/me", headers={**headers, "If-None-Match": old_etag})
+
+        assert update.headers["ETag"] != old_etag
+        assert response.status_code == 200
+        assert response.headers["ETag"] == update.headers["ETag"]
+
+    def test_if_match_viejo_retorna_412(self, client):
+        """
+        GIVEN dos ediciones concurrentes basadas en el mismo ETag
+        WHEN la segunda llega después de la primera
+        THEN la segunda recibe 412 y no pisa los cambios
+        """
+        headers = self._registrar_candidato(client)
+        etag = client.get("/api/v1/me", headers=headers).headers["ETag"]
+
+        first = client.put(
+            "/api/v1/me/candidato",
+            data={"nombre": "Primero"},
+            headers={**headers, "If-Match": etag}
+        )
+        second = client.put(
+            "/api/v1/me/candidato",
+            data={"nombre": "Segundo"},
+            headers={**headers, "If-Match": etag}
+        )
+
+        assert first.status_code == 200
+        assert second.status_code == 412
+        assert client.get("/api/v1/me", headers=headers).json()["nombre"] == "Primero"
+
+    def test_version_cambiada_entre_lectura_y_update(self, test_db):
+        """
+        GIVEN una versión esperada que otra transacción ya incrementó
+        WHEN el servicio ejecuta el UPDATE condicionado
+        THEN lanza 412
+        """
+        from schemas import UserUpdate
+
+        db = test_db()
+        db.add(User(email="race@test.com", hashed_password="hash", nombre="A", role=UserRoleEnum.candidato))
+        db.commit()
+        user_id = db.query(User).first().id
+        db.close()
+
+        other = test_db()
+        UserService(other).update_user(user_id, UserUpdate(nombre="B"))
+        other.close()
+
+        db = test_db()
+        with pytest.raises(HTTPException) as exc_info:
+            UserService(db).update_user(user_id, UserUpdate(nombre="C"), expected_version=1)
+        db.close()
+
+        assert exc_info.value.status_code == 412
+
+    def test_update_concurrente_retorna_la_fila_de_la_db(self, test_db):
+        """
+        GIVEN un usuario ya cargado en la sesión (como lo deja get_current_user)
+        WHEN otra request lo actualiza y después esta sesión actualiza otro campo
+        THEN el usuario devuelto y su ETag coinciden con la fila releída de la DB
+        """
+        from routes import user_etag
+        from schemas import UserUpdate
+
+        db = test_db()
+        db.add(User(email="race@test.com", hashed_password="hash", nombre="A", role=UserRoleEnum.candidato))
+        db.commit()
+        current_user = db.query(User).first()
+        user_id = current_user.id
+
+        other = test_db()
+        UserService(other).update_user(user_id, UserUpdate(nombre="Other"))
+        other.close()
+
+        user = UserService(db).update_user(user_id, UserUpdate(apellido="Pérez"))
+        db.close()
+
+        assert user is current_user
+
+        fresh = test_db()
+        stored = fresh.get(User, user_id)
+        fresh.close()
+
+        assert (user.version_id, user.nombre, user.apellido) == (3, "Other", "Pérez")
+        assert (stored.version_id, stored.nombre, stored.apellido) == (3, "Other", "Pérez")
+        assert user_etag(user) == user_etag(stored)
+
+    def test_internal_retorna_304(self, client, test_db):
+        """
+        GIVEN un servicio que ya tiene el ETag de un usuario
+        WHEN consulta el endpoint interno con If-None-Match
+        THEN recibe 304 sin cuerpo
+        """
+        from routes import INTERNAL_API_KEY
+
+        self._registrar_candidato(client)
+        db = test_db()
+        user_id = db.query(User).first().id
+        db.close()
+        headers = {"X-Internal-Api-Key": INTERNAL_API_KEY}
+
+        first = client.get(f"/api/v1/internal/users/{user_id}", headers=headers)
+        second = client.get(
+            f"/api/v1/internal/users/{user_id}",
+            headers={**headers, "If-None-Match": first.headers["ETag"]}
+        )
+
+        assert first.status_code == 200
+        assert second.status_code == 304
+        assert second.content == b""
+
+
+# =====================================================
+# TESTS DE ENDPOINTS ADMIN
+# =====================================================
+
+class TestAdmin:
+    """Tests para endpoints administrativos"""
+
+    def test_admin_get_all_users(self, client, admin_token):
+        """
+        GIVEN un admin autenticado y varios usuarios
+        WHEN solicita todos los usuarios
+        THEN recibe la lista completa
+        """
+        # Crear usuarios
+        client.post("/api/v1/register-candidato", data={
+            "email": "candidato1@test.com",
+            "password": "TestPass123!",
+            "nombre": "User1",
+            "apellido": "Test",
             "genero": "masculino",
             "fecha_nacimiento": "1990-01-01"
         })
@@ -579,6 +1392,343 @@ class TestAdmin:
         assert response.status_code == 403
 
 
+class TestSparseFieldsets:
+    """Tests para ?fields= en endpoints de listas, perfil e internos"""
+
+    def _registrar_empresa(self, client):
+        client.post("/api/v1/register-empresa", data={
+            "email": "empresa@test.com",
+            "password": "TestPass123!",
+            "nombre": "Tech Corp",
+            "descripcion": "Descripción larga de la empresa"
+        })
+
+    def test_admin_users_solo_campos_pedidos(self, client, admin_token, test_db):
+        """
+        GIVEN un admin y usuarios registrados
+        WHEN pide /admin/users?fields=id,email,role
+        THEN cada usuario trae solo esos campos y la consulta no lee descripcion
+        """
+        self._registrar_empresa(client)
+
+        with count_statements(test_db) as statements:
+            response = client.get(
+                "/api/v1/admin/users",
+                params={"fields": "email,id,role"},
+                headers={"Authorization": f"Bearer {admin_token}"}
+            )
+
+        assert response.status_code == 200
+        users = response.json()
+        assert len(users) == 2
+        assert all(list(user) == ["id", "email", "role"] for user in users)
+        list_query = [sql for sql in statements if "LIMIT" in sql and "FROM USERS" in sql][-1]
+        assert "DESCRIPCION" not in list_query
+
+    def test_verified_se_mapea_a_email_verified(self, client, admin_token):
+        """
+        GIVEN un admin
+        WHEN pide /admin/users?fields=verified
+        THEN recibe el valor de la columna email_verified
+        """
+        response = client.get(
+            "/api/v1/admin/users",
+            params={"fields": "verified"},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+
+        assert response.json() == [{"verified": True}]
+
+    def test_campo_desconocido(self, client, admin_token):
+        """
+        GIVEN un admin
+        WHEN pide un campo que no existe (o uno interno como hashed_password)
+        THEN recibe 400
+        """
+        response = client.get(
+            "/api/v1/admin/users",
+            params={"fields": "id,hashed_password"},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+
+        assert response.status_code == 400
+        assert "hashed_password" in response.json()["detail"]
+
+    def test_busqueda_con_fields(self, client, admin_token):
+        """
+        GIVEN una empresa indexada
+        WHEN se busca con ?fields=id,nombre
+        THEN los resultados traen solo esos campos
+        """
+        self._registrar_empresa(client)
+
+        response = client.get(
+            "/api/v1/users/search",
+            params={"q": "tech", "fields": "id,nombre"},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+
+        assert response.json() == [{"id": 2, "nombre": "Tech Corp"}]
+
+    def test_me_con_fields(self, client):
+        """
+        GIVEN un usuario autenticado
+        WHEN pide /me?fields=email,nombre
+        THEN recibe solo esos campos y sin ETag
+        """
+        self._registrar_empresa(client)
+        token = create_access_token(data={"sub": "empresa@test.com"})
+
+        response = client.get(
+            "/api/v1/me",
+            params={"fields": "email,nombre"},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+
+        assert response.json() == {"email": "empresa@test.com", "nombre": "Tech Corp"}
+        assert "ETag" not in response.headers
+
+    def test_internal_con_fields(self, client):
+        """
+        GIVEN un usuario existente
+        WHEN otro servicio pide /internal/users/{id}?fields=id,role
+        THEN recibe solo esos campos, en JSON o msgpack
+        """
+        import msgpack
+        from routes import INTERNAL_API_KEY
+
+        self._registrar_empresa(client)
+        headers = {"X-Internal-Api-Key": INTERNAL_API_KEY}
+
+        as_json = client.get("/api/v1/internal/users/1", params={"fields": "id,role"}, headers=headers)
+        as_msgpack = client.get(
+            "/api/v1/internal/users/1",
+            params={"fields": "id,role"},
+            headers={**headers, "Accept": "application/msgpack"}
+        )
+        missing = client.get("/api/v1/internal/users/99", params={"fields": "id"}, headers=headers)
+
+        assert as_json.json() == {"id": 1, "role": "empresa"}
+        assert msgpack.unpackb(as_msgpack.content) == {"id": 1, "role": "empresa"}
+        assert missing.status_code == 404
+
+class TestPoolStats:
+    """Tests para el endpoint de estadísticas del pool"""
+
+    def test_admin_ve_estadisticas_del_pool(self, client, admin_token):
+        """
+        GIVEN un admin autenticado
+        WHEN consulta /admin/db/pool
+        THEN recibe las estadísticas del primario y las réplicas
+        """
+        response = client.get(
+            "/api/v1/admin/db/pool",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert "pool_class" in data["primary"]
+        assert data["replicas"] == []
+
+    def test_no_admin_no_ve_estadisticas(self, client):
+        """
+        GIVEN un candidato autenticado
+        WHEN consulta /admin/db/pool
+        THEN recibe 403
+        """
+        client.post("/api/v1/register-candidato", data={
+            "email": "candidato@test.com",
+            "password": "TestPass123!",
+            "nombre": "Juan",
+            "apellido": "Pérez",
+            "genero": "masculino",
+            "fecha_nacimiento": "1990-01-01"
+        })
+        token = create_access_token(data={"sub": "candidato@test.com"})
+
+        response = client.get("/api/v1/admin/db/pool", headers={"Authorization": f"Bearer {token}"})
+
+        assert response.status_code == 403
+
+
+# =====================================================
+# TESTS DE BÚSQUEDA
+# =====================================================
+
+class TestBusqueda:
+    """Tests para búsqueda full-text de usuarios"""
+
+    def _registrar_usuarios(self, client):
+        client.post("/api/v1/register-candidato", data={
+            "email": "ana.gomez@test.com",
+            "password": "TestPass123!",
+            "nombre": "Ana",
+            "apellido": "Gómez",
+            "genero": "femenino",
+            "fecha_nacimiento": "1990-01-01"
+        })
+        client.post("/api/v1/register-empresa", data={
+            "email": "rrhh@andina.com",
+            "password": "TestPass123!",
+            "nombre": "Andina Logística",
+            "descripcion": "Transporte de cargas y logística en Mendoza"
+        })
+        client.post("/api/v1/register-empresa", data={
+            "email": "contacto@polo52.com",
+            "password": "TestPass123!",
+            "nombre": "Polo52",
+            "descripcion": "Software para logística"
+        })
+
+    def test_admin_busca_por_descripcion(self, client, admin_token):
+        """
+        GIVEN empresas cuya descripción menciona logística
+        WHEN el admin busca "logística"
+        THEN recibe ambas empresas y ningún candidato
+        """
+        self._registrar_usuarios(client)
+
+        response = client.get(
+            "/api/v1/users/search",
+            params={"q": "logística"},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+
+        assert response.status_code == 200
+        emails = [u["email"] for u in response.json()]
+        assert set(emails) == {"rrhh@andina.com", "contacto@polo52.com"}
+        # La que menciona el término en nombre y descripción rankea primero
+        assert emails[0] == "rrhh@andina.com"
+
+    def test_busqueda_por_prefijo_y_rol(self, client, admin_token):
+        """
+        GIVEN usuarios de distintos roles
+        WHEN se busca por prefijo filtrando por rol
+        THEN solo vuelven los usuarios de ese rol
+        """
+        self._registrar_usuarios(client)
+
+        response = client.get(
+            "/api/v1/users/search",
+            params={"q": "gom", "role": "candidato"},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+
+        assert response.status_code == 200
+        assert [u["email"] for u in response.json()] == ["ana.gomez@test.com"]
+
+        response = client.get(
+            "/api/v1/users/search",
+            params={"q": "gom", "role": "empresa"},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.json() == []
+
+    def test_busqueda_paginada(self, client, admin_token):
+        """
+        GIVEN dos empresas que matchean
+        WHEN se pide una página de tamaño 1
+        THEN cada página trae un resultado distinto
+        """
+        self._registrar_usuarios(client)
+        headers = {"Authorization": f"Bearer {admin_token}"}
+
+        first = client.get("/api/v1/users/search", params={"q": "logística", "limit": 1}, headers=headers)
+        second = client.get("/api/v1/users/search", params={"q": "logística", "limit": 1, "skip": 1}, headers=headers)
+
+        assert len(first.json()) == 1
+        assert len(second.json()) == 1
+        assert first.json()[0]["id"] != second.json()[0]["id"]
+
+    def test_indice_se_actualiza_con_update_user(self, client, admin_token):
+        """
+        GIVEN una empresa indexada
+        WHEN actualiza su descripción
+        THEN la búsqueda refleja el nuevo texto y no el viejo
+        """
+        self._registrar_usuarios(client)
+        token = create_access_token(data={"sub": "contacto@polo52.com"})
+
+        client.put(
+            "/api/v1/me/empresa",
+            data={"descripcion": "Consultora de reclutamiento"},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        nuevo = client.get("/api/v1/users/search", params={"q": "reclutamiento"}, headers=headers)
+        viejo = client.get("/api/v1/users/search", params={"q": "software"}, headers=headers)
+
+        assert [u["email"] for u in nuevo.json()] == ["contacto@polo52.com"]
+        assert viejo.json() == []
+
+    def test_empresa_no_ve_admins(self, client, admin_token, test_db):
+        """
+        GIVEN un admin indexado y una empresa autenticada
+        WHEN ambos buscan el email del admin
+        THEN solo el admin lo ve en los resultados
+        """
+        self._registrar_usuarios(client)
+        db = test_db()
+        admin = db.query(User).filter(User.email == "admin@test.com").first()
+        UserService(db)._sync_search_index(admin)
+        db.commit()
+        db.close()
+        token = create_access_token(data={"sub": "rrhh@andina.com"})
+
+        as_admin = client.get(
+            "/api/v1/users/search",
+            params={"q": "admin"},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        as_empresa = client.get(
+            "/api/v1/users/search",
+            params={"q": "admin"},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+
+        assert [u["email"] for u in as_admin.json()] == ["admin@test.com"]
+        assert as_empresa.status_code == 200
+        assert as_empresa.json() == []
+
+    def test_candidato_no_puede_buscar(self, client):
+        """
+        GIVEN un candidato autenticado
+        WHEN intenta usar la búsqueda
+        THEN recibe 403
+        """
+        self._registrar_usuarios(client)
+        token = create_access_token(data={"sub": "ana.gomez@test.com"})
+
+        response = client.get(
+            "/api/v1/users/search",
+            params={"q": "andina"},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+
+        assert response.status_code == 403
+
+    def test_tsquery_de_postgres_usa_el_parser_del_indice(self):
+        """
+        GIVEN una búsqueda por email
+        WHEN se compila la consulta de PostgreSQL
+        THEN los lexemas salen de to_tsvector('simple', ...) sobre el texto completo y
+             el documento indexado incluye el email separado en usuario y dominio
+        """
+        from sqlalchemy.dialects import postgresql
+        from models import USER_SEARCH_TSVECTOR
+
+        compiled = UserService._prefix_tsquery("ana@empresa.com").compile(dialect=postgresql.dialect())
+        sql = str(compiled)
+
+        assert "unnest(to_tsvector(" in sql
+        assert "quote_literal(" in sql
+        assert compiled.params["to_tsvector_2"] == "ana@empresa.com"
+        assert ":*" in compiled.params.values()
+        assert "replace(coalesce(email, ''), '@', ' ')" in USER_SEARCH_TSVECTOR
+
+
 # =====================================================
 # TESTS DE GESTIÓN DE RECRUITERS
 # =====================================================
@@ -627,6 +1777,38 @@ class TestRecruiters:
         assert response.status_code == 200
         assert "asignado exitosamente" in response.json()["message"]
 
+    def test_cambios_de_recruiters_generan_eventos(self, client, test_db):
+        """
+        GIVEN una empresa y un candidato
+        WHEN la empresa asigna y luego elimina al recruiter
+        THEN el outbox tiene recruiter.linked y recruiter.unlinked
+        """
+        from models import OutboxEvent
+
+        client.post("/api/v1/register-empresa", data={
+            "email": "empresa@test.com",
+            "password": "TestPass123!",
+            "nombre": "Tech Corp",
+            "descripcion": "Tech company"
+        })
+        client.post("/api/v1/register-candidato", data={
+            "email": "recruiter@test.com",
+            "password": "TestPass123!",
+            "nombre": "Ana",
+            "apellido": "García",
+            "genero": "femenino",
+            "fecha_nacimiento": "1990-01-01"
+        })
+        headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'empresa@test.com'})}"}
+
+        client.post("/api/v1/companies/add-recruiter?recruiter_email=recruiter@test.com", headers=headers)
+        client.delete("/api/v1/companies/remove-recruiter?recruiter_email=recruiter@test.com", headers=headers)
+
+        db = test_db()
+        types = [e.event_type for e in db.query(OutboxEvent).order_by(OutboxEvent.id)]
+        db.close()
+        assert types == ["user.created", "user.created", "recruiter.linked", "recruiter.unlinked"]
+
     def test_empresa_get_my_recruiters(self, client):
         """
         GIVEN una empresa con recruiters asignados
@@ -883,6 +2065,119 @@ class TestRecruiters:
         assert response.status_code == 403
 
 
+    def _registrar_candidatos(self, client):
+        for email, nombre in (
+            ("maria.lopez@test.com", "María"),
+            ("mario.diaz@test.com", "Mario"),
+            ("ana.maria@test.com", "Ana"),
+        ):
+            client.post("/api/v1/register-candidato", data={
+                "email": email,
+                "password": "TestPass123!",
+                "nombre": nombre,
+                "apellido": "Test",
+                "genero": "femenino",
+                "fecha_nacimiento": "1990-01-01"
+            })
+        client.post("/api/v1/register-empresa", data={
+            "email": "mariana@empresa.com",
+            "password": "TestPass123!",
+            "nombre": "Mariana SA",
+            "descripcion": "Empresa"
+        })
+
+    def test_recruiter_suggestions_por_prefijo(self, client):
+        """
+        GIVEN varios candidatos y una empresa con emails parecidos
+        WHEN la empresa tipea un prefijo
+        THEN recibe solo candidatos, ordenados por email
+        """
+        self._registrar_candidatos(client)
+        token = create_access_token(data={"sub": "mariana@empresa.com"})
+
+        response = client.get(
+            "/api/v1/companies/recruiter-suggestions",
+            params={"q": "MARI"},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+
+        assert response.status_code == 200
+        emails = [s["email"] for s in response.json()["suggestions"]]
+        assert emails[:2] == ["maria.lopez@test.com", "mario.diaz@test.com"]
+        assert "mariana@empresa.com" not in emails
+
+    def test_recruiter_suggestions_fragmento_difuso(self, client):
+        """
+        GIVEN un candidato cuyo email contiene el fragmento en el medio
+        WHEN la empresa tipea ese fragmento
+        THEN aparece después de las coincidencias por prefijo
+        """
+        self._registrar_candidatos(client)
+        token = create_access_token(data={"sub": "mariana@empresa.com"})
+
+        response = client.get(
+            "/api/v1/companies/recruiter-suggestions",
+            params={"q": "maria"},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+
+        emails = [s["email"] for s in response.json()["suggestions"]]
+        assert emails == ["maria.lopez@test.com", "ana.maria@test.com"]
+
+    def test_recruiter_suggestions_comodines_literales(self, client):
+        """
+        GIVEN candidatos cuyo email empieza con "mari"
+        WHEN la empresa tipea un prefijo con _ (comodín de LIKE)
+        THEN se toma literal y no sugiere a nadie
+        """
+        self._registrar_candidatos(client)
+        token = create_access_token(data={"sub": "mariana@empresa.com"})
+
+        response = client.get(
+            "/api/v1/companies/recruiter-suggestions",
+            params={"q": "mari_"},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+
+        assert response.status_code == 200
+        assert response.json()["suggestions"] == []
+
+    def test_recruiter_suggestions_usa_cache(self, client, test_db):
+        """
+        GIVEN una búsqueda ya respondida
+        WHEN se repite la misma búsqueda
+        THEN se responde desde la cache sin consultar la DB
+        """
+        self._registrar_candidatos(client)
+        token = create_access_token(data={"sub": "mariana@empresa.com"})
+        headers = {"Authorization": f"Bearer {token}"}
+        first = client.get("/api/v1/companies/recruiter-suggestions", params={"q": "mar"}, headers=headers)
+
+        with count_statements(test_db) as statements:
+            second = client.get("/api/v1/companies/recruiter-suggestions", params={"q": "mar"}, headers=headers)
+
+        assert second.json() == first.json()
+        # Solo la carga del usuario autenticado
+        assert len([s for s in statements if s.startswith("SELECT")]) == 1
+
+    def test_recruiter_suggestions_solo_empresas(self, client):
+        """
+        GIVEN un candidato autenticado
+        WHEN pide sugerencias de recruiters
+        THEN recibe 403
+        """
+        self._registrar_candidatos(client)
+        token = create_access_token(data={"sub": "maria.lopez@test.com"})
+
+        response = client.get(
+            "/api/v1/companies/recruiter-suggestions",
+            params={"q": "mar"},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+
+        assert response.status_code == 403
+
+
 # =====================================================
 # TESTS DE ENDPOINT INTERNO
 # =====================================================
@@ -973,3 +2268,286 @@ class TestInternalEndpoint:
         )
 
         assert response.status_code == 404
+
+
+    def test_get_user_internal_cacheado(self, client, test_db):
+        """
+        GIVEN un usuario ya consultado por el endpoint interno
+        WHEN se lo vuelve a consultar
+        THEN se responde desde la cache sin consultar la DB
+        """
+        from routes import INTERNAL_API_KEY
+
+        client.post("/api/v1/register-empresa", data={
+            "email": "empresa@test.com",
+            "password": "TestPass123!",
+            "nombre": "Tech Corp",
+            "descripcion": "Tech company"
+        })
+        headers = {"X-Internal-Api-Key": INTERNAL_API_KEY}
+        first = client.get("/api/v1/internal/users/1", headers=headers)
+
+        with count_statements(test_db) as statements:
+            second = client.get("/api/v1/internal/users/1", headers=headers)
+
+        assert second.status_code == 200
+        assert second.content == first.content
+        assert second.headers["ETag"] == first.headers["ETag"]
+        assert statements == []
+
+    def test_carga_compartida_no_usa_la_sesion_de_la_request(self, test_db):
+        """
+        GIVEN la sesión de la request que inicia la carga, que falla al usarse
+        WHEN se carga el usuario para el single-flight
+        THEN la carga usa su propia sesión y el resultado queda en cache
+        """
+        from cache import internal_user_cache
+        from routes import _load_internal_user
+
+        db = test_db()
+        db.add(User(email="empresa@test.com", hashed_password="hash", nombre="Tech Corp", role=UserRoleEnum.empresa))
+        db.commit()
+        user_id = db.query(User).first().id
+
+        def broken(*args, **kwargs):
+            raise RuntimeError("sesión de la request cerrada")
+
+        db.query = db.execute = broken
+        entry = _load_internal_user(user_id, db)
+        db.close()
+
+        assert b"empresa@test.com" in entry["application/json"][1]
+        assert internal_user_cache.get(user_id) is entry
+
+    def test_get_user_internal_invalida_cache_en_update(self, client):
+        """
+        GIVEN un usuario cacheado en el endpoint interno
+        WHEN el usuario actualiza su perfil
+        THEN el endpoint interno devuelve los datos nuevos
+        """
+        from routes import INTERNAL_API_KEY
+
+        client.post("/api/v1/register-empresa", data={
+            "email": "empresa@test.com",
+            "password": "TestPass123!",
+            "nombre": "Tech Corp",
+            "descripcion": "Tech company"
+        })
+        headers = {"X-Internal-Api-Key": INTERNAL_API_KEY}
+        client.get("/api/v1/internal/users/1", headers=headers)
+
+        token = create_access_token(data={"sub": "empresa@test.com"})
+        client.put("/api/v1/me/empresa", data={"nombre": "Nueva Corp"}, headers={"Authorization": f"Bearer {token}"})
+
+        assert client.get("/api/v1/internal/users/1", headers=headers).json()["nombre"] == "Nueva Corp"
+
+    def test_get_user_internal_404_cacheado(self, client, test_db):
+        """
+        GIVEN un ID inexistente ya consultado
+        WHEN se lo vuelve a consultar dentro del TTL negativo
+        THEN recibe 404 sin consultar la DB, y deja de ser 404 cuando el usuario se crea
+        """
+        from routes import INTERNAL_API_KEY
+
+        headers = {"X-Internal-Api-Key": INTERNAL_API_KEY}
+        assert client.get("/api/v1/internal/users/1", headers=headers).status_code == 404
+
+        with count_statements(test_db) as statements:
+            assert client.get("/api/v1/internal/users/1", headers=headers).status_code == 404
+        assert statements == []
+
+        client.post("/api/v1/register-empresa", data={
+            "email": "empresa@test.com",
+            "password": "TestPass123!",
+            "nombre": "Tech Corp",
+            "descripcion": "Tech company"
+        })
+        assert client.get("/api/v1/internal/users/1", headers=headers).status_code == 200
+
+    def test_get_user_internal_msgpack(self, client):
+        """
+        GIVEN un usuario existente
+        WHEN otro servicio lo pide con Accept: application/msgpack
+        THEN recibe msgpack con los mismos datos que en JSON
+        """
+        from routes import INTERNAL_API_KEY
+        from serialization import decode_user
+
+        client.post("/api/v1/register-empresa", data={
+            "email": "empresa@test.com",
+            "password": "TestPass123!",
+            "nombre": "Tech Corp",
+            "descripcion": "Tech company"
+        })
+        headers = {"X-Internal-Api-Key": INTERNAL_API_KEY}
+        as_json = client.get("/api/v1/internal/users/1", headers=headers)
+        as_msgpack = client.get(
+            "/api/v1/internal/users/1",
+            headers={**headers, "Accept": "application/msgpack"}
+        )
+
+        assert as_msgpack.status_code == 200
+        assert as_msgpack.headers["content-type"] == "application/msgpack"
+        assert as_msgpack.headers["ETag"] == as_json.headers["ETag"][:-1] + '-mp"'
+        assert "Accept" in as_msgpack.headers["Vary"]
+        assert decode_user(as_msgpack.content) == as_json.json()
+        assert len(as_msgpack.content) < len(as_json.content)
+
+    def test_get_user_internal_etag_por_formato(self, client):
+        """
+        GIVEN un servicio que tiene cacheada la versión JSON de un usuario
+        WHEN lo revalida pidiendo msgpack con el ETag de JSON, y después con el de msgpack
+        THEN el primero recibe el cuerpo msgpack completo y el segundo 304
+        """
+        from routes import INTERNAL_API_KEY
+
+        client.post("/api/v1/register-empresa", data={
+            "email": "empresa@test.com",
+            "password": "TestPass123!",
+            "nombre": "Tech Corp",
+            "descripcion": "Tech company"
+        })
+        headers = {"X-Internal-Api-Key": INTERNAL_API_KEY, "Accept": "application/msgpack"}
+        json_etag = client.get("/api/v1/internal/users/1", headers={"X-Internal-Api-Key": INTERNAL_API_KEY}).headers["ETag"]
+
+        revalidated = client.get("/api/v1/internal/users/1", headers={**headers, "If-None-Match": json_etag})
+        assert revalidated.status_code == 200
+        assert revalidated.headers["content-type"] == "application/msgpack"
+
+        not_modified = client.get(
+            "/api/v1/internal/users/1",
+            headers={**headers, "If-None-Match": revalidated.headers["ETag"]}
+        )
+        assert not_modified.status_code == 304
+        assert "Accept" in not_modified.headers["Vary"]
+
+class TestChangeFeed:
+    """Tests para el change feed interno /internal/users/changes"""
+
+    @pytest.fixture(autouse=True)
+    def sin_margen(self, monkeypatch):
+        import routes
+        monkeypatch.setattr(routes, "CHANGES_FEED_LAG_SECONDS", 0)
+
+    @pytest.fixture
+    def internal_headers(self):
+        from routes import INTERNAL_API_KEY
+        return {"X-Internal-Api-Key": INTERNAL_API_KEY}
+
+    def _registrar(self, client, cantidad):
+        for i in range(cantidad):
+            client.post("/api/v1/register-empresa", data={
+                "email": f"empresa{i}@test.com",
+                "password": "TestPass123!",
+                "nombre": f"Empresa {i}",
+                "descripcion": "Empresa"
+            })
+
+    def test_paginas_acotadas_por_cursor(self, client, internal_headers):
+        """
+        GIVEN tres usuarios creados
+        WHEN se recorre el feed con páginas de 2
+        THEN se reciben todos una sola vez y el cursor final no trae nada nuevo
+        """
+        self._registrar(client, 3)
+
+        first = client.get("/api/v1/internal/users/changes", params={"limit": 2}, headers=internal_headers).json()
+        second = client.get(
+            "/api/v1/internal/users/changes",
+            params={"limit": 2, "since": first["next_cursor"]},
+            headers=internal_headers
+        ).json()
+        third = client.get(
+            "/api/v1/internal/users/changes",
+            params={"limit": 2, "since": second["next_cursor"]},
+            headers=internal_headers
+        ).json()
+
+        assert [u["email"] for u in first["users"]] == ["empresa0@test.com", "empresa1@test.com"]
+        assert first["has_more"] is True
+        assert [u["email"] for u in second["users"]] == ["empresa2@test.com"]
+        assert second["has_more"] is False
+        assert third["users"] == []
+        assert third["next_cursor"] == second["next_cursor"]
+
+    def test_usuario_modificado_vuelve_a_aparecer(self, client, internal_headers):
+        """
+        GIVEN un consumidor al día con el feed
+        WHEN un usuario actualiza su perfil
+        THEN la siguiente página trae solo ese usuario con los datos nuevos
+        """
+        self._registrar(client, 2)
+        cursor = client.get("/api/v1/internal/users/changes", headers=internal_headers).json()["next_cursor"]
+
+        token = create_access_token(data={"sub": "empresa0@test.com"})
+        client.put(
+            "/api/v1/me/empresa",
+            data={"descripcion": "Nueva descripción"},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+
+        page = client.get(
+            "/api/v1/internal/users/changes",
+            params={"since": cursor},
+            headers=internal_headers
+        ).json()
+
+        assert [u["email"] for u in page["users"]] == ["empresa0@test.com"]
+        assert page["users"][0]["descripcion"] == "Nueva descripción"
+
+    def test_margen_excluye_cambios_recientes(self, client, internal_headers, monkeypatch):
+        """
+        GIVEN un margen de seguridad mayor a la antigüedad de los cambios
+        WHEN se consulta el feed
+        THEN todavía no se entregan
+        """
+        import routes
+        monkeypatch.setattr(routes, "CHANGES_FEED_LAG_SECONDS", 60)
+        self._registrar(client, 1)
+
+        page = client.get("/api/v1/internal/users/changes", headers=internal_headers).json()
+
+        assert page["users"] == []
+
+    def test_pagina_en_msgpack(self, client, internal_headers):
+        """
+        GIVEN usuarios en el feed
+        WHEN se consulta con Accept: application/msgpack
+        THEN la página decodificada coincide con la versión JSON
+        """
+        from serialization import decode_user_page
+
+        self._registrar(client, 2)
+
+        as_json = client.get("/api/v1/internal/users/changes", headers=internal_headers).json()
+        response = client.get(
+            "/api/v1/internal/users/changes",
+            headers={**internal_headers, "Accept": "application/msgpack"}
+        )
+
+        assert response.headers["content-type"] == "application/msgpack"
+        assert decode_user_page(response.content) == as_json
+
+    def test_cursor_invalido(self, client, internal_headers):
+        """
+        GIVEN un cursor corrupto
+        WHEN se consulta el feed
+        THEN retorna 400
+        """
+        response = client.get(
+            "/api/v1/internal/users/changes",
+            params={"since": "no-es-un-cursor"},
+            headers=internal_headers
+        )
+
+        assert response.status_code == 400
+
+    def test_requiere_api_key(self, client):
+        """
+        GIVEN una request sin API key interna
+        WHEN se consulta el feed
+        THEN retorna 403
+        """
+        response = client.get("/api/v1/internal/users/changes")
+
+        assert response.status_code == 403
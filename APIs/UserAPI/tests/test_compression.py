@@ -0,0 +1,216 @@
+"""
+Tests para compression.py (middleware de compresión gzip/brotli)
+"""
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from cache import TTLCache
+from compression import CompressionMiddleware, negotiate_encoding
+
+BODY = b'{"descripcion": "' + b"texto repetido " * 200 + b'"}'
+
+
+@pytest.fixture
+def cache():
+    return TTLCache("compression_test", maxsize=16, ttl=60)
+
+
+@pytest.fixture
+def client(cache):
+    app = FastAPI()
+
+    @app.get("/grande")
+    def grande():
+        return Response(content=BODY, media_type="application/json")
+
+    @app.get("/chica")
+    def chica():
+        return Response(content=b'{"ok": true}', media_type="application/json")
+
+    @app.get("/con-etag")
+    def con_etag():
+        return Response(content=BODY, media_type="application/json", headers={"ETag": '"1-1"'})
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((BODY for _ in range(3)), media_type="application/json")
+
+    @app.get("/profile_pictures/foto.json")
+    def excluida():
+        return Response(content=BODY, media_type="application/json")
+
+    app.add_middleware(CompressionMiddleware, minimum_size=500, cache=cache)
+    return TestClient(app)
+
+
+class TestNegociacion:
+    """Tests para la elección de codificación"""
+
+    @pytest.mark.parametrize("accept_encoding, expected", [
+        (None, None),
+        ("identity", None),
+        ("gzip", "gzip"),
+        ("gzip, deflate, br", "br"),
+        ("br;q=0.5, gzip", "gzip"),
+        ("gzip;q=0", None),
+        ("*", "br"),
+    ])
+    def test_codificacion_elegida(self, accept_encoding, expected):
+        """
+        GIVEN un header Accept-Encoding
+        WHEN se negocia la compresión
+        THEN se elige la codificación preferida por el cliente, brotli a igual q
+        """
+        assert negotiate_encoding(accept_encoding) == expected
+
+
+class TestMiddleware:
+    """Tests para CompressionMiddleware"""
+
+    def test_gzip(self, client):
+        """
+        GIVEN una respuesta grande
+        WHEN el cliente acepta gzip
+        THEN se envía comprimida con Vary: Accept-Encoding
+        """
+        response = client.get("/grande", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert int(response.headers["content-length"]) < len(BODY)
+        assert response.content == BODY
+
+    def test_brotli(self, client):
+        """
+        GIVEN una respuesta grande
+        WHEN el cliente acepta br
+        THEN se envía comprimida con brotli
+        """
+        response = client.get("/grande", headers={"Accept-Encoding": "br"})
+
+        # httpx decodifica br de forma transparente
+        assert response.headers["content-encoding"] == "br"
+        assert response.content == BODY
+
+    def test_respuesta_chica_sin_comprimir(self, client):
+        """
+        GIVEN una respuesta menor al mínimo
+        WHEN el cliente acepta gzip
+        THEN se envía sin comprimir
+        """
+        response = client.get("/chica", headers={"Accept-Encoding": "gzip"})
+
+        assert "content-encoding" not in response.headers
+
+    def test_path_excluido(self, client):
+        """
+        GIVEN un archivo bajo /profile_pictures
+        WHEN el cliente acepta gzip
+        THEN se envía tal cual
+        """
+        response = client.get("/profile_pictures/foto.json", headers={"Accept-Encoding": "gzip"})
+
+        assert "content-encoding" not in response.headers
+        assert response.content == BODY
+
+    def test_streaming(self, client):
+        """
+        GIVEN una respuesta en streaming
+        WHEN el cliente acepta gzip
+        THEN cada chunk sale comprimido y el stream completo se descomprime bien
+        """
+        response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        assert response.content == BODY * 3
+
+    def test_cache_por_etag(self, client, cache):
+        """
+        GIVEN una respuesta con ETag fuerte
+        WHEN se pide dos veces con gzip
+        THEN la segunda usa los bytes comprimidos cacheados
+        """
+        first = client.get("/con-etag", headers={"Accept-Encoding": "gzip"})
+        second = client.get("/con-etag", headers={"Accept-Encoding": "gzip"})
+
+        assert first.content == second.content == BODY
+        assert cache.stats()["hits"] == 1
+        assert len(cache) == 1
+
+    def test_sin_etag_no_se_cachea(self, client, cache):
+        """
+        GIVEN una respuesta sin ETag
+        WHEN se comprime
+        THEN no se guarda en la cache
+        """
+        client.get("/grande", headers={"Accept-Encoding": "gzip"})
+
+        assert len(cache) == 0
+
+
+class TestDetrasDeOtrosMiddlewares:
+    """Respuestas re-emitidas en chunks por middlewares internos (BaseHTTPMiddleware)"""
+
+    @pytest.fixture
+    def wrapped_client(self, cache):
+        app = FastAPI()
+
+        @app.get("/chica")
+        def chica():
+            return Response(content=b'{"ok": true}', media_type="application/json")
+
+        @app.get("/con-etag")
+        def con_etag():
+            return Response(content=BODY, media_type="application/json", headers={"ETag": '"1-1"'})
+
+        @app.middleware("http")
+        async def passthrough(request, call_next):
+            return await call_next(request)
+
+        app.add_middleware(CompressionMiddleware, minimum_size=500, cache=cache)
+        return TestClient(app)
+
+    def test_respuesta_chica_sin_comprimir(self, wrapped_client):
+        """
+        GIVEN una respuesta chica que llega como stream desde un BaseHTTPMiddleware
+        WHEN el cliente acepta gzip
+        THEN se acumula, no llega al mínimo y sale sin comprimir
+        """
+        response = wrapped_client.get("/chica", headers={"Accept-Encoding": "gzip"})
+
+        assert "content-encoding" not in response.headers
+        assert response.content == b'{"ok": true}'
+
+    def test_cache_por_etag(self, wrapped_client, cache):
+        """
+        GIVEN una respuesta con ETag fuerte que llega como stream
+        WHEN se pide dos veces con gzip
+        THEN sale con Content-Length y la segunda usa la cache
+        """
+        first = wrapped_client.get("/con-etag", headers={"Accept-Encoding": "gzip"})
+        second = wrapped_client.get("/con-etag", headers={"Accept-Encoding": "gzip"})
+
+        assert first.headers["content-encoding"] == "gzip"
+        assert "content-length" in first.headers
+        assert first.content == second.content == BODY
+        assert cache.stats()["hits"] == 1
+
+    def test_app_real_respeta_el_minimo(self):
+        """
+        GIVEN la app completa con todos sus middlewares
+        WHEN se pide /livez (18 bytes) y /openapi.json (grande) con gzip
+        THEN la chica sale sin comprimir y la grande comprimida con Content-Length
+        """
+        from main import app
+
+        client = TestClient(app)
+        small = client.get("/livez", headers={"Accept-Encoding": "gzip"})
+        large = client.get("/openapi.json", headers={"Accept-Encoding": "gzip"})
+
+        assert "content-encoding" not in small.headers
+        assert small.json() == {"status": "alive"}
+        assert large.headers["content-encoding"] == "gzip"
+        assert "content-length" in large.headers
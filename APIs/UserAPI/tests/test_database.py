@@ -0,0 +1,358 @@
+"""
+Tests para el ruteo de lecturas a réplicas (database.py)
+"""
+import asyncio
+import os
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool, QueuePool
+
+import database
+from database import Base, ReplicaRouter, engine_options, get_db, has_recent_write, mark_recent_write, pool_stats
+from main import app
+from models import User, UserRoleEnum
+from auth import create_access_token
+from cache import clear_all_caches
+
+
+def _sqlite_engine():
+    db_fd, db_path = tempfile.mkstemp()
+    os.close(db_fd)
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return engine, db_path
+
+
+def _add_user(engine, email, nombre, role=UserRoleEnum.candidato):
+    session = sessionmaker(bind=engine)()
+    session.add(User(email=email, hashed_password="hash", nombre=nombre, role=role))
+    session.commit()
+    session.close()
+
+
+@pytest.fixture
+def primary_and_replica(monkeypatch):
+    """Primario y réplica SQLite separados; la réplica queda registrada en el router"""
+    primary, primary_path = _sqlite_engine()
+    replica, replica_path = _sqlite_engine()
+    PrimarySession = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=primary)
+
+    def override_get_db():
+        db = PrimarySession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    monkeypatch.setattr(database, "replica_router", ReplicaRouter([replica]))
+    clear_all_caches()
+    yield primary, replica
+
+    app.dependency_overrides.clear()
+    primary.dispose()
+    replica.dispose()
+    os.unlink(primary_path)
+    os.unlink(replica_path)
+
+
+class TestPoolConfig:
+    """Tests de configuración y métricas del pool de conexiones"""
+
+    def test_opciones_postgres(self, monkeypatch):
+        """
+        GIVEN variables de entorno de pool
+        WHEN se arman las opciones para una URL PostgreSQL
+        THEN incluyen tamaño, overflow, timeout, recycle, pre-ping y LIFO
+        """
+        monkeypatch.setattr(database, "DB_POOL_SIZE", 3)
+        monkeypatch.setattr(database, "DB_MAX_OVERFLOW", 2)
+
+        options = engine_options("postgresql://user:pass@db/users")
+
+        assert options["pool_size"] == 3
+        assert options["max_overflow"] == 2
+        assert options["pool_pre_ping"] is True
+        assert options["pool_use_lifo"] is True
+        assert options["pool_recycle"] == database.DB_POOL_RECYCLE
+        assert options["pool_timeout"] == database.DB_POOL_TIMEOUT
+
+    def test_pooler_externo_usa_nullpool(self, monkeypatch):
+        """
+        GIVEN modo pooler externo (pgbouncer)
+        WHEN se arman las opciones del engine
+        THEN se usa NullPool
+        """
+        monkeypatch.setattr(database, "DB_EXTERNAL_POOLER", True)
+
+        assert engine_options("postgresql://user:pass@db/users") == {"poolclass": NullPool}
+
+    def test_opciones_sqlite(self):
+        """
+        GIVEN una URL SQLite
+        WHEN se arman las opciones del engine
+        THEN no se pasan parámetros exclusivos de QueuePool
+        """
+        assert "pool_size" not in engine_options("sqlite:///test.db")
+
+    def test_pool_stats(self):
+        """
+        GIVEN un QueuePool con una conexión en uso
+        WHEN se piden las estadísticas
+        THEN reflejan la conexión tomada y la saturación
+        """
+        engine = create_engine("sqlite://", poolclass=QueuePool, pool_size=2, max_overflow=2)
+        conn = engine.connect()
+
+        stats = pool_stats(engine)
+        conn.close()
+
+        assert stats["pool_class"] == "QueuePool"
+        assert stats["size"] == 2
+        assert stats["checked_out"] == 1
+        assert stats["saturation"] == 0.25
+
+
+class TestArranqueEnFrio:
+    """Tests de la creación perezosa del engine y el warm-up del pool"""
+
+    def test_engine_se_crea_en_la_primera_sesion(self, monkeypatch):
+        """
+        GIVEN el engine del primario todavía sin crear
+        WHEN se abre la primera sesión
+        THEN el engine se crea y queda asociado a SessionLocal
+        """
+        monkeypatch.setattr(database, "DATABASE_URL", "sqlite://")
+        monkeypatch.setattr(database, "_engine", None)
+        monkeypatch.setitem(database.SessionLocal.kw, "bind", None)
+
+        session = database.SessionLocal()
+
+        assert database._engine is not None
+        assert session.get_bind() is database._engine
+        session.close()
+        database._engine.dispose()
+
+    def test_engines_de_replicas_se_crean_en_el_primer_uso(self, monkeypatch):
+        """
+        GIVEN un router configurado con URLs de réplicas
+        WHEN se lo construye y después se elige una réplica
+        THEN los engines se crean recién al elegir
+        """
+        created = []
+
+        def fake_create_engine(url, **kwargs):
+            created.append(url)
+            return create_engine("sqlite://")
+
+        monkeypatch.setattr(database, "create_engine", fake_create_engine)
+        router = ReplicaRouter(urls=["sqlite:///r1.db", "sqlite:///r2.db"])
+
+        assert created == []
+        replica = router.choose()
+        assert created == ["sqlite:///r1.db", "sqlite:///r2.db"]
+        assert replica is router.engines[0]
+        assert router.choose() is router.engines[1]
+
+    def test_prime_pool_deja_conexiones_abiertas(self, monkeypatch):
+        """
+        GIVEN un QueuePool vacío
+        WHEN se hace el warm-up con dos conexiones
+        THEN el pool queda con dos conexiones disponibles
+        """
+        engine = create_engine("sqlite://", poolclass=QueuePool, pool_size=2, max_overflow=0)
+        monkeypatch.setattr(database, "_engine", engine)
+
+        assert database.prime_pool(2) == 2
+        assert engine.pool.checkedin() == 2
+        engine.dispose()
+
+
+class TestReplicaRouter:
+    """Tests unitarios del router de réplicas"""
+
+    def test_round_robin(self):
+        """
+        GIVEN dos réplicas sanas
+        WHEN se eligen réplicas sucesivas
+        THEN se alternan
+        """
+        a, b = create_engine("sqlite://"), create_engine("sqlite://")
+        router = ReplicaRouter([a, b])
+
+        assert [router.choose() for _ in range(4)] == [a, b, a, b]
+
+    def test_replica_caida_sale_de_la_rotacion(self):
+        """
+        GIVEN una réplica marcada como caída
+        WHEN se eligen réplicas
+        THEN solo se elige la sana, y sin réplicas sanas se usa el primario (None)
+        """
+        a, b = create_engine("sqlite://"), create_engine("sqlite://")
+        router = ReplicaRouter([a, b], retry_seconds=60)
+        router.mark_unhealthy(a)
+
+        assert {router.choose() for _ in range(3)} == {b}
+
+        router.mark_unhealthy(b)
+        assert router.choose() is None
+
+    def test_check_health_detecta_replica_inaccesible(self):
+        """
+        GIVEN una réplica cuya base no se puede abrir
+        WHEN se chequea la salud
+        THEN queda fuera de la rotación
+        """
+        broken = create_engine("sqlite:////directorio/inexistente/replica.db")
+        router = ReplicaRouter([broken], retry_seconds=60)
+
+        status = router.check_health()
+
+        assert list(status.values()) == [False]
+        assert router.choose() is None
+
+    def test_chequeo_periodico_en_background(self, monkeypatch):
+        """
+        GIVEN un router con réplicas y el chequeo de salud arrancado
+        WHEN pasan varios intervalos
+        THEN check_health corre periódicamente y stop detiene el loop
+        """
+        router = ReplicaRouter([create_engine("sqlite://")])
+        calls = []
+        monkeypatch.setattr(router, "check_health", lambda: calls.append(1) or {})
+
+        async def main():
+            router._task = asyncio.create_task(router.run(interval_seconds=0.01))
+            await asyncio.sleep(0.05)
+            await router.stop()
+
+        asyncio.run(main())
+
+        assert len(calls) >= 2
+        assert router._task is None
+
+    def test_sin_replicas(self):
+        """
+        GIVEN ninguna réplica configurada
+        WHEN se elige réplica
+        THEN se usa el primario
+        """
+        assert ReplicaRouter([]).choose() is None
+
+    def test_ventana_read_your_writes(self):
+        """
+        GIVEN un cliente que acaba de escribir
+        WHEN se consulta la ventana read-your-writes
+        THEN solo ese cliente queda marcado
+        """
+        mark_recent_write("Bearer escritor")
+
+        assert has_recent_write("Bearer escritor")
+        assert not has_recent_write("Bearer otro")
+        assert not has_recent_write(None)
+
+
+class TestReadRouting:
+    """Tests de ruteo de endpoints GET a réplicas"""
+
+    def test_admin_users_lee_de_replica(self, primary_and_replica):
+        """
+        GIVEN un usuario que solo existe en la réplica
+        WHEN un admin lista usuarios
+        THEN la lectura sale de la réplica
+        """
+        primary, replica = primary_and_replica
+        for engine in (primary, replica):
+            _add_user(engine, "admin@test.com", "Admin", UserRoleEnum.admin)
+        _add_user(replica, "solo-replica@test.com", "Replica")
+        token = create_access_token(data={"sub": "admin@test.com"})
+
+        response = TestClient(app).get("/api/v1/admin/users", headers={"Authorization": f"Bearer {token}"})
+
+        assert response.status_code == 200
+        assert "solo-replica@test.com" in [u["email"] for u in response.json()]
+
+    def test_read_your_writes_despues_de_update(self, primary_and_replica):
+        """
+        GIVEN una réplica atrasada respecto del primario
+        WHEN el usuario actualiza su perfil y vuelve a leer /me
+        THEN ve su propia escritura (lectura desde el primario)
+        """
+        primary, replica = primary_and_replica
+        for engine in (primary, replica):
+            _add_user(engine, "candidato@test.com", "Viejo")
+        client = TestClient(app)
+        headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'candidato@test.com'})}"}
+
+        assert client.get("/api/v1/me", headers=headers).json()["nombre"] == "Viejo"
+
+        update = client.put("/api/v1/me/candidato", data={"nombre": "Nuevo"}, headers=headers)
+        assert update.status_code == 200
+
+        assert client.get("/api/v1/me", headers=headers).json()["nombre"] == "Nuevo"
+
+    def test_endpoint_interno_lee_del_primario_despues_de_un_cambio(self, primary_and_replica):
+        """
+        GIVEN una réplica atrasada y el usuario ya cacheado por el endpoint interno
+        WHEN el usuario actualiza su perfil y otro servicio lo vuelve a pedir
+        THEN la nueva carga sale del primario y no vuelve a cachear la versión vieja
+        """
+        from routes import INTERNAL_API_KEY
+
+        primary, replica = primary_and_replica
+        for engine in (primary, replica):
+            _add_user(engine, "candidato@test.com", "Viejo")
+        client = TestClient(app)
+        internal = {"X-Internal-Api-Key": INTERNAL_API_KEY}
+        headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'candidato@test.com'})}"}
+
+        assert client.get("/api/v1/internal/users/1", headers=internal).json()["nombre"] == "Viejo"
+
+        update = client.put("/api/v1/me/candidato", data={"nombre": "Nuevo"}, headers=headers)
+        assert update.status_code == 200
+
+        assert client.get("/api/v1/internal/users/1", headers=internal).json()["nombre"] == "Nuevo"
+
+    def test_replica_caida_reintenta_en_el_primario(self, primary_and_replica, monkeypatch):
+        """
+        GIVEN una réplica cuya base no se puede abrir
+        WHEN un admin lista usuarios
+        THEN la lectura se reintenta en el primario y la réplica sale de la rotación
+        """
+        primary, _ = primary_and_replica
+        broken = create_engine("sqlite:////directorio/inexistente/replica.db")
+        router = ReplicaRouter([broken], retry_seconds=60)
+        monkeypatch.setattr(database, "replica_router", router)
+        _add_user(primary, "admin@test.com", "Admin", UserRoleEnum.admin)
+        token = create_access_token(data={"sub": "admin@test.com"})
+
+        response = TestClient(app).get("/api/v1/admin/users", headers={"Authorization": f"Bearer {token}"})
+
+        assert response.status_code == 200
+        assert "admin@test.com" in [u["email"] for u in response.json()]
+        assert router.choose() is None
+
+    def test_read_your_writes_en_otra_instancia(self, primary_and_replica, monkeypatch):
+        """
+        GIVEN una réplica atrasada y una escritura hecha en otra instancia
+        WHEN el cliente vuelve a leer /me con la cookie que dejó la escritura
+        THEN ve su propia escritura aunque esta instancia no la registró
+        """
+        primary, replica = primary_and_replica
+        for engine in (primary, replica):
+            _add_user(engine, "candidato@test.com", "Viejo")
+        client = TestClient(app)
+        headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'candidato@test.com'})}"}
+
+        update = client.put("/api/v1/me/candidato", data={"nombre": "Nuevo"}, headers=headers)
+        assert update.status_code == 200
+        assert database.READ_YOUR_WRITES_COOKIE in update.cookies
+
+        # La próxima request cae en una instancia que no vio la escritura
+        monkeypatch.setattr(database, "_recent_writes", {})
+
+        assert client.get("/api/v1/me", headers=headers).json()["nombre"] == "Nuevo"
@@ -0,0 +1,181 @@
+"""
+Tests para health.py (probes de liveness y readiness)
+"""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import QueuePool
+
+import health
+import main
+from health import ReadinessChecker
+from ratelimit import ConcurrencyLimiter
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """Primario SQLite en memoria con un QueuePool de dos conexiones"""
+    engine = create_engine("sqlite://", poolclass=QueuePool, pool_size=2, max_overflow=0)
+    monkeypatch.setattr(health, "get_engine", lambda: engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def checker(engine, tmp_path):
+    return ReadinessChecker(
+        upload_dirs=[str(tmp_path)],
+        hashing_limiter=ConcurrencyLimiter(max_inflight=2),
+        min_free_disk_mb=0,
+        name="test_readiness"
+    )
+
+
+class TestReadinessChecks:
+    """Tests de cada verificación"""
+
+    def test_lista_con_dependencias_sanas(self, checker):
+        """
+        GIVEN DB alcanzable, pool libre, disco disponible y cupo de hashing
+        WHEN se corren las verificaciones
+        THEN la instancia está lista
+        """
+        result = checker.run_checks()
+
+        assert result["ready"] is True
+        assert set(result["checks"]) == {"pool", "database", "disk", "hashing"}
+
+    def test_pool_saturado_no_consulta_la_db(self, checker, engine, monkeypatch):
+        """
+        GIVEN todas las conexiones del pool tomadas
+        WHEN se corren las verificaciones
+        THEN no está lista y no espera una conexión para el SELECT 1
+        """
+        monkeypatch.setattr(checker, "check_database", lambda: pytest.fail("no debe consultar la DB"))
+        conns = [engine.connect(), engine.connect()]
+        try:
+            result = checker.run_checks()
+        finally:
+            for conn in conns:
+                conn.close()
+
+        assert result["ready"] is False
+        assert result["checks"]["pool"]["saturation"] == 1.0
+        assert result["checks"]["database"]["ok"] is False
+
+    def test_overflow_sin_limite_no_se_satura(self, checker, monkeypatch):
+        """
+        GIVEN un pool con DB_MAX_OVERFLOW=-1 y más conexiones tomadas que pool_size
+        WHEN se corren las verificaciones
+        THEN el pool no cuenta como saturado y la DB se verifica
+        """
+        engine = create_engine("sqlite://", poolclass=QueuePool, pool_size=1, max_overflow=-1)
+        monkeypatch.setattr(health, "get_engine", lambda: engine)
+        conns = [engine.connect(), engine.connect()]
+        try:
+            result = checker.run_checks()
+        finally:
+            for conn in conns:
+                conn.close()
+            engine.dispose()
+
+        assert result["checks"]["pool"]["ok"] is True
+        assert result["checks"]["database"]["ok"] is True
+
+    def test_db_caida_no_expone_el_mensaje(self, checker, monkeypatch):
+        """
+        GIVEN una DB que rechaza la conexión
+        WHEN se corren las verificaciones
+        THEN no está lista y solo se informa el tipo de error
+        """
+        def fail():
+            raise OperationalError("SELECT 1", {}, Exception("password authentication failed for user admin"))
+
+        broken = create_engine("sqlite://")
+        monkeypatch.setattr(broken, "connect", fail)
+        monkeypatch.setattr(health, "get_engine", lambda: broken)
+
+        result = checker.run_checks()
+
+        assert result["ready"] is False
+        assert result["checks"]["database"] == {"ok": False, "error": "OperationalError"}
+
+    def test_directorio_de_uploads_faltante(self, engine, tmp_path):
+        """
+        GIVEN un directorio de uploads que no existe
+        WHEN se corren las verificaciones
+        THEN no está lista
+        """
+        checker = ReadinessChecker(upload_dirs=[str(tmp_path / "no-existe")], min_free_disk_mb=0, name="test_readiness")
+
+        assert checker.run_checks()["checks"]["disk"]["ok"] is False
+
+    def test_hashing_sin_cupo(self, checker):
+        """
+        GIVEN todas las verificaciones de contraseña en vuelo ocupadas
+        WHEN se corren las verificaciones
+        THEN no está lista
+        """
+        checker.hashing_limiter.inflight = checker.hashing_limiter.max_inflight
+
+        result = checker.run_checks()
+
+        assert result["ready"] is False
+        assert result["checks"]["hashing"]["ok"] is False
+
+
+class TestReadinessCache:
+    """Tests del cacheo del resultado"""
+
+    def test_probes_comparten_una_verificacion(self, checker, monkeypatch):
+        """
+        GIVEN diez probes concurrentes y otra posterior dentro del intervalo de cache
+        WHEN se pide el estado
+        THEN las verificaciones corren una sola vez
+        """
+        calls = []
+        run_checks = checker.run_checks
+        monkeypatch.setattr(checker, "run_checks", lambda: calls.append(1) or run_checks())
+
+        async def probes():
+            results = await asyncio.gather(*(checker.status() for _ in range(10)))
+            return results + [await checker.status()]
+
+        results = asyncio.run(probes())
+
+        assert len(calls) == 1
+        assert all(result["ready"] for result in results)
+
+
+class TestProbeEndpoints:
+    """Tests de /livez y /readyz"""
+
+    def test_livez(self):
+        """
+        GIVEN la app levantada
+        WHEN se consulta /livez
+        THEN responde 200 sin verificar dependencias
+        """
+        response = TestClient(main.app).get("/livez")
+
+        assert response.status_code == 200
+        assert response.json() == {"status": "alive"}
+
+    def test_readyz_no_lista_responde_503(self, engine, tmp_path, monkeypatch):
+        """
+        GIVEN una instancia sin el directorio de uploads
+        WHEN se consulta /readyz
+        THEN responde 503 con el detalle de cada verificación
+        """
+        checker = ReadinessChecker(upload_dirs=[str(tmp_path / "no-existe")], name="test_readiness")
+        monkeypatch.setattr(main, "readiness_checker", checker)
+
+        response = TestClient(main.app).get("/readyz")
+
+        assert response.status_code == 503
+        assert response.json()["status"] == "not_ready"
+        assert response.json()["checks"]["database"]["ok"] is True
+        assert response.headers["cache-control"] == "no-store"
@@ -0,0 +1,166 @@
+"""
+Tests para jwt_keys.py (firma RS256 con rotación de kid y JWKS)
+"""
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from fastapi.testclient import TestClient
+from jose import jwt
+
+import auth
+import jwt_keys
+from cache import clear_all_caches
+from jwt_keys import generate_private_key_pem, load_keyring, public_pem_from_private
+
+
+@pytest.fixture(scope="module")
+def pems():
+    return {"2024-01": generate_private_key_pem(), "2024-06": generate_private_key_pem()}
+
+
+@pytest.fixture
+def keys_dir(tmp_path, pems):
+    for kid, pem in pems.items():
+        (tmp_path / f"{kid}.pem").write_text(pem)
+    return tmp_path
+
+
+@pytest.fixture
+def keyring(keys_dir, monkeypatch):
+    """Activa el modo RS256 con las dos claves de keys_dir (firma 2024-06)"""
+    ring = load_keyring(str(keys_dir), "2024-06")
+    monkeypatch.setattr(jwt_keys, "keyring", ring)
+    clear_all_caches()
+    yield ring
+    clear_all_caches()
+
+
+def _verify(token):
+    return auth.verify_token(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+
+
+class TestKeyRing:
+    """Tests para la carga de claves"""
+
+    def test_sin_directorio_modo_hs256(self):
+        """
+        GIVEN JWT_KEYS_DIR vacío
+        WHEN se cargan las claves
+        THEN no hay keyring (se firma con HS256)
+        """
+        assert load_keyring("") is None
+
+    def test_clave_activa_explicita(self, keys_dir):
+        """
+        GIVEN dos claves privadas
+        WHEN se indica JWT_ACTIVE_KID
+        THEN firma esa clave, aunque haya otra publicada después
+        """
+        assert load_keyring(str(keys_dir), "2024-01").active_kid == "2024-01"
+        assert load_keyring(str(keys_dir), "2024-06").active_kid == "2024-06"
+
+    def test_varias_claves_sin_kid_activo(self, keys_dir):
+        """
+        GIVEN dos claves privadas (una recién publicada para la rotación)
+        WHEN no se indica JWT_ACTIVE_KID
+        THEN falla al arrancar en lugar de elegir una por nombre
+        """
+        with pytest.raises(ValueError, match="JWT_ACTIVE_KID"):
+            load_keyring(str(keys_dir))
+
+    def test_unica_clave_es_la_activa(self, keys_dir):
+        """
+        GIVEN una sola clave privada
+        WHEN no se indica JWT_ACTIVE_KID
+        THEN firma con esa clave
+        """
+        (keys_dir / "2024-06.pem").unlink()
+
+        assert load_keyring(str(keys_dir)).active_kid == "2024-01"
+
+    def test_kid_activo_sin_clave_privada(self, keys_dir):
+        """
+        GIVEN un JWT_ACTIVE_KID sin .pem
+        WHEN se cargan las claves
+        THEN falla al arrancar en lugar de emitir tokens inverificables
+        """
+        with pytest.raises(ValueError):
+            load_keyring(str(keys_dir), "no-existe")
+
+
+class TestFirmaRS256:
+    """Tests para la emisión y verificación de tokens RS256"""
+
+    def test_token_rs256_con_kid(self, keyring):
+        """
+        GIVEN claves RS256 configuradas
+        WHEN se emite un token
+        THEN lleva alg RS256, el kid activo y verifica
+        """
+        token = auth.create_access_token(data={"sub": "a@test.com"})
+
+        header = jwt.get_unverified_header(token)
+        assert header["alg"] == "RS256"
+        assert header["kid"] == "2024-06"
+        assert _verify(token).email == "a@test.com"
+
+    def test_consumidor_verifica_con_jwks(self, keyring):
+        """
+        GIVEN el documento JWKS publicado
+        WHEN otro servicio verifica un token con la clave de su kid
+        THEN la firma es válida sin conocer ningún secreto
+        """
+        token = auth.create_access_token(data={"sub": "a@test.com"})
+        from main import app
+        client = TestClient(app)
+
+        response = client.get("/.well-known/jwks.json")
+        keys = {key["kid"]: key for key in response.json()["keys"]}
+
+        assert "max-age" in response.headers["cache-control"]
+        assert set(keys) == {"2024-01", "2024-06"}
+        claims = jwt.decode(token, keys[jwt.get_unverified_header(token)["kid"]], algorithms=["RS256"])
+        assert claims["sub"] == "a@test.com"
+
+    def test_clave_retirada_solo_publica(self, keys_dir, pems, monkeypatch):
+        """
+        GIVEN un token firmado con una clave que ya solo está como .pub.pem
+        WHEN se verifica
+        THEN sigue siendo válido
+        """
+        old_token = jwt.encode({"sub": "a@test.com", "exp": 9999999999}, pems["2024-01"],
+                               algorithm="RS256", headers={"kid": "2024-01"})
+        (keys_dir / "2024-01.pem").unlink()
+        (keys_dir / "2024-01.pub.pem").write_text(public_pem_from_private(pems["2024-01"]))
+        monkeypatch.setattr(jwt_keys, "keyring", load_keyring(str(keys_dir)))
+        clear_all_caches()
+
+        assert _verify(old_token).email == "a@test.com"
+
+    def test_tokens_hs256_durante_la_migracion(self, keyring, monkeypatch):
+        """
+        GIVEN un token HS256 emitido antes de activar RS256
+        WHEN se verifica
+        THEN se acepta con JWT_ACCEPT_HS256 y se rechaza sin él
+        """
+        legacy = jwt.encode({"sub": "a@test.com", "exp": 9999999999}, auth.SECRET_KEY, algorithm="HS256")
+
+        assert _verify(legacy).email == "a@test.com"
+
+        clear_all_caches()
+        monkeypatch.setattr(auth, "JWT_ACCEPT_HS256", False)
+        with pytest.raises(HTTPException):
+            _verify(legacy)
+
+    def test_kid_desconocido(self, keyring, monkeypatch):
+        """
+        GIVEN un token RS256 firmado con una clave que no está en el keyring
+        WHEN se verifica
+        THEN se rechaza
+        """
+        monkeypatch.setattr(auth, "JWT_ACCEPT_HS256", False)
+        token = jwt.encode({"sub": "a@test.com", "exp": 9999999999}, generate_private_key_pem(),
+                           algorithm="RS256", headers={"kid": "ajena"})
+
+        with pytest.raises(HTTPException):
+            _verify(token)
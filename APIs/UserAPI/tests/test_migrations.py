@@ -0,0 +1,227 @@
+"""
+Tests para migrations.py (migraciones sobre una DB ya desplegada)
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import migrations
+from migrations import upgrade
+from models import User
+from services import UserService
+
+# Tabla users tal como la creó create_all antes de las migraciones
+LEGACY_USERS_DDL = """
+CREATE TABLE users (
+    id INTEGER NOT NULL PRIMARY KEY,
+    email VARCHAR NOT NULL UNIQUE,
+    hashed_password VARCHAR NOT NULL,
+    role VARCHAR(9) NOT NULL,
+    verified BOOLEAN NOT NULL,
+    email_verified BOOLEAN NOT NULL,
+    nombre VARCHAR NOT NULL,
+    profile_picture VARCHAR,
+    apellido VARCHAR,
+    genero VARCHAR(9),
+    fecha_nacimiento DATE,
+    descripcion TEXT,
+    created_at DATETIME
+)
+"""
+
+
+@pytest.fixture
+def legacy_engine(tmp_path):
+    """DB SQLite con el esquema previo a las migraciones"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(LEGACY_USERS_DDL))
+    yield engine
+    engine.dispose()
+
+
+def _insert_user(conn, user_id, email, created_at="2024-01-01 10:00:00.000000"):
+    conn.execute(
+        text(
+            "INSERT INTO users (id, email, hashed_password, role, verified, email_verified, nombre, created_at) "
+            "VALUES (:id, :email, 'hash', 'candidato', 1, 1, 'Ana', :created_at)"
+        ),
+        {"id": user_id, "email": email, "created_at": created_at},
+    )
+
+
+def _index_names(engine):
+    # El inspector de SQLite omite los índices sobre expresiones
+    with engine.connect() as conn:
+        return set(conn.scalars(text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'users'")))
+
+
+class TestUpgrade:
+    """Tests de la ejecución de las migraciones"""
+
+    def test_aplica_todas_y_es_idempotente(self, legacy_engine):
+        """
+        GIVEN una DB con el esquema previo
+        WHEN se corre upgrade dos veces
+        THEN la primera aplica todas las migraciones y la segunda ninguna
+        """
+        applied = upgrade(legacy_engine)
+
+        assert applied == [name for name, _ in migrations.MIGRATIONS]
+        assert upgrade(legacy_engine) == []
+
+    def test_migracion_fallida_no_queda_registrada(self, legacy_engine, monkeypatch):
+        """
+        GIVEN una migración que falla
+        WHEN se corre upgrade
+        THEN la excepción se propaga y la migración queda pendiente para el próximo arranque
+        """
+        def broken(conn):
+            raise RuntimeError("falla")
+
+        monkeypatch.setattr(migrations, "MIGRATIONS", [("9999_rota", broken)])
+
+        with pytest.raises(RuntimeError):
+            upgrade(legacy_engine)
+
+        monkeypatch.setattr(migrations, "MIGRATIONS", [("9999_rota", lambda conn: None)])
+        assert upgrade(legacy_engine) == ["9999_rota"]
+
+
+class TestUsersEmailLower:
+    """Tests de la migración del índice único sobre lower(email)"""
+
+    def test_duplicados_abortan_sin_tocar_los_emails(self, legacy_engine):
+        """
+        GIVEN dos cuentas cuyo email solo difiere en mayúsculas
+        WHEN se corre upgrade
+        THEN falla listando las cuentas en conflicto, sin cambiar ningún email ni registrar la migración
+        """
+        with legacy_engine.begin() as conn:
+            _insert_user(conn, 1, "Ana@Example.com")
+            _insert_user(conn, 2, "ana@example.com")
+            _insert_user(conn, 3, "otro@example.com")
+
+        with pytest.raises(migrations.MigrationError, match="ana@example.com: usuarios 1, 2"):
+            upgrade(legacy_engine)
+
+        with legacy_engine.connect() as conn:
+            emails = dict(conn.execute(text("SELECT id, email FROM users")).all())
+            applied = list(conn.scalars(text("SELECT name FROM schema_migrations")))
+        assert emails == {1: "Ana@Example.com", 2: "ana@example.com", 3: "otro@example.com"}
+        assert applied == []
+        assert "ix_users_email_lower" not in _index_names(legacy_engine)
+
+    def test_resueltos_a_mano_crea_el_indice(self, legacy_engine):
+        """
+        GIVEN un conflicto de emails que un operador resolvió a mano
+        WHEN se vuelve a correr upgrade
+        THEN se crea el índice y rechaza otra variante del email
+        """
+        with legacy_engine.begin() as conn:
+            _insert_user(conn, 1, "Ana@Example.com")
+            _insert_user(conn, 2, "ana@example.com")
+        with pytest.raises(migrations.MigrationError):
+            upgrade(legacy_engine)
+        with legacy_engine.begin() as conn:
+            conn.execute(text("UPDATE users SET email = 'ana.otra@example.com' WHERE id = 2"))
+
+        upgrade(legacy_engine)
+
+        assert "ix_users_email_lower" in _index_names(legacy_engine)
+        with pytest.raises(IntegrityError):
+            with legacy_engine.begin() as conn:
+                _insert_user(conn, 4, "ANA@EXAMPLE.COM")
+
+
+class TestUsersVersionId:
+    """Tests de la migración de version_id"""
+
+    def test_filas_existentes_arrancan_en_1(self, legacy_engine):
+        """
+        GIVEN un usuario existente sin version_id
+        WHEN se corre upgrade
+        THEN la columna existe, es NOT NULL y el usuario queda con version_id 1
+        """
+        with legacy_engine.begin() as conn:
+            _insert_user(conn, 1, "ana@example.com")
+
+        upgrade(legacy_engine)
+
+        with legacy_engine.connect() as conn:
+            assert conn.scalar(text("SELECT version_id FROM users WHERE id = 1")) == 1
+        column = next(c for c in inspect(legacy_engine).get_columns("users") if c["name"] == "version_id")
+        assert column["nullable"] is False
+
+
+class TestUsersUpdatedAt:
+    """Tests de la migración de updated_at"""
+
+    def test_rellena_con_created_at(self, legacy_engine):
+        """
+        GIVEN un usuario existente sin updated_at
+        WHEN se corre upgrade
+        THEN updated_at toma su created_at, el índice del change feed existe y el ORM puede actualizarlo
+        """
+        with legacy_engine.begin() as conn:
+            _insert_user(conn, 1, "ana@example.com", created_at="2024-03-05 08:30:00.000000")
+
+        upgrade(legacy_engine)
+
+        session = Session(legacy_engine)
+        user = session.get(User, 1)
+        assert user.updated_at == datetime(2024, 3, 5, 8, 30)
+        user.nombre = "Ana María"
+        session.commit()
+        assert user.version_id == 2
+        assert user.updated_at > datetime(2024, 3, 5, 8, 30)
+        session.close()
+        assert "ix_users_updated_at_id" in _index_names(legacy_engine)
+
+
+class TestUsersSearchIndex:
+    """Tests de la migración del índice de búsqueda"""
+
+    def test_usuarios_existentes_aparecen_en_la_busqueda(self, legacy_engine):
+        """
+        GIVEN usuarios creados antes de que existiera el índice de búsqueda
+        WHEN se corre upgrade y se busca por un prefijo de su nombre
+        THEN aparecen en el resultado
+        """
+        with legacy_engine.begin() as conn:
+            _insert_user(conn, 1, "ana@example.com")
+
+        upgrade(legacy_engine)
+
+        session = Session(legacy_engine)
+        assert [user.id for user in UserService(session).search_users("an")] == [1]
+        session.close()
+
+
+class TestOutboxEventsFailedAt:
+    """Tests de la migración de failed_at del outbox"""
+
+    def test_agrega_la_columna(self, legacy_engine):
+        """
+        GIVEN un outbox creado antes de que existiera failed_at, con un evento pendiente
+        WHEN se corre upgrade
+        THEN la columna existe y el evento sigue pendiente
+        """
+        with legacy_engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE outbox_events (id INTEGER NOT NULL PRIMARY KEY, event_type VARCHAR NOT NULL, "
+                "aggregate_id INTEGER NOT NULL, payload TEXT NOT NULL, created_at DATETIME NOT NULL, "
+                "attempts INTEGER NOT NULL, next_attempt_at DATETIME NOT NULL, dispatched_at DATETIME, last_error TEXT)"
+            ))
+            conn.execute(text(
+                "INSERT INTO outbox_events VALUES (1, 'user.created', 1, '{}', '2024-01-01 00:00:00', 0, "
+                "'2024-01-01 00:00:00', NULL, NULL)"
+            ))
+
+        upgrade(legacy_engine)
+
+        with legacy_engine.connect() as conn:
+            assert conn.execute(text("SELECT failed_at FROM outbox_events WHERE id = 1")).all() == [(None,)]
@@ -0,0 +1,291 @@
+"""
+Tests para el transactional outbox (outbox.py)
+"""
+import json
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import OutboxEvent, GenderEnum
+from outbox import EventSink, FileSink, InMemorySink, OutboxDispatcher, OutboxPurger, record_event
+from schemas import CandidatoCreate, UserUpdate
+from services import UserService
+
+
+@pytest.fixture
+def session_factory():
+    db_fd, db_path = tempfile.mkstemp()
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+    engine.dispose()
+    os.close(db_fd)
+    os.unlink(db_path)
+
+
+def _candidato(email="candidato@test.com"):
+    return CandidatoCreate(
+        email=email,
+        password="TestPass123!",
+        nombre="Juan",
+        apellido="Pérez",
+        genero=GenderEnum.masculino,
+        fecha_nacimiento=date(1990, 1, 1)
+    )
+
+
+class FailingSink(EventSink):
+    def publish(self, events):
+        raise ConnectionError("sink caído")
+
+
+class TestOutboxWrites:
+    """Los cambios de UserService escriben eventos en la misma transacción"""
+
+    def test_registro_y_update_generan_eventos(self, session_factory):
+        """
+        GIVEN un candidato registrado y luego actualizado
+        WHEN se lee el outbox
+        THEN hay un user.created y un user.updated con los campos cambiados
+        """
+        db = session_factory()
+        service = UserService(db)
+        user = service.create_candidato_simple(_candidato())
+        service.update_user(user.id, UserUpdate(nombre="Juan Carlos"))
+
+        events = db.query(OutboxEvent).order_by(OutboxEvent.id).all()
+        db.close()
+
+        assert [e.event_type for e in events] == ["user.created", "user.updated"]
+        assert json.loads(events[0].payload)["email"] == "candidato@test.com"
+        updated = json.loads(events[1].payload)
+        assert updated["changed_fields"] == ["nombre"]
+        assert updated["user"]["nombre"] == "Juan Carlos"
+
+    def test_update_lleva_el_updated_at_de_la_fila(self, session_factory):
+        """
+        GIVEN un candidato cargado en la sesión (como lo deja get_current_user)
+        WHEN se actualiza su perfil
+        THEN el usuario devuelto y el evento user.updated llevan el updated_at guardado en la DB
+        """
+        from models import User
+
+        db = session_factory()
+        service = UserService(db)
+        user = service.create_candidato_simple(_candidato())
+        created_at = user.updated_at
+        updated = service.update_user(user.id, UserUpdate(nombre="Juan Carlos"))
+        event = db.query(OutboxEvent).filter(OutboxEvent.event_type == "user.updated").one()
+        db.close()
+
+        fresh = session_factory()
+        stored = fresh.get(User, user.id)
+        fresh.close()
+
+        assert stored.updated_at > created_at
+        assert updated.updated_at == stored.updated_at
+        assert json.loads(event.payload)["user"]["updated_at"] == stored.updated_at.isoformat()
+
+    def test_registro_rechazado_no_genera_evento(self, session_factory):
+        """
+        GIVEN un email ya registrado
+        WHEN se intenta registrar de nuevo
+        THEN no queda ningún evento extra en el outbox
+        """
+        db = session_factory()
+        service = UserService(db)
+        service.create_candidato_simple(_candidato())
+        with pytest.raises(HTTPException):
+            service.create_candidato_simple(_candidato())
+        db.rollback()
+
+        assert db.query(OutboxEvent).count() == 1
+        db.close()
+
+    def test_evento_no_sobrevive_rollback(self, session_factory):
+        """
+        GIVEN un evento registrado en una transacción
+        WHEN la transacción hace rollback
+        THEN el evento no se persiste
+        """
+        db = session_factory()
+        record_event(db, "user.updated", 1, {"x": 1})
+        db.rollback()
+
+        assert db.query(OutboxEvent).count() == 0
+        db.close()
+
+
+class TestOutboxDispatcher:
+    """Tests del despacho por lotes con reintentos"""
+
+    def test_publica_en_lotes_y_marca_despachados(self, session_factory):
+        """
+        GIVEN tres eventos pendientes y lotes de 2
+        WHEN se despacha dos veces
+        THEN se publican los tres en orden y no quedan pendientes
+        """
+        db = session_factory()
+        for i in range(3):
+            record_event(db, "user.updated", i, {"n": i})
+        db.commit()
+        db.close()
+        sink = InMemorySink()
+        dispatcher = OutboxDispatcher(session_factory, sink, batch_size=2)
+
+        assert dispatcher.dispatch_once() == 2
+        assert dispatcher.dispatch_once() == 1
+        assert dispatcher.dispatch_once() == 0
+
+        published = sink.drain()
+        assert [e["payload"]["n"] for e in published] == [0, 1, 2]
+        assert all("id" in e and e["type"] == "user.updated" for e in published)
+
+    def test_fallo_del_sink_reintenta_con_backoff(self, session_factory):
+        """
+        GIVEN un sink que falla
+        WHEN se despacha
+        THEN el evento sigue pendiente, con intento contado y próximo intento en el futuro
+        """
+        db = session_factory()
+        record_event(db, "user.created", 1, {})
+        db.commit()
+        db.close()
+        dispatcher = OutboxDispatcher(session_factory, FailingSink(), backoff_seconds=10)
+
+        assert dispatcher.dispatch_once() == 0
+        # Dentro de la ventana de backoff no se reintenta
+        assert dispatcher.dispatch_once() == 0
+
+        db = session_factory()
+        event = db.query(OutboxEvent).one()
+        assert event.dispatched_at is None
+        assert event.attempts == 1
+        assert event.next_attempt_at > datetime.utcnow() + timedelta(seconds=5)
+        assert "sink caído" in event.last_error
+
+        # Vencido el backoff, un sink sano lo entrega (at-least-once)
+        event.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+        db.close()
+        sink = InMemorySink()
+        assert OutboxDispatcher(session_factory, sink).dispatch_once() == 1
+        assert len(sink.drain()) == 1
+
+    def test_agota_los_intentos_y_queda_fallido(self, session_factory):
+        """
+        GIVEN un sink que siempre falla y un máximo de 2 intentos
+        WHEN se despacha cada vez que vence el backoff
+        THEN al segundo fallo el evento queda fallido con su error y no se reintenta más
+        """
+        db = session_factory()
+        record_event(db, "user.created", 1, {})
+        db.commit()
+        db.close()
+        dispatcher = OutboxDispatcher(session_factory, FailingSink(), backoff_seconds=0, max_attempts=2)
+
+        assert dispatcher.dispatch_once() == 0
+        assert dispatcher.dispatch_once() == 0
+
+        db = session_factory()
+        event = db.query(OutboxEvent).one()
+        assert event.attempts == 2
+        assert event.failed_at is not None
+        assert "sink caído" in event.last_error
+        db.close()
+
+        sink = InMemorySink()
+        healthy = OutboxDispatcher(session_factory, sink)
+        assert healthy.dispatch_once() == 0
+
+        # Reencolado a mano, se entrega
+        assert healthy.requeue_failed() == 1
+        assert healthy.dispatch_once() == 1
+        assert len(sink.drain()) == 1
+
+    def test_sink_sin_publish_no_se_instancia(self):
+        """
+        GIVEN un sink que no implementa publish
+        WHEN se instancia
+        THEN falla al construirlo
+        """
+        class Incompleto(EventSink):
+            pass
+
+        with pytest.raises(TypeError):
+            Incompleto()
+
+    def test_file_sink(self, session_factory, tmp_path):
+        """
+        GIVEN un FileSink
+        WHEN se despachan eventos
+        THEN quedan como líneas JSON en el archivo
+        """
+        db = session_factory()
+        record_event(db, "recruiter.linked", 7, {"company_id": 7, "recruiter_id": 9})
+        db.commit()
+        db.close()
+        path = tmp_path / "events.jsonl"
+
+        OutboxDispatcher(session_factory, FileSink(str(path))).dispatch_once()
+
+        lines = path.read_text().splitlines()
+        assert len(lines) == 1
+        assert json.loads(lines[0])["payload"] == {"company_id": 7, "recruiter_id": 9}
+
+
+class TestOutboxRetention:
+    """Purga de eventos viejos del outbox"""
+
+    def _evento(self, db, age_days, dispatched=False, failed=False):
+        then = datetime.utcnow() - timedelta(days=age_days)
+        event = record_event(db, "user.updated", 1, {})
+        event.created_at = then
+        event.dispatched_at = then if dispatched else None
+        event.failed_at = then if failed else None
+        db.flush()
+        return event.id
+
+    def test_purga_despachados_y_fallidos_viejos(self, session_factory):
+        """
+        GIVEN eventos despachados, fallidos y pendientes, viejos y recientes
+        WHEN se purga con retención de 7 días
+        THEN se borran solo los despachados y fallidos viejos
+        """
+        db = session_factory()
+        self._evento(db, 10, dispatched=True)
+        self._evento(db, 10, failed=True)
+        pending = self._evento(db, 10)
+        recent = self._evento(db, 1, dispatched=True)
+        db.commit()
+        db.close()
+
+        assert OutboxPurger(session_factory, retention_days=7).purge_once() == 2
+
+        db = session_factory()
+        assert sorted(e.id for e in db.query(OutboxEvent)) == [pending, recent]
+        db.close()
+
+    def test_sin_dispatcher_purga_tambien_pendientes(self, session_factory):
+        """
+        GIVEN un pendiente viejo y uno reciente, sin sink configurado
+        WHEN se purga incluyendo pendientes
+        THEN se borra solo el viejo
+        """
+        db = session_factory()
+        self._evento(db, 10)
+        recent = self._evento(db, 1)
+        db.commit()
+        db.close()
+
+        assert OutboxPurger(session_factory, include_pending=True, retention_days=7).purge_once() == 1
+
+        db = session_factory()
+        assert [e.id for e in db.query(OutboxEvent)] == [recent]
+        db.close()
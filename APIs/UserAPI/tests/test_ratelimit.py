@@ -0,0 +1,170 @@
+"""
+Tests para ratelimit.py (token buckets y límite de concurrencia del login)
+"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import ratelimit
+from ratelimit import ConcurrencyLimiter, InMemoryRateLimitBackend, LoginRateLimiter, RateLimitBackend
+
+
+def _backend():
+    # Nombre propio: no reemplazar en el registro de caches la del login de la app
+    return InMemoryRateLimitBackend(name="test_rate_limits")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj controlable para ratelimit.time.monotonic"""
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    return now
+
+
+class TestTokenBucket:
+    """Tests para el backend en memoria"""
+
+    def test_rafaga_y_recarga(self, clock):
+        """
+        GIVEN un bucket de capacidad 2 que recarga 1 token por segundo
+        WHEN se consumen 3 tokens seguidos y luego pasa 1 segundo
+        THEN el tercero se rechaza con retry_after y después vuelve a haber un token
+        """
+        backend = _backend()
+
+        assert backend.take("k", 2, 1.0)[0] is True
+        assert backend.take("k", 2, 1.0)[0] is True
+        allowed, retry_after = backend.take("k", 2, 1.0)
+        assert allowed is False
+        assert retry_after == pytest.approx(1.0)
+
+        clock[0] += 1
+        assert backend.take("k", 2, 1.0)[0] is True
+
+    def test_keys_independientes(self, clock):
+        """
+        GIVEN un bucket agotado
+        WHEN se consume de otra key
+        THEN se permite
+        """
+        backend = _backend()
+        backend.take("a", 1, 1.0)
+
+        assert backend.take("a", 1, 1.0)[0] is False
+        assert backend.take("b", 1, 1.0)[0] is True
+
+    def test_backend_sin_take_no_se_instancia(self):
+        """
+        GIVEN un backend que no implementa take
+        WHEN se instancia
+        THEN falla al construirlo y no en el primer login
+        """
+        class Incompleto(RateLimitBackend):
+            pass
+
+        with pytest.raises(TypeError):
+            Incompleto()
+
+
+class TestLoginRateLimiter:
+    """Tests para los límites por IP y por email"""
+
+    def test_limite_por_email(self, clock):
+        """
+        GIVEN un límite de 2 intentos por email
+        WHEN se intenta 3 veces el mismo email desde IPs distintas
+        THEN el tercero recibe 429 con Retry-After
+        """
+        limiter = LoginRateLimiter(_backend(), ip_burst=100, email_burst=2, email_per_minute=2)
+        limiter.check("1.1.1.1", "a@test.com")
+        limiter.check("2.2.2.2", "a@test.com")
+
+        with pytest.raises(HTTPException) as exc:
+            limiter.check("3.3.3.3", "a@test.com")
+
+        assert exc.value.status_code == 429
+        assert exc.value.headers["Retry-After"] == "30"
+
+    def test_limite_por_ip(self, clock):
+        """
+        GIVEN un límite de 2 intentos por IP
+        WHEN una IP prueba 3 emails distintos
+        THEN el tercero recibe 429
+        """
+        limiter = LoginRateLimiter(_backend(), ip_burst=2, email_burst=100)
+        limiter.check("1.1.1.1", "a@test.com")
+        limiter.check("1.1.1.1", "b@test.com")
+
+        with pytest.raises(HTTPException) as exc:
+            limiter.check("1.1.1.1", "c@test.com")
+
+        assert exc.value.status_code == 429
+
+
+class TestClientIp:
+    """Tests para la IP del cliente detrás de proxies"""
+
+    def _request(self, *forwarded_for):
+        headers = [(b"x-forwarded-for", value.encode()) for value in forwarded_for]
+        return Request({"type": "http", "client": ("10.0.0.1", 5000), "headers": headers})
+
+    def test_sin_proxies_confiables_usa_la_conexion(self):
+        """
+        GIVEN TRUSTED_PROXY_HOPS=0
+        WHEN llega un X-Forwarded-For
+        THEN se ignora y se usa la IP de la conexión
+        """
+        limiter = LoginRateLimiter(_backend(), trusted_proxy_hops=0)
+
+        assert limiter.client_ip(self._request("1.1.1.1")) == "10.0.0.1"
+
+    def test_toma_la_entrada_del_proxy_confiable(self):
+        """
+        GIVEN un proxy confiable
+        WHEN el cliente manda su propio X-Forwarded-For y el proxy agrega la IP real
+        THEN se usa la entrada que agregó el proxy
+        """
+        limiter = LoginRateLimiter(_backend(), trusted_proxy_hops=1)
+
+        assert limiter.client_ip(self._request("6.6.6.6, 2.2.2.2")) == "2.2.2.2"
+        assert limiter.client_ip(self._request("6.6.6.6", "2.2.2.2")) == "2.2.2.2"
+
+    def test_menos_entradas_que_proxies(self):
+        """
+        GIVEN dos proxies confiables
+        WHEN el X-Forwarded-For tiene una sola entrada
+        THEN se usa la IP de la conexión
+        """
+        limiter = LoginRateLimiter(_backend(), trusted_proxy_hops=2)
+
+        assert limiter.client_ip(self._request("2.2.2.2")) == "10.0.0.1"
+
+
+class TestConcurrencyLimiter:
+    """Tests para el cupo de verificaciones en vuelo"""
+
+    def test_sin_cupo_responde_503(self):
+        """
+        GIVEN un cupo de 1 ocupado
+        WHEN llega otra verificación
+        THEN falla en el acto con 503, y al liberarse el cupo vuelve a aceptar
+        """
+        limiter = ConcurrencyLimiter(max_inflight=1)
+
+        async def main():
+            async with limiter.slot():
+                with pytest.raises(HTTPException) as exc:
+                    async with limiter.slot():
+                        pass
+            async with limiter.slot():
+                pass
+            return exc.value
+
+        error = asyncio.run(main())
+
+        assert error.status_code == 503
+        assert error.headers["Retry-After"] == "1"
+        assert limiter.inflight == 0
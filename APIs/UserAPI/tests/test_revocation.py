@@ -0,0 +1,116 @@
+"""
+Tests para revocation.py (Bloom filter y lista de tokens revocados)
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import RevokedToken
+import revocation
+from revocation import BloomFilter, RevocationList
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine, expire_on_commit=False)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+class TestBloomFilter:
+    """Tests para el filtro probabilístico"""
+
+    def test_sin_falsos_negativos(self):
+        """
+        GIVEN mil elementos agregados
+        WHEN se consultan
+        THEN todos están en el filtro
+        """
+        bloom = BloomFilter(1000, 0.01)
+        items = [f"jti-{i}" for i in range(1000)]
+        for item in items:
+            bloom.add(item)
+
+        assert all(item in bloom for item in items)
+
+    def test_tasa_de_falsos_positivos_acotada(self):
+        """
+        GIVEN un filtro lleno hasta su capacidad con error objetivo 1%
+        WHEN se consultan diez mil elementos nunca agregados
+        THEN los falsos positivos quedan cerca del objetivo
+        """
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(f"jti-{i}")
+
+        false_positives = sum(f"otro-{i}" in bloom for i in range(10_000))
+
+        assert false_positives < 300
+
+
+class TestRevocationList:
+    """Tests para la lista de revocación respaldada por la tabla"""
+
+    def test_no_revocado_no_consulta_la_db(self):
+        """
+        GIVEN un filtro vacío
+        WHEN se consulta un jti
+        THEN se responde sin sesión de DB
+        """
+        revocations = RevocationList(capacity=100)
+
+        assert revocations.is_revoked(None, "cualquiera") is False
+
+    def test_revocar_y_confirmar(self, db):
+        """
+        GIVEN un token revocado
+        WHEN se consulta su jti
+        THEN el filtro da positivo y la consulta exacta lo confirma
+        """
+        revocations = RevocationList(capacity=100)
+        revocations.revoke(db, "abc", datetime.utcnow() + timedelta(minutes=5), user_id=1)
+
+        assert revocations.is_revoked(db, "abc") is True
+        assert revocations.stats()["filter_hits"] == 1
+
+    def test_recarga_desde_la_tabla_y_purga_vencidos(self, db):
+        """
+        GIVEN revocaciones hechas por otra instancia, una ya vencida
+        WHEN se recarga el filtro
+        THEN se carga la vigente y se borra la vencida
+        """
+        db.add(RevokedToken(jti="vigente", expires_at=datetime.utcnow() + timedelta(minutes=5)))
+        db.add(RevokedToken(jti="vencido", expires_at=datetime.utcnow() - timedelta(minutes=5)))
+        db.commit()
+        revocations = RevocationList(capacity=100)
+
+        loaded = revocations.refresh(db)
+
+        assert loaded == 1
+        assert revocations.is_revoked(db, "vigente") is True
+        assert db.get(RevokedToken, "vencido") is None
+
+    def test_revocacion_durante_la_recarga(self, db, monkeypatch):
+        """
+        GIVEN una recarga que ya leyó la tabla
+        WHEN se revoca un token localmente antes de que reemplace el filtro
+        THEN el filtro nuevo también lo tiene
+        """
+        revocations = RevocationList(capacity=100)
+
+        def filter_after_revoke(capacity, error_rate):
+            # La recarga ya leyó la tabla y está armando el filtro nuevo
+            monkeypatch.setattr(revocation, "BloomFilter", BloomFilter)
+            revocations.revoke(db, "durante", datetime.utcnow() + timedelta(minutes=5))
+            return BloomFilter(capacity, error_rate)
+
+        monkeypatch.setattr(revocation, "BloomFilter", filter_after_revoke)
+
+        assert revocations.refresh(db) == 0
+        assert revocations.is_revoked(db, "durante") is True
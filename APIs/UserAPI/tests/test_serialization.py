@@ -0,0 +1,140 @@
+"""
+Tests para serialization.py (negociación JSON/msgpack y layout versionado)
+"""
+from datetime import datetime
+
+import msgpack
+import pytest
+
+from schemas import UserResponse
+from serialization import (
+    JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, USER_WIRE_FIELDS, USER_WIRE_VERSION,
+    decode_user, decode_user_page, encode_user, encode_user_page, negotiate_media_type
+)
+
+
+def _usuario(user_id=1):
+    return UserResponse(
+        id=user_id,
+        email=f"user{user_id}@test.com",
+        nombre="Ana",
+        role="candidato",
+        email_verified=True,
+        apellido="Pérez",
+        genero="femenino",
+        fecha_nacimiento="1990-05-01",
+        created_at=datetime(2024, 1, 1, 12, 0, 0),
+        updated_at=datetime(2024, 1, 2, 12, 0, 0)
+    )
+
+
+class TestNegociacion:
+    """Tests para la elección de formato según Accept"""
+
+    @pytest.mark.parametrize("accept, expected", [
+        (None, JSON_MEDIA_TYPE),
+        ("application/json", JSON_MEDIA_TYPE),
+        ("*/*", JSON_MEDIA_TYPE),
+        ("application/msgpack", MSGPACK_MEDIA_TYPE),
+        ("application/x-msgpack", MSGPACK_MEDIA_TYPE),
+        ("application/json;q=0.5, application/msgpack", MSGPACK_MEDIA_TYPE),
+        ("application/msgpack;q=0.2, application/json", JSON_MEDIA_TYPE),
+        ("application/msgpack;q=0", JSON_MEDIA_TYPE),
+    ])
+    def test_formato_elegido(self, accept, expected):
+        """
+        GIVEN un header Accept
+        WHEN se negocia el formato
+        THEN se elige msgpack solo si el cliente lo prefiere
+        """
+        assert negotiate_media_type(accept) == expected
+
+    def test_sin_msgpack_instalado_siempre_json(self, monkeypatch):
+        """
+        GIVEN msgpack no instalado
+        WHEN un cliente pide msgpack
+        THEN se responde JSON
+        """
+        import serialization
+        monkeypatch.setattr(serialization, "MSGPACK_AVAILABLE", False)
+
+        assert serialization.negotiate_media_type("application/msgpack") == JSON_MEDIA_TYPE
+
+
+class TestLayout:
+    """Tests para el layout posicional versionado"""
+
+    def test_usuario_ida_y_vuelta(self):
+        """
+        GIVEN un usuario
+        WHEN se codifica y decodifica en msgpack
+        THEN se obtienen los mismos campos que en JSON
+        """
+        user = _usuario()
+
+        assert decode_user(encode_user(user)) == user.model_dump(mode="json")
+
+    def test_usuario_es_array_posicional(self):
+        """
+        GIVEN un usuario codificado
+        WHEN se lo lee como msgpack crudo
+        THEN es [versión, *campos] sin nombres de campo
+        """
+        raw = msgpack.unpackb(encode_user(_usuario()))
+
+        assert raw[0] == USER_WIRE_VERSION
+        assert len(raw) == len(USER_WIRE_FIELDS) + 1
+        assert "email" not in raw
+
+    def test_pagina_ida_y_vuelta(self):
+        """
+        GIVEN una página del change feed
+        WHEN se codifica y decodifica
+        THEN conserva usuarios, cursor y has_more
+        """
+        users = [_usuario(1), _usuario(2)]
+
+        page = decode_user_page(encode_user_page(users, "cursor", True))
+
+        assert page["users"] == [u.model_dump(mode="json") for u in users]
+        assert page["next_cursor"] == "cursor"
+        assert page["has_more"] is True
+
+    def test_version_desconocida(self):
+        """
+        GIVEN un cuerpo con una versión de layout futura
+        WHEN se decodifica
+        THEN falla en lugar de interpretar mal los campos
+        """
+        body = msgpack.packb([USER_WIRE_VERSION + 1, 1, "x@test.com"])
+
+        with pytest.raises(ValueError):
+            decode_user(body)
+
+
+class TestJSON:
+    """Tests para el camino rápido de JSON"""
+
+    def test_users_json_igual_a_model_dump(self):
+        """
+        GIVEN una lista de usuarios
+        WHEN se serializa con users_json
+        THEN el resultado es el mismo JSON que produce cada UserResponse
+        """
+        import json
+        from serialization import users_json
+
+        users = [_usuario(1), _usuario(2)]
+
+        assert json.loads(users_json(users)) == [u.model_dump(mode="json") for u in users]
+
+    def test_app_usa_orjson(self):
+        """
+        GIVEN la app configurada
+        WHEN se consulta la clase de respuesta por defecto
+        THEN es ORJSONResponse
+        """
+        from fastapi.responses import ORJSONResponse
+        from main import app
+
+        assert app.router.default_response_class is ORJSONResponse
@@ -0,0 +1,155 @@
+"""
+Tests para settings.py (configuración tipada, validada y cacheada)
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+import settings as settings_module
+from settings import DEV_INTERNAL_API_KEY, Settings, SettingsError, get_settings
+
+BASE_ENV = {"DATABASE_URL": "sqlite://"}
+
+
+@pytest.fixture
+def fresh_settings():
+    """get_settings sin cache, restaurada al terminar para no afectar a otros tests"""
+    get_settings.cache_clear()
+    yield get_settings
+    get_settings.cache_clear()
+
+
+class TestParseo:
+    """Tests de lectura de variables"""
+
+    def test_defaults(self):
+        """
+        GIVEN un entorno con solo DATABASE_URL
+        WHEN se parsea la configuración
+        THEN todos los valores toman sus defaults
+        """
+        settings = Settings.from_env(BASE_ENV)
+
+        assert settings == Settings(database_url="sqlite://")
+        assert settings.db_pool_size == 5
+        assert settings.bcrypt_rounds == 12
+        assert settings.upload_dirs == ("uploaded_cvs", "profile_pictures", "temp_files", "temp_registrations")
+
+    def test_tipos_y_listas(self):
+        """
+        GIVEN variables con enteros, floats, booleanos y listas separadas por coma
+        WHEN se parsea la configuración
+        THEN cada valor queda con su tipo
+        """
+        settings = Settings.from_env({
+            **BASE_ENV,
+            "DB_POOL_SIZE": "3",
+            "DB_POOL_TIMEOUT": "2.5",
+            "DB_EXTERNAL_POOLER": "yes",
+            "TOKEN_CACHE_ENABLED": "FALSE",
+            "DATABASE_REPLICA_URLS": " postgresql://r1/db, ,postgresql://r2/db",
+            "LOG_LEVEL": "debug",
+        })
+
+        assert settings.db_pool_size == 3
+        assert settings.db_pool_timeout == 2.5
+        assert settings.db_external_pooler is True
+        assert settings.token_cache_enabled is False
+        assert settings.database_replica_urls == ("postgresql://r1/db", "postgresql://r2/db")
+        assert settings.log_level == "DEBUG"
+
+    def test_secretos_fuera_del_repr(self):
+        """
+        GIVEN una configuración con secretos
+        WHEN se la imprime (logs, tracebacks)
+        THEN los secretos no aparecen
+        """
+        settings = Settings.from_env({**BASE_ENV, "SECRET_KEY": "muy-secreta"})
+
+        assert "muy-secreta" not in repr(settings)
+
+
+class TestValidacion:
+    """Tests de validación al arrancar"""
+
+    def test_reporta_todos_los_errores_juntos(self):
+        """
+        GIVEN varias variables inválidas
+        WHEN se parsea la configuración
+        THEN un solo SettingsError las lista todas
+        """
+        with pytest.raises(SettingsError) as error:
+            Settings.from_env({
+                **BASE_ENV,
+                "DB_POOL_SIZE": "cinco",
+                "BCRYPT_ROUNDS": "40",
+                "DB_POOL_PRE_PING": "quizas",
+                "RATE_LIMIT_BACKEND": "memcached",
+            })
+
+        assert len(error.value.errors) == 4
+        assert "DB_POOL_SIZE" in str(error.value)
+        assert "BCRYPT_ROUNDS" in str(error.value)
+
+    def test_database_url_obligatoria(self):
+        """
+        GIVEN un entorno sin DATABASE_URL
+        WHEN se parsea la configuración
+        THEN falla indicándolo
+        """
+        with pytest.raises(SettingsError, match="DATABASE_URL"):
+            Settings.from_env({})
+
+    def test_produccion_exige_secretos(self):
+        """
+        GIVEN ENVIRONMENT=production sin SECRET_KEY ni INTERNAL_SERVICE_API_KEY
+        WHEN se parsea la configuración
+        THEN falla en lugar de usar los valores de desarrollo
+        """
+        with pytest.raises(SettingsError) as error:
+            Settings.from_env({**BASE_ENV, "ENVIRONMENT": "production"})
+
+        assert len(error.value.errors) == 2
+
+        settings = Settings.from_env({
+            **BASE_ENV,
+            "ENVIRONMENT": "production",
+            "SECRET_KEY": "s",
+            "INTERNAL_SERVICE_API_KEY": "k",
+        })
+        assert settings.is_production
+
+
+class TestCarga:
+    """Tests de get_settings"""
+
+    def test_lee_el_env_una_sola_vez(self, fresh_settings, monkeypatch):
+        """
+        GIVEN get_settings sin cachear
+        WHEN se llama varias veces
+        THEN el .env se carga una vez y se retorna siempre el mismo objeto
+        """
+        calls = []
+        monkeypatch.setattr(settings_module, "load_dotenv", lambda: calls.append(1))
+
+        first = fresh_settings()
+        second = fresh_settings()
+
+        assert first is second
+        assert calls == [1]
+
+    def test_inyectable_como_dependency(self):
+        """
+        GIVEN la dependency get_settings sobreescrita con otra API key interna
+        WHEN un servicio usa la key por defecto
+        THEN el endpoint interno la rechaza
+        """
+        from main import app
+
+        app.dependency_overrides[get_settings] = lambda: Settings(database_url="sqlite://", internal_api_key="otra-key")
+        try:
+            client = TestClient(app)
+            rejected = client.get("/api/v1/internal/users/1", headers={"X-Internal-Api-Key": DEV_INTERNAL_API_KEY})
+        finally:
+            app.dependency_overrides.pop(get_settings, None)
+
+        assert rejected.status_code == 403